@@ -0,0 +1,100 @@
+from configuration import Config
+from typing import Dict, Any
+from botocore.exceptions import ClientError
+from operacoes import rebuild_rollups, reprocess_saldo_diario, extrair_contadores
+
+config = Config()
+
+
+def backfill_mes(dry_run: bool = False, recalcular_contadores: bool = False) -> Dict[str, Any]:
+    """
+    Preenche o atributo mes das linhas de consolidado gravadas antes do índice
+    mes-data-index, recalcula os dias sem contadores por tipo/categoria e
+    reconstrói os rollups mensais/anuais dos anos encontrados.
+    recalcular_contadores refaz os contadores de todos os dias com lançamentos
+    (necessário para os contadores por tag de dias gravados antes deles).
+    """
+    # Sem projeção: os contadores são atributos com nome variável
+    scan_kwargs = {}
+
+    lidos = 0
+    atualizados = 0
+    sem_contadores = []
+    anos = set()
+    last_evaluated_key = None
+
+    while True:
+        if last_evaluated_key:
+            scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+        response = config.tableConsolidado.scan(**scan_kwargs)
+        items = response.get('Items', [])
+        lidos += len(items)
+
+        for item in items:
+            # Apenas linhas diárias (YYYY-MM-DD); marcadores não entram no índice
+            if 'saldo_final' not in item or len(item['data']) != 10:
+                continue
+
+            anos.add(item['data'][:4])
+            if int(item.get('quantidade_lancamentos', 0)) > 0 and (recalcular_contadores or not extrair_contadores(item)):
+                sem_contadores.append(item['data'])
+
+            if item.get('mes'):
+                continue
+
+            if dry_run:
+                atualizados += 1
+                continue
+
+            try:
+                config.tableConsolidado.update_item(
+                    Key={'data': item['data']},
+                    UpdateExpression='SET mes = :mes',
+                    ConditionExpression='attribute_not_exists(mes)',
+                    ExpressionAttributeValues={':mes': item['data'][:7]}
+                )
+                atualizados += 1
+            except ClientError as e:
+                # Linha já preenchida por uma gravação concorrente
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+
+    # Recalcular a partir dos lançamentos os dias gravados antes dos contadores
+    if not dry_run:
+        for data in sorted(sem_contadores):
+            reprocess_saldo_diario(data)
+
+    # Rollups mensais/anuais dependem do índice mes-data-index
+    rollups = 0
+    if not dry_run:
+        for ano in sorted(anos):
+            rollups += rebuild_rollups(ano)
+
+    config.logger.info(
+        f"Backfill mes concluído: {lidos} lidos, {atualizados} atualizados, "
+        f"{len(sem_contadores)} sem contadores, {rollups} rollups"
+    )
+    return {
+        'lidos': lidos,
+        'atualizados': atualizados,
+        'contadores': len(sem_contadores),
+        'rollups': rollups,
+        'dry_run': dry_run
+    }
+
+
+def lambda_handler(event, context) -> Dict[str, Any]:
+    event = event or {}
+    return backfill_mes(
+        dry_run=bool(event.get('dry_run', False)),
+        recalcular_contadores=bool(event.get('recalcular_contadores', False))
+    )
+
+
+if __name__ == '__main__':
+    print(backfill_mes())
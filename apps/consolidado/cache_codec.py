@@ -0,0 +1,266 @@
+import struct
+from decimal import Decimal, InvalidOperation
+from typing import List, Tuple, Optional
+from modelos import SaldoDiario, RelatorioConsolidado
+
+# Formato binário do cache (big-endian):
+#   cabeçalho: MAGIC, versão, tipo ('S' saldo, 'R' relatório), casas decimais
+#   saldo:     data (10 bytes), saldo_inicial, total_creditos, total_debitos,
+#              saldo_final (int64 em ponto fixo), quantidade (uint32),
+#              ultima_atualizacao (uint8 + utf-8) e os N contadores em colunas:
+#              N (uint16), nomes separados por '\n' (uint32 + utf-8),
+#              N marcadores ('i' inteiro, 'd' ponto fixo) e N valores (int64)
+#   relatório: periodo_inicio, periodo_fim (10 bytes), 4 totais (int64),
+#              quantidade_dias (uint32), quantidade de saldos N (uint32) e os
+#              saldos em colunas (sem contadores, como no JSON legado): N datas
+#              (10 bytes), 4N valores (int64), N quantidades (uint32) e as
+#              ultima_atualizacao separadas por '\n' (uint32 + utf-8)
+# Valores não representáveis (datas fora de YYYY-MM-DD, mais de 18 casas,
+# estouro de int64) ficam no JSON legado: codificar retorna None.
+MAGIC = 0xC5
+VERSAO = 1
+TIPO_SALDO = ord('S')
+TIPO_RELATORIO = ord('R')
+MAX_CASAS = 18
+LIMITE_INT64 = 2 ** 63
+
+_cabecalho = struct.Struct('>BBBB')
+_saldo = struct.Struct('>10s4qIB')
+_relatorio = struct.Struct('>10s10s4qII')
+_quantidade = struct.Struct('>H')
+_tamanho_bloco = struct.Struct('>I')
+
+SEPARADOR_TEXTO = '\n'
+
+# Escala de cada quantidade de casas: int64 * 10^-casas é exato na precisão padrão (28 dígitos)
+_escalas = [Decimal(1).scaleb(-casas) for casas in range(MAX_CASAS + 1)]
+
+MARCADOR_INTEIRO = ord('i')
+MARCADOR_DECIMAL = ord('d')
+
+
+class FormatoCacheInvalido(ValueError):
+    pass
+
+
+def is_binario(payload: bytes) -> bool:
+    return bool(payload) and payload[0] == MAGIC
+
+
+def casas_decimais(valores: List[Decimal]) -> Optional[int]:
+    """
+    Menor quantidade de casas que representa todos os valores sem perda
+    """
+    casas = 0
+    for valor in valores:
+        expoente = valor.as_tuple().exponent
+        if not isinstance(expoente, int):
+            return None
+        casas = max(casas, -expoente)
+    return casas if casas <= MAX_CASAS else None
+
+
+def _ponto_fixo(valor: Decimal, casas: int) -> int:
+    inteiro = int(valor.scaleb(casas))
+    if abs(inteiro) >= LIMITE_INT64:
+        raise OverflowError(valor)
+    return inteiro
+
+
+def _data(valor: str) -> bytes:
+    conteudo = valor.encode('ascii')
+    if len(conteudo) != 10:
+        raise ValueError(valor)
+    return conteudo
+
+
+def _valores_saldo(saldo: SaldoDiario) -> List[Decimal]:
+    return [saldo.saldo_inicial, saldo.total_creditos, saldo.total_debitos, saldo.saldo_final]
+
+
+def _codificar_saldo(saldo: SaldoDiario, casas: int, partes: List[bytes]) -> None:
+    ultima_atualizacao = (saldo.ultima_atualizacao or '').encode('utf-8')
+    nomes = list(saldo.contadores)
+    if any(SEPARADOR_TEXTO in nome for nome in nomes):
+        raise ValueError('Nome de contador com separador')
+    bloco_nomes = SEPARADOR_TEXTO.join(nomes).encode('utf-8')
+
+    partes.append(_saldo.pack(
+        _data(saldo.data),
+        _ponto_fixo(saldo.saldo_inicial, casas),
+        _ponto_fixo(saldo.total_creditos, casas),
+        _ponto_fixo(saldo.total_debitos, casas),
+        _ponto_fixo(saldo.saldo_final, casas),
+        saldo.quantidade_lancamentos,
+        len(ultima_atualizacao)
+    ))
+    partes.append(ultima_atualizacao)
+
+    marcadores = bytes(
+        MARCADOR_INTEIRO if isinstance(valor, int) else MARCADOR_DECIMAL for valor in saldo.contadores.values()
+    )
+    valores = [
+        valor if isinstance(valor, int) else _ponto_fixo(valor, casas) for valor in saldo.contadores.values()
+    ]
+    partes.append(_quantidade.pack(len(nomes)))
+    partes.append(_tamanho_bloco.pack(len(bloco_nomes)))
+    partes.append(bloco_nomes)
+    partes.append(marcadores)
+    partes.append(struct.pack(f'>{len(valores)}q', *valores))
+
+
+def codificar_saldo(saldo: SaldoDiario) -> Optional[bytes]:
+    decimais = _valores_saldo(saldo)
+    decimais.extend(valor for valor in saldo.contadores.values() if not isinstance(valor, int))
+    casas = casas_decimais(decimais)
+    if casas is None:
+        return None
+
+    partes = [_cabecalho.pack(MAGIC, VERSAO, TIPO_SALDO, casas)]
+    try:
+        _codificar_saldo(saldo, casas, partes)
+    except (OverflowError, ValueError, struct.error):
+        return None
+    return b''.join(partes)
+
+
+def codificar_relatorio(relatorio: RelatorioConsolidado) -> Optional[bytes]:
+    totais = [
+        relatorio.saldo_inicial_periodo, relatorio.saldo_final_periodo,
+        relatorio.total_creditos_periodo, relatorio.total_debitos_periodo
+    ]
+    valores = [valor for saldo in relatorio.saldos_diarios for valor in _valores_saldo(saldo)]
+
+    casas = casas_decimais(totais + valores)
+    if casas is None:
+        return None
+
+    ultimas_atualizacoes = [saldo.ultima_atualizacao or '' for saldo in relatorio.saldos_diarios]
+    if any(SEPARADOR_TEXTO in ultima for ultima in ultimas_atualizacoes):
+        return None
+    bloco_texto = SEPARADOR_TEXTO.join(ultimas_atualizacoes).encode('utf-8')
+    total_saldos = len(relatorio.saldos_diarios)
+
+    try:
+        return b''.join([
+            _cabecalho.pack(MAGIC, VERSAO, TIPO_RELATORIO, casas),
+            _relatorio.pack(
+                _data(relatorio.periodo_inicio),
+                _data(relatorio.periodo_fim),
+                *[_ponto_fixo(valor, casas) for valor in totais],
+                relatorio.quantidade_dias,
+                total_saldos
+            ),
+            b''.join(_data(saldo.data) for saldo in relatorio.saldos_diarios),
+            struct.pack(f'>{4 * total_saldos}q', *[_ponto_fixo(valor, casas) for valor in valores]),
+            struct.pack(f'>{total_saldos}I', *[saldo.quantidade_lancamentos for saldo in relatorio.saldos_diarios]),
+            _tamanho_bloco.pack(len(bloco_texto)),
+            bloco_texto
+        ])
+    except (OverflowError, ValueError, struct.error):
+        return None
+
+
+def _ler_cabecalho(payload: bytes, tipo: int) -> int:
+    try:
+        magic, versao, tipo_payload, casas = _cabecalho.unpack_from(payload, 0)
+    except struct.error:
+        raise FormatoCacheInvalido('Payload truncado')
+
+    if magic != MAGIC or versao != VERSAO or tipo_payload != tipo:
+        raise FormatoCacheInvalido(f'Formato de cache não suportado: versão {versao}, tipo {tipo_payload}')
+    return casas
+
+
+def _decodificar_saldo(payload: bytes, posicao: int, casas: int) -> Tuple[SaldoDiario, int]:
+    escala = _escalas[casas]
+    data, saldo_inicial, creditos, debitos, saldo_final, quantidade, tamanho = _saldo.unpack_from(payload, posicao)
+    posicao += _saldo.size
+    ultima_atualizacao = payload[posicao:posicao + tamanho].decode('utf-8')
+    posicao += tamanho
+
+    contadores = {}
+    total_contadores, = _quantidade.unpack_from(payload, posicao)
+    posicao += _quantidade.size
+    tamanho, = _tamanho_bloco.unpack_from(payload, posicao)
+    posicao += _tamanho_bloco.size
+    if total_contadores:
+        nomes = payload[posicao:posicao + tamanho].decode('utf-8').split(SEPARADOR_TEXTO)
+        posicao += tamanho
+        marcadores = payload[posicao:posicao + total_contadores]
+        posicao += total_contadores
+        valores = struct.unpack_from(f'>{total_contadores}q', payload, posicao)
+        posicao += 8 * total_contadores
+        if len(nomes) != total_contadores or len(marcadores) != total_contadores:
+            raise IndexError('contadores com tamanhos diferentes')
+        contadores = {
+            nome: valor if marcador == MARCADOR_INTEIRO else Decimal(valor) * escala
+            for nome, marcador, valor in zip(nomes, marcadores, valores)
+        }
+
+    saldo = SaldoDiario(
+        data.decode('ascii'),
+        Decimal(saldo_inicial) * escala,
+        Decimal(creditos) * escala,
+        Decimal(debitos) * escala,
+        Decimal(saldo_final) * escala,
+        quantidade,
+        ultima_atualizacao,
+        contadores
+    )
+    return saldo, posicao
+
+
+def decodificar_saldo(payload: bytes) -> SaldoDiario:
+    casas = _ler_cabecalho(payload, TIPO_SALDO)
+    try:
+        saldo, _ = _decodificar_saldo(payload, _cabecalho.size, casas)
+    except (struct.error, IndexError, UnicodeDecodeError, InvalidOperation) as e:
+        raise FormatoCacheInvalido(f'Payload de saldo inválido: {str(e)}')
+    return saldo
+
+
+def decodificar_relatorio(payload: bytes) -> RelatorioConsolidado:
+    casas = _ler_cabecalho(payload, TIPO_RELATORIO)
+    escala = _escalas[casas]
+    try:
+        (periodo_inicio, periodo_fim, saldo_inicial, saldo_final,
+         creditos, debitos, quantidade_dias, total_saldos) = _relatorio.unpack_from(payload, _cabecalho.size)
+
+        # Colunas decodificadas de uma vez: datas, valores, quantidades e textos
+        posicao = _cabecalho.size + _relatorio.size
+        bloco_datas = payload[posicao:posicao + 10 * total_saldos].decode('ascii')
+        posicao += 10 * total_saldos
+        valores = [valor * escala for valor in map(Decimal, struct.unpack_from(f'>{4 * total_saldos}q', payload, posicao))]
+        posicao += 32 * total_saldos
+        quantidades = struct.unpack_from(f'>{total_saldos}I', payload, posicao)
+        posicao += 4 * total_saldos
+        tamanho, = _tamanho_bloco.unpack_from(payload, posicao)
+        posicao += _tamanho_bloco.size
+        ultimas_atualizacoes = payload[posicao:posicao + tamanho].decode('utf-8').split(SEPARADOR_TEXTO) if total_saldos else []
+    except (struct.error, UnicodeDecodeError, InvalidOperation) as e:
+        raise FormatoCacheInvalido(f'Payload de relatório inválido: {str(e)}')
+
+    if len(ultimas_atualizacoes) != total_saldos:
+        raise FormatoCacheInvalido('Payload de relatório inválido: colunas com tamanhos diferentes')
+
+    saldos = [
+        SaldoDiario(
+            bloco_datas[10 * indice:10 * indice + 10],
+            valores[4 * indice], valores[4 * indice + 1], valores[4 * indice + 2], valores[4 * indice + 3],
+            quantidades[indice],
+            ultimas_atualizacoes[indice]
+        )
+        for indice in range(total_saldos)
+    ]
+
+    return RelatorioConsolidado(
+        periodo_inicio=periodo_inicio.decode('ascii'),
+        periodo_fim=periodo_fim.decode('ascii'),
+        saldo_inicial_periodo=Decimal(saldo_inicial) * escala,
+        saldo_final_periodo=Decimal(saldo_final) * escala,
+        total_creditos_periodo=Decimal(creditos) * escala,
+        total_debitos_periodo=Decimal(debitos) * escala,
+        quantidade_dias=quantidade_dias,
+        saldos_diarios=saldos
+    )
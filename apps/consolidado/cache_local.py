@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class CacheLocal:
+    """
+    Cache LRU com TTL por entrada mantido na memória da instância (warm start),
+    à frente do Redis. Cada entrada guarda a data_referencia (YYYY-MM-DD) para
+    que uma alteração em uma data remova as entradas a partir dela, como o
+    índice de invalidação do Redis.
+    """
+
+    def __init__(self, max_itens: int):
+        self.max_itens = max_itens
+        # chave -> (expira_em, data_referencia, valor)
+        self._itens: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Versão de invalidação do Redis já aplicada às entradas locais
+        self.versao: Optional[int] = None
+        self.versao_verificada_em = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.expiradas = 0
+        self.descartadas = 0
+        self.invalidadas = 0
+
+    def get(self, chave: str) -> Optional[Any]:
+        with self._lock:
+            entrada = self._itens.get(chave)
+            if entrada is None:
+                self.misses += 1
+                return None
+
+            if entrada[0] <= time.monotonic():
+                del self._itens[chave]
+                self.expiradas += 1
+                self.misses += 1
+                return None
+
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return entrada[2]
+
+    def set(self, chave: str, valor: Any, ttl: float, data_referencia: Optional[str] = None) -> None:
+        if ttl <= 0 or self.max_itens <= 0:
+            return
+
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + ttl, data_referencia, valor)
+            self._itens.move_to_end(chave)
+
+            # Descarta as entradas menos usadas acima do limite
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.descartadas += 1
+
+    def remover(self, *chaves: str) -> None:
+        with self._lock:
+            for chave in chaves:
+                if self._itens.pop(chave, None) is not None:
+                    self.invalidadas += 1
+
+    def remover_a_partir_de(self, data: str) -> None:
+        """
+        Remove as entradas cuja data_referencia é maior ou igual a data
+        (entradas sem data_referencia também são removidas)
+        """
+        with self._lock:
+            chaves = [
+                chave for chave, (_, data_referencia, _) in self._itens.items()
+                if not data_referencia or data_referencia >= data
+            ]
+            for chave in chaves:
+                del self._itens[chave]
+            self.invalidadas += len(chaves)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self.invalidadas += len(self._itens)
+            self._itens.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'itens': len(self._itens),
+                'max_itens': self.max_itens,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / consultas, 4) if consultas else None,
+                'expiradas': self.expiradas,
+                'descartadas': self.descartadas,
+                'invalidadas': self.invalidadas,
+                'versao': self.versao
+            }
@@ -1,28 +1,57 @@
 import boto3
+import threading
+import time
+from functools import cached_property
 from os import environ
 import logging
 
+# A sessão padrão do boto3 não é thread-safe na criação de clients
+_clients_lock = threading.Lock()
+
+
 class Config():
+    """
+    Configuração compartilhada pelo processo: todos os módulos recebem a mesma
+    instância e os clients AWS são criados apenas no primeiro uso, sendo
+    reaproveitados entre invocações da mesma instância (warm start)
+    """
 
-    def __init__(self):
-        self.s3Client = boto3.client('s3')
-        self.s3Resource = boto3.resource('s3')
-        self.dynamodbResource = boto3.resource('dynamodb')
-        self.secrets_manager = boto3.client('secretsmanager')
+    _instance = None
 
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super().__new__(cls)
+            instance._inicializar()
+            cls._instance = instance
+        return cls._instance
 
+    def _inicializar(self):
         self.environment = environ.get('ENVIRONMENT')
         self.region = environ.get('REGION')
         self.account_id = environ.get('ACCOUNT_ID')
         self.DYNAMODB_TABLE_LANCAMENTOS = environ.get('DYNAMODB_TABLE_LANCAMENTOS')
+        self.DYNAMODB_INDEX_DATA_DIA = environ.get('DYNAMODB_INDEX_DATA_DIA', 'data_dia-data-index')
         self.DYNAMODB_TABLE_CONSOLIDADO= environ.get('DYNAMODB_TABLE_CONSOLIDADO')
+        self.DYNAMODB_INDEX_MES = environ.get('DYNAMODB_INDEX_MES', 'mes-data-index')
         self.SECRET_NAME = environ.get('SECRET_NAME')
         self.REDIS_ENDPOINT = environ.get('REDIS_ENDPOINT')
         self.REDIS_PORT = int(environ.get('REDIS_PORT', 6379))
+        self.LOCAL_CACHE_MAX_ITENS = int(environ.get('LOCAL_CACHE_MAX_ITENS', 4096))
+        self.LOCAL_CACHE_TTL_PASSADO = int(environ.get('LOCAL_CACHE_TTL_PASSADO', 3600))
+        self.LOCAL_CACHE_TTL_HOJE = int(environ.get('LOCAL_CACHE_TTL_HOJE', 5))
+        self.LOCAL_CACHE_VERSAO_INTERVALO = float(environ.get('LOCAL_CACHE_VERSAO_INTERVALO', 2))
         self.S3_BUCKET = environ['S3_BUCKET']
-
-        self.tableLancamentos = self.dynamodbResource.Table(self.DYNAMODB_TABLE_LANCAMENTOS)
-        self.tableConsolidado = self.dynamodbResource.Table(self.DYNAMODB_TABLE_CONSOLIDADO)
+        self.DYNAMODB_MAX_WORKERS = int(environ.get('DYNAMODB_MAX_WORKERS', 8))
+        self.DYNAMODB_SCAN_SEGMENTS = int(environ.get('DYNAMODB_SCAN_SEGMENTS', 8))
+        self.SCAN_PARALELO_MIN_DIAS = int(environ.get('SCAN_PARALELO_MIN_DIAS', 180))
+        self.DYNAMODB_TABLE_RELATORIO_JOBS = environ.get('DYNAMODB_TABLE_RELATORIO_JOBS')
+        self.RELATORIO_JOBS_QUEUE_URL = environ.get('RELATORIO_JOBS_QUEUE_URL')
+        self.RELATORIO_JOB_TTL_DIAS = int(environ.get('RELATORIO_JOB_TTL_DIAS', 7))
+        self.RELATORIO_JOB_URL_EXPIRACAO = int(environ.get('RELATORIO_JOB_URL_EXPIRACAO', 3600))
+        self.RELATORIO_JOB_MAX_TENTATIVAS = int(environ.get('RELATORIO_JOB_MAX_TENTATIVAS', 3))
+        # Prazo do job desde o início do processamento; deve cobrir todas as
+        # tentativas da fila (maxReceiveCount x VisibilityTimeout)
+        self.RELATORIO_JOB_PRAZO_SEGUNDOS = int(environ.get('RELATORIO_JOB_PRAZO_SEGUNDOS', 3600))
 
         self.function_name = f"Consolidado - {self.environment.upper()}"
 
@@ -30,4 +59,45 @@ class Config():
         self.logger = logging.getLogger()
         self.logger.setLevel(logging.INFO)
 
+    def _criar(self, fabrica, servico: str):
+        with _clients_lock:
+            inicio = time.perf_counter()
+            recurso = fabrica(servico)
+            self.logger.info(f"{fabrica.__name__} {servico} criado em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+            return recurso
+
+    @cached_property
+    def s3Client(self):
+        return self._criar(boto3.client, 's3')
+
+    @cached_property
+    def s3Resource(self):
+        return self._criar(boto3.resource, 's3')
+
+    @cached_property
+    def dynamodbResource(self):
+        return self._criar(boto3.resource, 'dynamodb')
+
+    @cached_property
+    def dynamodbClient(self):
+        return self.dynamodbResource.meta.client
+
+    @cached_property
+    def sqsClient(self):
+        return self._criar(boto3.client, 'sqs')
+
+    @cached_property
+    def secrets_manager(self):
+        return self._criar(boto3.client, 'secretsmanager')
+
+    @cached_property
+    def tableLancamentos(self):
+        return self.dynamodbResource.Table(self.DYNAMODB_TABLE_LANCAMENTOS)
+
+    @cached_property
+    def tableConsolidado(self):
+        return self.dynamodbResource.Table(self.DYNAMODB_TABLE_CONSOLIDADO)
 
+    @cached_property
+    def tableRelatorioJobs(self):
+        return self.dynamodbResource.Table(self.DYNAMODB_TABLE_RELATORIO_JOBS)
@@ -0,0 +1,283 @@
+import csv
+import io
+import json
+import zlib
+import importlib.util
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import Dict, Any, List, Optional, Callable
+from aws_xray_sdk.core import xray_recorder
+from configuration import Config
+from modelos import SaldoDiario
+from operacoes import iterar_saldos_relatorio
+from bootstrap import medir_import
+
+config = Config()
+
+# Partes do multipart upload (mínimo de 5 MiB exceto a última)
+TAMANHO_PARTE = 8 * 1024 * 1024
+
+# Casas decimais das colunas de valor no Parquet (decimal128)
+ESCALA_PARQUET = 4
+
+COLUNAS_EXPORTACAO = [
+    'data', 'saldo_inicial', 'total_creditos', 'total_debitos',
+    'saldo_final', 'quantidade_lancamentos', 'ultima_atualizacao'
+]
+
+# formato -> (extensão, Content-Type, Content-Encoding)
+FORMATOS_EXPORTACAO = {
+    'ndjson': ('ndjson.gz', 'application/x-ndjson', 'gzip'),
+    'csv': ('csv.gz', 'text/csv', 'gzip'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet', None)
+}
+
+
+class FormatoIndisponivelError(Exception):
+    pass
+
+
+def formato_disponivel(formato: str) -> bool:
+    # Parquet depende do pyarrow, fornecido por layer da função
+    if formato == 'parquet':
+        return importlib.util.find_spec('pyarrow') is not None
+    return formato in FORMATOS_EXPORTACAO
+
+
+class UploadMultipartS3:
+    """
+    Arquivo somente escrita sobre um multipart upload: os bytes são acumulados
+    até TAMANHO_PARTE e enviados como partes, sem manter o objeto em memória
+    """
+
+    def __init__(self, bucket: str, key: str, content_type: str, content_encoding: Optional[str] = None):
+        self.bucket = bucket
+        self.key = key
+        self._buffer = bytearray()
+        self._partes = []
+        self._posicao = 0
+        self.closed = False
+
+        kwargs = {
+            'Bucket': bucket,
+            'Key': key,
+            'ContentType': content_type,
+            'ServerSideEncryption': 'aws:kms'
+        }
+        if content_encoding:
+            kwargs['ContentEncoding'] = content_encoding
+        self.upload_id = config.s3Client.create_multipart_upload(**kwargs)['UploadId']
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._posicao
+
+    def flush(self) -> None:
+        pass
+
+    def write(self, dados) -> int:
+        self._buffer.extend(dados)
+        self._posicao += len(dados)
+        if len(self._buffer) >= TAMANHO_PARTE:
+            self._enviar_parte()
+        return len(dados)
+
+    def _enviar_parte(self) -> None:
+        numero = len(self._partes) + 1
+        response = config.s3Client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=numero,
+            Body=bytes(self._buffer)
+        )
+        self._partes.append({'PartNumber': numero, 'ETag': response['ETag']})
+        self._buffer.clear()
+
+    def close(self) -> None:
+        # O pyarrow fecha o destino ao final da escrita; a conclusão é explícita
+        self.closed = True
+
+    def concluir(self) -> int:
+        if self._buffer or not self._partes:
+            self._enviar_parte()
+
+        config.s3Client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={'Parts': self._partes}
+        )
+        self.closed = True
+        return self._posicao
+
+    def abortar(self) -> None:
+        try:
+            config.s3Client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except BaseException as e:
+            config.logger.warning(f"Erro ao abortar multipart upload {self.key}: {str(e)}")
+
+
+class EscritorGzip:
+    """
+    Comprime em gzip de forma incremental o texto gerado por cada lote
+    """
+
+    def __init__(self, destino: UploadMultipartS3):
+        self.destino = destino
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def _escrever_texto(self, texto: str) -> None:
+        self.destino.write(self._compressor.compress(texto.encode('utf-8')))
+
+    def fechar(self) -> None:
+        self.destino.write(self._compressor.flush())
+
+
+class EscritorNdjson(EscritorGzip):
+
+    def escrever(self, saldos: List[SaldoDiario]) -> None:
+        self._escrever_texto(''.join(
+            json.dumps(linha_exportacao(saldo), ensure_ascii=False) + '\n' for saldo in saldos
+        ))
+
+
+class EscritorCsv(EscritorGzip):
+
+    def __init__(self, destino: UploadMultipartS3):
+        super().__init__(destino)
+        self._escrever_linhas([COLUNAS_EXPORTACAO])
+
+    def _escrever_linhas(self, linhas: List[List[Any]]) -> None:
+        texto = io.StringIO()
+        csv.writer(texto, lineterminator='\n').writerows(linhas)
+        self._escrever_texto(texto.getvalue())
+
+    def escrever(self, saldos: List[SaldoDiario]) -> None:
+        self._escrever_linhas([
+            [linha[coluna] for coluna in COLUNAS_EXPORTACAO]
+            for linha in map(linha_exportacao, saldos)
+        ])
+
+
+class EscritorParquet:
+    """
+    Grava um row group por lote de dias, com valores em decimal128
+    """
+
+    def __init__(self, destino: UploadMultipartS3):
+        try:
+            with medir_import('pyarrow'):
+                import pyarrow
+                import pyarrow.parquet
+        except ImportError:
+            raise FormatoIndisponivelError('Formato parquet requer o pyarrow na função')
+
+        self._pa = pyarrow
+        decimal = pyarrow.decimal128(38, ESCALA_PARQUET)
+        self._schema = pyarrow.schema([
+            ('data', pyarrow.string()),
+            ('saldo_inicial', decimal),
+            ('total_creditos', decimal),
+            ('total_debitos', decimal),
+            ('saldo_final', decimal),
+            ('quantidade_lancamentos', pyarrow.int64()),
+            ('ultima_atualizacao', pyarrow.string())
+        ])
+        self._writer = pyarrow.parquet.ParquetWriter(destino, self._schema, compression='snappy')
+
+    def escrever(self, saldos: List[SaldoDiario]) -> None:
+        escala = Decimal(1).scaleb(-ESCALA_PARQUET)
+
+        def quantizar(valor: Decimal) -> Decimal:
+            return valor.quantize(escala, rounding=ROUND_HALF_EVEN)
+
+        colunas = {
+            'data': [saldo.data for saldo in saldos],
+            'saldo_inicial': [quantizar(saldo.saldo_inicial) for saldo in saldos],
+            'total_creditos': [quantizar(saldo.total_creditos) for saldo in saldos],
+            'total_debitos': [quantizar(saldo.total_debitos) for saldo in saldos],
+            'saldo_final': [quantizar(saldo.saldo_final) for saldo in saldos],
+            'quantidade_lancamentos': [saldo.quantidade_lancamentos for saldo in saldos],
+            'ultima_atualizacao': [saldo.ultima_atualizacao for saldo in saldos]
+        }
+        self._writer.write_table(self._pa.Table.from_pydict(colunas, schema=self._schema))
+
+    def fechar(self) -> None:
+        self._writer.close()
+
+
+ESCRITORES = {
+    'ndjson': EscritorNdjson,
+    'csv': EscritorCsv,
+    'parquet': EscritorParquet
+}
+
+
+def linha_exportacao(saldo: SaldoDiario) -> Dict[str, Any]:
+    # Decimal como string, como no backup JSON do relatório
+    return {
+        'data': saldo.data,
+        'saldo_inicial': str(saldo.saldo_inicial),
+        'total_creditos': str(saldo.total_creditos),
+        'total_debitos': str(saldo.total_debitos),
+        'saldo_final': str(saldo.saldo_final),
+        'quantidade_lancamentos': saldo.quantidade_lancamentos,
+        'ultima_atualizacao': saldo.ultima_atualizacao
+    }
+
+
+@xray_recorder.capture('exportar_relatorio_s3')
+def exportar_relatorio_s3(data_inicio: str, data_fim: str, formato: str,
+                          progresso: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Exporta os saldos diários do período para o S3 no formato pedido, lendo e
+    enviando um lote de dias por vez (multipart upload). Não usa o cache para
+    não deslocar as chaves mais acessadas.
+    """
+    extensao, content_type, content_encoding = FORMATOS_EXPORTACAO[formato]
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
+    key = f"relatorios/{config.environment}/{data_inicio}_to_{data_fim}_{timestamp}.{extensao}"
+
+    upload = UploadMultipartS3(config.S3_BUCKET, key, content_type, content_encoding)
+    linhas = 0
+    total_creditos = Decimal('0')
+    total_debitos = Decimal('0')
+    primeiro = None
+    ultimo = None
+
+    try:
+        escritor = ESCRITORES[formato](upload)
+        for saldos in iterar_saldos_relatorio(data_inicio, data_fim, use_cache=False, progresso=progresso):
+            escritor.escrever(saldos)
+
+            linhas += len(saldos)
+            total_creditos += sum((saldo.total_creditos for saldo in saldos), Decimal('0'))
+            total_debitos += sum((saldo.total_debitos for saldo in saldos), Decimal('0'))
+            primeiro = primeiro or saldos[0]
+            ultimo = saldos[-1]
+
+        escritor.fechar()
+        tamanho = upload.concluir()
+
+    except BaseException:
+        upload.abortar()
+        raise
+
+    config.logger.info(f"Relatório exportado para s3://{config.S3_BUCKET}/{key}: {linhas} dias, {tamanho} bytes")
+
+    return {
+        'bucket': config.S3_BUCKET,
+        'key': key,
+        'formato': formato,
+        'linhas': linhas,
+        'bytes': tamanho,
+        'resumo': {
+            'saldo_inicial_periodo': primeiro.saldo_inicial if primeiro else Decimal('0'),
+            'saldo_final_periodo': ultimo.saldo_final if ultimo else Decimal('0'),
+            'total_creditos_periodo': total_creditos,
+            'total_debitos_periodo': total_debitos
+        }
+    }
@@ -1,17 +1,23 @@
+import bootstrap
+
+bootstrap.configurar_tracing()
+bootstrap.importar('configuration', 'redis_ops', 'operacoes', 'utils')
+
 import json
 from typing import Dict, Any
 from aws_xray_sdk.core import xray_recorder
-from aws_xray_sdk.core import patch_all
 from configuration import Config
-from sqs import handle_sqs_event
 from utils import create_response, route_http_request
+from redis_ops import estatisticas_cache_local
+from operacoes import materializar_janelas_metricas
 
-patch_all()
 config = Config()
 
 
 @xray_recorder.capture('lambda_handler')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    bootstrap.registrar_relatorio_import(config.logger)
+
     try:
         # Log da requisição
         config.logger.info(f"Evento recebido: {json.dumps(event, default=str)}")
@@ -19,24 +25,32 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         # Verificar tipo de evento
         if 'Records' in event:
             # Evento do SQS
-            handle_sqs_event(event)
-            return {'statusCode': 200, 'body': 'SQS events processed successfully'}
+            # Retorna batchItemFailures (ReportBatchItemFailures)
+            with bootstrap.medir_import('sqs'):
+                from sqs import handle_sqs_event
+            return handle_sqs_event(event)
+
+        elif event.get('source') == 'aws.events':
+            # Tick diário (EventBridge): janelas móveis de /metricas
+            return materializar_janelas_metricas()
 
         elif 'httpMethod' in event:
             # Requisição HTTP do API Gateway
-            return route_http_request(event)
+            response = route_http_request(event)
+            config.logger.info(f"CACHE_LOCAL {json.dumps(estatisticas_cache_local())}")
+            return response
 
         else:
             # Evento direto (para testes)
             return create_response(400, {
                 'error': 'Tipo de evento não suportado',
-                'message': 'Esta Lambda suporta apenas eventos SQS e HTTP'
+                'message': 'Esta Lambda suporta apenas eventos SQS, HTTP e o agendamento das métricas'
             })
 
     except BaseException as e:
         config.logger.error(f"Erro inesperado no handler: {str(e)}", exc_info=True)
-        if 'Records' in event:
-            # Para eventos SQS, relançar exceção
+        if 'Records' in event or event.get('source') == 'aws.events':
+            # Para eventos SQS e o agendamento, relançar exceção (nova tentativa)
             raise
         else:
             # Para HTTP, retornar erro
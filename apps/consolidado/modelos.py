@@ -0,0 +1,29 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, Any, List
+
+
+@dataclass
+class SaldoDiario:
+    """Classe para representar saldo diário"""
+    data: str
+    saldo_inicial: Decimal
+    total_creditos: Decimal
+    total_debitos: Decimal
+    saldo_final: Decimal
+    quantidade_lancamentos: int
+    ultima_atualizacao: str
+    contadores: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class RelatorioConsolidado:
+    """Classe para relatório consolidado"""
+    periodo_inicio: str
+    periodo_fim: str
+    saldo_inicial_periodo: Decimal
+    saldo_final_periodo: Decimal
+    total_creditos_periodo: Decimal
+    total_debitos_periodo: Decimal
+    quantidade_dias: int
+    saldos_diarios: List[SaldoDiario]
@@ -1,58 +1,221 @@
 import json
-from datetime import datetime, timezone, timedelta
-from typing import Dict, Any, List, Optional
+from datetime import datetime, date, timezone, timedelta
+from typing import Dict, Any, List, Optional, Tuple, Callable
 from aws_xray_sdk.core import xray_recorder
-from aws_xray_sdk.core import patch_all
 from decimal import Decimal
 from configuration import Config
-from dataclasses import dataclass, asdict
-from redis_ops import get_from_cache, set_cache, invalidate_cache
+from modelos import SaldoDiario, RelatorioConsolidado
+from concurrent.futures import ThreadPoolExecutor
+import calendar
+import random
+import time
+from botocore.exceptions import ClientError
+from redis_ops import get_from_cache, set_cache, delete_cache, get_many_from_cache, set_many_cache, invalidate_cache_from_date, \
+    serializar_json
+from cache_codec import codificar_saldo, decodificar_saldo, codificar_relatorio, decodificar_relatorio, is_binario
 
-patch_all()
 config = Config()
 
-@dataclass
-class SaldoDiario:
-    """Classe para representar saldo diário"""
-    data: str
-    saldo_inicial: Decimal
-    total_creditos: Decimal
-    total_debitos: Decimal
-    saldo_final: Decimal
-    quantidade_lancamentos: int
-    ultima_atualizacao: str
-
-
-@dataclass
-class RelatorioConsolidado:
-    """Classe para relatório consolidado"""
-    periodo_inicio: str
-    periodo_fim: str
-    saldo_inicial_periodo: Decimal
-    saldo_final_periodo: Decimal
-    total_creditos_periodo: Decimal
-    total_debitos_periodo: Decimal
-    quantidade_dias: int
-    saldos_diarios: List[SaldoDiario]
+# Pool reutilizado entre invocações da mesma instância (warm start); as
+# threads usam o client DynamoDB compartilhado, que é thread-safe
+_dynamodb_executor = ThreadPoolExecutor(max_workers=config.DYNAMODB_MAX_WORKERS)
+
+# Marcadores de idempotência dos lançamentos já aplicados ao consolidado
+PREFIXO_MARCADOR_LANCAMENTO = 'LANCAMENTO#'
+MARCADOR_TTL_DIAS = 14
+
+# Recálculo do dia: marcadores gravados na mesma transação da linha (limite de
+# 100 itens) e tentativas quando um delta concorrente altera a linha
+MAX_MARCADORES_LINHA = 99
+MAX_TENTATIVAS_RECALCULO = 5
+
+# Rollups mensais (MES#YYYY-MM) e anuais (ANO#YYYY) com totais do período
+PREFIXO_ROLLUP_MES = 'MES#'
+PREFIXO_ROLLUP_ANO = 'ANO#'
+ROLLUP_UPDATE_EXPRESSION = (
+    'SET ultima_atualizacao = :agora, ambiente = :ambiente '
+    'ADD total_creditos :creditos, total_debitos :debitos, quantidade_lancamentos :quantidade'
+)
+
+# Contadores por tipo e categoria/tag nas linhas do dia e nos rollups, em
+# atributos de primeiro nível (valor#<tipo>#<categoria>, qtd#<tipo>#<categoria>,
+# tag_valor#<tipo>#<tag> e tag_qtd#<tipo>#<tag>) para que o ADD funcione sem
+# inicializar um mapa
+PREFIXO_CONTADOR_VALOR = 'valor#'
+PREFIXO_CONTADOR_QUANTIDADE = 'qtd#'
+PREFIXO_CONTADOR_TAG_VALOR = 'tag_valor#'
+PREFIXO_CONTADOR_TAG_QUANTIDADE = 'tag_qtd#'
+PREFIXOS_CONTADOR = (
+    PREFIXO_CONTADOR_VALOR, PREFIXO_CONTADOR_QUANTIDADE,
+    PREFIXO_CONTADOR_TAG_VALOR, PREFIXO_CONTADOR_TAG_QUANTIDADE
+)
+CATEGORIA_PADRAO = 'GERAL'
+
+# Contadores mantidos no rollup anual: só por categoria (as tags ficam nas
+# linhas do dia e no rollup mensal para o ano não crescer sem limite)
+PREFIXOS_CONTADOR_ANO = (PREFIXO_CONTADOR_VALOR, PREFIXO_CONTADOR_QUANTIDADE)
+
+# Mesmos limites da validação na entrada (mensagens antigas ainda na fila)
+MAX_TAGS_LANCAMENTO = 10
+MAX_TAMANHO_TAG = 50
+
+# Limite de contadores por UpdateExpression (expressões têm no máximo 4 KB)
+MAX_CONTADORES_TRANSACAO = 200
+
+# Dimensões de breakdown: prefixos dos contadores de valor e de quantidade
+DIMENSOES_BREAKDOWN = {
+    'categoria': (PREFIXO_CONTADOR_VALOR, PREFIXO_CONTADOR_QUANTIDADE),
+    'tag': (PREFIXO_CONTADOR_TAG_VALOR, PREFIXO_CONTADOR_TAG_QUANTIDADE)
+}
+
+# Janelas do endpoint /metricas, em dias antes de hoje
+PERIODOS_METRICAS = {'7d': 7, '30d': 30, '90d': 90, '1y': 365}
+
+# Janelas móveis materializadas (JANELA#<periodo>#<data_fim>): totais, volume
+# de cada metade e o volume de cada dia em atributos de primeiro nível
+# (vol#<dia>), mantidos pelos deltas da consolidação e regravados pelo tick diário
+PREFIXO_JANELA_METRICAS = 'JANELA#'
+PREFIXO_VOLUME_DIA = 'vol#'
+JANELA_METRICAS_TTL_DIAS = 2
+MAX_TENTATIVAS_JANELA = 5
+
+# Dias (vol#<dia>) por UpdateItem de janela: cada dia soma
+# um nome e um valor de expressão (expressões têm no máximo 4 KB)
+MAX_DIAS_UPDATE_JANELA = 150
+
+# Itens por transação (limite de 100): marcadores, dia e mês. O rollup anual e
+# as janelas de métricas, comuns a todos os deltas, são somados fora dela
+MAX_LANCAMENTOS_TRANSACAO = 100 - 2
+
+# Tentativas da transação do delta cancelada por conflito com outra transação
+# nos mesmos itens (linha do dia ou rollup mensal)
+MAX_TENTATIVAS_TRANSACAO = 5
+
+def listar_dias(data_inicio: str, data_fim: str) -> List[str]:
+    """
+    Lista os dias (YYYY-MM-DD) entre duas datas/timestamps ISO, inclusive
+    """
+    dia_atual = datetime.fromisoformat(data_inicio[:10])
+    dia_fim = datetime.fromisoformat(data_fim[:10])
+
+    dias = []
+    while dia_atual <= dia_fim:
+        dias.append(dia_atual.strftime('%Y-%m-%d'))
+        dia_atual += timedelta(days=1)
+
+    return dias
+
+
+def executar_paralelo(funcao, argumentos: List[tuple]) -> List[Any]:
+    """
+    Executa funcao(*args) para cada item de argumentos no pool de threads,
+    propagando o segmento X-Ray corrente e preservando a ordem dos resultados.
+    funcao não deve chamar executar_paralelo (o pool é compartilhado).
+    """
+    trace_entity = xray_recorder.get_trace_entity()
+
+    def executar(args):
+        xray_recorder.set_trace_entity(trace_entity)
+        try:
+            return funcao(*args)
+        finally:
+            xray_recorder.clear_trace_entities()
+
+    return list(_dynamodb_executor.map(executar, argumentos))
+
+
+def paginar(operacao, **kwargs) -> List[Dict[str, Any]]:
+    """
+    Executa uma Query/Scan seguindo LastEvaluatedKey até o fim
+    """
+    items = []
+    while True:
+        response = operacao(**kwargs)
+        items.extend(response.get('Items', []))
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    return items
+
+
+def query_lancamentos_dia(dia: str, data_inicio: str, data_fim: str) -> List[Dict[str, Any]]:
+    """
+    Recupera os lançamentos ativos de um dia via índice data_dia-data-index
+    """
+    return paginar(
+        config.dynamodbClient.query,
+        TableName=config.DYNAMODB_TABLE_LANCAMENTOS,
+        IndexName=config.DYNAMODB_INDEX_DATA_DIA,
+        KeyConditionExpression='data_dia = :dia AND #data BETWEEN :data_inicio AND :data_fim',
+        FilterExpression='#status = :status',
+        ExpressionAttributeNames={
+            '#data': 'data',
+            '#status': 'status'
+        },
+        ExpressionAttributeValues={
+            ':dia': dia,
+            ':data_inicio': data_inicio,
+            ':data_fim': data_fim,
+            ':status': 'ATIVO'
+        }
+    )
+
+
+def scan_lancamentos_segmento(segmento: int, total_segmentos: int, data_inicio: str, data_fim: str) -> List[Dict[str, Any]]:
+    """
+    Lê um segmento do Scan paralelo filtrando pelo período
+    """
+    return paginar(
+        config.dynamodbClient.scan,
+        TableName=config.DYNAMODB_TABLE_LANCAMENTOS,
+        Segment=segmento,
+        TotalSegments=total_segmentos,
+        FilterExpression='#data BETWEEN :data_inicio AND :data_fim AND #status = :status',
+        ExpressionAttributeNames={
+            '#data': 'data',
+            '#status': 'status'
+        },
+        ExpressionAttributeValues={
+            ':data_inicio': data_inicio,
+            ':data_fim': data_fim,
+            ':status': 'ATIVO'
+        }
+    )
+
 
 @xray_recorder.capture('get_lancamentos_by_date_range')
-def get_lancamentos_by_date_range(data_inicio: str, data_fim: str) -> List[Dict[str, Any]]:
+def get_lancamentos_by_date_range(data_inicio: str, data_fim: str, paralelo: bool = False) -> List[Dict[str, Any]]:
+    """
+    Recupera os lançamentos ativos do período, com todas as páginas.
+    Com paralelo=True as Queries por dia rodam no pool de threads e, para janelas
+    a partir de SCAN_PARALELO_MIN_DIAS, usa Scan paralelo (Segment/TotalSegments).
+    """
     try:
-        #TODO: criar índice na tabela e retirar o scan
-        response = config.tableLancamentos.scan(
-            FilterExpression='#data BETWEEN :data_inicio AND :data_fim AND #status = :status',
-            ExpressionAttributeNames={
-                '#data': 'data',
-                '#status': 'status'
-            },
-            ExpressionAttributeValues={
-                ':data_inicio': data_inicio,
-                ':data_fim': data_fim,
-                ':status': 'ATIVO'
-            }
-        )
+        dias = listar_dias(data_inicio, data_fim)
+
+        if not paralelo or len(dias) == 1:
+            # Uma Query por dia do período no índice particionado por dia
+            lancamentos = []
+            for dia in dias:
+                lancamentos.extend(query_lancamentos_dia(dia, data_inicio, data_fim))
+            return lancamentos
+
+        if len(dias) >= config.SCAN_PARALELO_MIN_DIAS:
+            total_segmentos = config.DYNAMODB_SCAN_SEGMENTS
+            resultados = executar_paralelo(
+                scan_lancamentos_segmento,
+                [(segmento, total_segmentos, data_inicio, data_fim) for segmento in range(total_segmentos)]
+            )
+        else:
+            resultados = executar_paralelo(
+                query_lancamentos_dia,
+                [(dia, data_inicio, data_fim) for dia in dias]
+            )
 
-        return response['Items']
+        return [lancamento for resultado in resultados for lancamento in resultado]
 
     except BaseException as e:
         config.logger.error(f"Erro ao recuperar lançamentos: {str(e)}")
@@ -60,9 +223,11 @@ def get_lancamentos_by_date_range(data_inicio: str, data_fim: str) -> List[Dict[
 
 
 @xray_recorder.capture('calculate_saldo_diario')
-def calculate_saldo_diario(data: str, saldo_anterior: Decimal = Decimal('0')) -> SaldoDiario:
+def calculate_saldo_diario(data: str, saldo_anterior: Decimal = Decimal('0'),
+                           lancamentos: Optional[List[Dict[str, Any]]] = None) -> SaldoDiario:
     """
-    Calcula saldo diário para uma data específica
+    Calcula saldo diário para uma data específica (a partir dos lançamentos
+    informados ou, sem eles, dos lançamentos ativos do dia)
     """
     # Garantir que saldo_anterior seja Decimal
     if not isinstance(saldo_anterior, Decimal):
@@ -73,9 +238,31 @@ def calculate_saldo_diario(data: str, saldo_anterior: Decimal = Decimal('0')) ->
     data_fim = f"{data}T23:59:59"
 
     # Recuperar lançamentos do dia
-    lancamentos = get_lancamentos_by_date_range(data_inicio, data_fim)
+    if lancamentos is None:
+        lancamentos = get_lancamentos_by_date_range(data_inicio, data_fim)
 
     # Calcular totais
+    total_creditos, total_debitos = somar_lancamentos(lancamentos)
+
+    # Calcular saldo final
+    saldo_final = saldo_anterior + total_creditos - total_debitos
+
+    return SaldoDiario(
+        data=data,
+        saldo_inicial=saldo_anterior,
+        total_creditos=total_creditos,
+        total_debitos=total_debitos,
+        saldo_final=saldo_final,
+        quantidade_lancamentos=len(lancamentos),
+        ultima_atualizacao=datetime.now(timezone.utc).isoformat(),
+        contadores=contadores_lancamentos(lancamentos)
+    )
+
+
+def somar_lancamentos(lancamentos: List[Dict[str, Any]]) -> Tuple[Decimal, Decimal]:
+    """
+    Soma créditos e débitos dos lançamentos
+    """
     total_creditos = Decimal('0')
     total_debitos = Decimal('0')
 
@@ -86,47 +273,679 @@ def calculate_saldo_diario(data: str, saldo_anterior: Decimal = Decimal('0')) ->
             valor = valor_raw
         else:
             valor = Decimal(str(valor_raw))
-        
+
         tipo = lancamento.get('tipo', '')
         if tipo == 'CREDITO':
             total_creditos += valor
         elif tipo == 'DEBITO':
             total_debitos += valor
 
-    # Calcular saldo final
-    saldo_final = saldo_anterior + total_creditos - total_debitos
+    return total_creditos, total_debitos
 
-    return SaldoDiario(
-        data=data,
-        saldo_inicial=saldo_anterior,
-        total_creditos=total_creditos,
-        total_debitos=total_debitos,
-        saldo_final=saldo_final,
-        quantidade_lancamentos=len(lancamentos),
-        ultima_atualizacao=datetime.now(timezone.utc).isoformat()
-    )
 
+def contadores_lancamentos(lancamentos: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Soma valor e quantidade dos lançamentos por tipo e categoria e por tipo e tag
+    """
+    contadores: Dict[str, Any] = {}
+
+    def somar(prefixo_valor: str, prefixo_quantidade: str, sufixo: str, valor: Decimal) -> None:
+        chave_valor = f"{prefixo_valor}{sufixo}"
+        chave_quantidade = f"{prefixo_quantidade}{sufixo}"
+        contadores[chave_valor] = contadores.get(chave_valor, Decimal('0')) + valor
+        contadores[chave_quantidade] = contadores.get(chave_quantidade, 0) + 1
+
+    for lancamento in lancamentos:
+        tipo = lancamento.get('tipo', '')
+        valor = Decimal(str(lancamento.get('valor', 0)))
+
+        somar(PREFIXO_CONTADOR_VALOR, PREFIXO_CONTADOR_QUANTIDADE,
+              f"{tipo}#{lancamento.get('categoria') or CATEGORIA_PADRAO}", valor)
+
+        for tag in tags_contadores(lancamento.get('tags')):
+            somar(PREFIXO_CONTADOR_TAG_VALOR, PREFIXO_CONTADOR_TAG_QUANTIDADE, f"{tipo}#{tag}", valor)
+
+    return contadores
+
+
+def tags_contadores(tags: Any) -> List[str]:
+    """
+    Tags válidas do lançamento para os contadores: textos não vazios dentro do
+    tamanho máximo, sem repetições e limitadas a MAX_TAGS_LANCAMENTO
+    """
+    if not isinstance(tags, list):
+        return []
+    validas = sorted({
+        tag.strip() for tag in tags
+        if isinstance(tag, str) and tag.strip() and len(tag.strip()) <= MAX_TAMANHO_TAG
+    })
+    return validas[:MAX_TAGS_LANCAMENTO]
+
+
+def contadores_rollup(chave: str, contadores: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Contadores gravados no rollup da chave (o anual não recebe os de tag)
+    """
+    if not chave.startswith(PREFIXO_ROLLUP_ANO):
+        return contadores
+    return {contador: valor for contador, valor in contadores.items() if contador.startswith(PREFIXOS_CONTADOR_ANO)}
+
+
+def extrair_contadores(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Contadores por tipo/categoria e tipo/tag presentes em uma linha do consolidado
+    """
+    return {
+        chave: int(valor) if chave.startswith((PREFIXO_CONTADOR_QUANTIDADE, PREFIXO_CONTADOR_TAG_QUANTIDADE))
+        else Decimal(str(valor))
+        for chave, valor in item.items()
+        if chave.startswith(PREFIXOS_CONTADOR)
+    }
+
+
+def diferenca_contadores(novos: Dict[str, Any], anteriores: Dict[str, Any]) -> Dict[str, Any]:
+    diferenca = {}
+    for chave in set(novos) | set(anteriores):
+        delta = novos.get(chave, 0) - anteriores.get(chave, 0)
+        if delta:
+            diferenca[chave] = delta
+    return diferenca
+
+
+def add_contadores_expression(contadores: Dict[str, Any]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """
+    Trecho ADD (com nomes e valores de expressão) que soma os contadores
+    """
+    partes = []
+    nomes = {}
+    valores = {}
+    for indice, (chave, valor) in enumerate(sorted(contadores.items())):
+        partes.append(f"#ct{indice} :ct{indice}")
+        nomes[f"#ct{indice}"] = chave
+        valores[f":ct{indice}"] = valor
+    return ', '.join(partes), nomes, valores
+
+
+def saldo_to_item(saldo: SaldoDiario) -> Dict[str, Any]:
+    """
+    Linha do consolidado (DynamoDB) do saldo diário
+    """
+    return {
+        'data': saldo.data,
+        'mes': saldo.data[:7],
+        'saldo_inicial': saldo.saldo_inicial,
+        'total_creditos': saldo.total_creditos,
+        'total_debitos': saldo.total_debitos,
+        'saldo_final': saldo.saldo_final,
+        'quantidade_lancamentos': saldo.quantidade_lancamentos,
+        'ultima_atualizacao': saldo.ultima_atualizacao,
+        'ambiente': config.environment,
+        **saldo.contadores
+    }
+
+
+def marcador_lancamento(lancamento_id: str, data: str, expira_em: int) -> Dict[str, Any]:
+    """
+    Marcador LANCAMENTO#<id> de um lançamento já somado na linha do dia
+    """
+    return {
+        'data': f"{PREFIXO_MARCADOR_LANCAMENTO}{lancamento_id}",
+        'data_lancamento': data,
+        'expira_em': expira_em
+    }
+
+
+def expiracao_marcadores() -> int:
+    return int((datetime.now(timezone.utc) + timedelta(days=MARCADOR_TTL_DIAS)).timestamp())
+
+
+def condicao_linha(anterior: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Condição da gravação da linha do dia: continuar como foi lida (todo delta
+    e toda propagação atualizam ultima_atualizacao) ou continuar inexistente
+    """
+    if anterior:
+        return {
+            'ConditionExpression': 'ultima_atualizacao = :ultima_atualizacao',
+            'ExpressionAttributeValues': {':ultima_atualizacao': anterior['ultima_atualizacao']}
+        }
+    return {
+        'ConditionExpression': 'attribute_not_exists(#data)',
+        'ExpressionAttributeNames': {'#data': 'data'}
+    }
+
+
+def gravar_linha_com_marcadores(saldo: SaldoDiario, lancamento_ids: List[str], condicao: Dict[str, Any]) -> bool:
+    """
+    Grava a linha do dia e os marcadores LANCAMENTO# dos lançamentos somados
+    nela (até MAX_MARCADORES_LINHA) em uma única transação condicionada à
+    linha. Um delta desses lançamentos aplicado antes altera a linha e cancela
+    a gravação; um aplicado depois encontra o marcador e é ignorado.
+    Retorna False se a transação foi cancelada.
+    """
+    expira_em = expiracao_marcadores()
+    transact_items = [{
+        'Put': {
+            'TableName': config.DYNAMODB_TABLE_CONSOLIDADO,
+            'Item': saldo_to_item(saldo),
+            **condicao
+        }
+    }]
+    for lancamento_id in lancamento_ids:
+        transact_items.append({
+            'Put': {
+                'TableName': config.DYNAMODB_TABLE_CONSOLIDADO,
+                'Item': marcador_lancamento(lancamento_id, saldo.data, expira_em)
+            }
+        })
 
-@xray_recorder.capture('save_saldo_diario')
-def save_saldo_diario(saldo: SaldoDiario) -> None:
     try:
-        item = {
-            'data': saldo.data,
-            'saldo_inicial': saldo.saldo_inicial,
-            'total_creditos': saldo.total_creditos,
-            'total_debitos': saldo.total_debitos,
-            'saldo_final': saldo.saldo_final,
-            'quantidade_lancamentos': saldo.quantidade_lancamentos,
-            'ultima_atualizacao': saldo.ultima_atualizacao,
-            'ambiente': config.environment
+        # Client (thread-safe) do resource: aceita valores nativos
+        config.dynamodbClient.transact_write_items(TransactItems=transact_items)
+        return True
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        return False
+
+
+def gravar_marcadores(data: str, lancamento_ids: List[str]) -> None:
+    """
+    Grava em lote marcadores LANCAMENTO# (os que não cabem na transação da linha)
+    """
+    if not lancamento_ids:
+        return
+
+    expira_em = expiracao_marcadores()
+    with config.tableConsolidado.batch_writer(overwrite_by_pkeys=['data']) as batch:
+        for lancamento_id in lancamento_ids:
+            batch.put_item(Item=marcador_lancamento(lancamento_id, data, expira_em))
+
+
+def aplicar_diferenca_linha(saldo: SaldoDiario, anterior: Dict[str, Any]) -> None:
+    """
+    Mantém rollups e janelas de métricas coerentes com a diferença entre a
+    linha gravada e a anterior
+    """
+    creditos = saldo.total_creditos - Decimal(str(anterior.get('total_creditos', 0)))
+    debitos = saldo.total_debitos - Decimal(str(anterior.get('total_debitos', 0)))
+    quantidade = saldo.quantidade_lancamentos - int(anterior.get('quantidade_lancamentos', 0))
+    update_rollups(
+        saldo.data, creditos, debitos, quantidade,
+        diferenca_contadores(saldo.contadores, extrair_contadores(anterior))
+    )
+    update_janelas_metricas({saldo.data: (creditos, debitos, quantidade)})
+
+
+@xray_recorder.capture('apply_lancamentos_delta')
+def apply_lancamentos_delta(data: str, lancamentos: List[Dict[str, Any]]) -> List[str]:
+    """
+    Aplica lançamentos de um mesmo dia ao consolidado de forma incremental e atômica.
+    Cada lançamento ({'lancamentoId', 'tipo', 'valor', 'categoria'}) grava o marcador LANCAMENTO#<id>
+    na mesma transação do UpdateItem do dia, tornando o processamento idempotente.
+    O rollup anual e as janelas de métricas recebem o delta de cada transação
+    confirmada em seguida, fora dela.
+    Retorna os IDs efetivamente aplicados (já aplicados anteriormente são ignorados).
+    """
+    # Remover duplicados (uma transação não aceita duas operações no mesmo item)
+    pendentes = list({l['lancamentoId']: l for l in lancamentos}.values())
+    aplicados = []
+
+    # Usado apenas se a linha do dia ainda não existir
+    saldo_inicial = get_saldo_anterior(data)
+
+    while pendentes:
+        # Limite de 100 itens por transação: marcadores + dia e mês
+        lote, pendentes = separar_lote(pendentes)
+        conflitos = 0
+
+        while lote:
+            try:
+                config.dynamodbClient.transact_write_items(
+                    TransactItems=build_delta_transaction(data, lote, saldo_inicial)
+                )
+                aplicados.extend(l['lancamentoId'] for l in lote)
+                apply_delta_agregados(data, lote)
+                break
+
+            except ClientError as e:
+                reasons = e.response.get('CancellationReasons', [])
+                duplicados = {
+                    lote[i]['lancamentoId'] for i, reason in enumerate(reasons[:len(lote)])
+                    if reason.get('Code') == 'ConditionalCheckFailed'
+                }
+                if duplicados:
+                    # Repetir a transação sem os lançamentos já aplicados
+                    config.logger.info(f"Lançamentos já aplicados, ignorando: {sorted(duplicados)}")
+                    lote = [l for l in lote if l['lancamentoId'] not in duplicados]
+                    continue
+
+                if conflitos < MAX_TENTATIVAS_TRANSACAO and any(
+                        reason.get('Code') == 'TransactionConflict' for reason in reasons):
+                    # Outra transação nos mesmos itens: repetir após uma espera aleatória
+                    time.sleep(random.uniform(0, min(0.05 * 2 ** conflitos, 1)))
+                    conflitos += 1
+                    continue
+
+                config.logger.error(f"Erro ao aplicar delta dos lançamentos: {str(e)}")
+                raise
+
+    if aplicados:
+        config.logger.info(f"Delta de {len(aplicados)} lançamento(s) aplicado em {data}")
+    return aplicados
+
+
+def apply_delta_agregados(data: str, lancamentos: List[Dict[str, Any]]) -> None:
+    """
+    Soma o delta de uma transação confirmada ao rollup anual e às janelas de
+    métricas de hoje, itens que todos os deltas atualizam e que na transação
+    gerariam conflitos entre execuções concorrentes. Os marcadores impedem que
+    uma reentrega some de novo; uma falha aqui é corrigida pelo rebuild_rollups
+    e pelo tick seguinte das janelas.
+    """
+    creditos, debitos = somar_lancamentos(lancamentos)
+    update_rollups(data, creditos, debitos, len(lancamentos), contadores_lancamentos(lancamentos),
+                   chaves=[f"{PREFIXO_ROLLUP_ANO}{data[:4]}"])
+    update_janelas_metricas({data: (creditos, debitos, len(lancamentos))})
+
+
+def separar_lote(pendentes: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Separa o próximo lote da transação: até MAX_LANCAMENTOS_TRANSACAO lançamentos
+    e até MAX_CONTADORES_TRANSACAO contadores distintos (ao menos um lançamento)
+    """
+    lote = []
+    for lancamento in pendentes[:MAX_LANCAMENTOS_TRANSACAO]:
+        if lote and len(contadores_lancamentos(lote + [lancamento])) > MAX_CONTADORES_TRANSACAO:
+            break
+        lote.append(lancamento)
+    return lote, pendentes[len(lote):]
+
+
+def build_delta_transaction(data: str, lancamentos: List[Dict[str, Any]], saldo_inicial: Decimal) -> List[Dict[str, Any]]:
+    """
+    Monta os TransactItems: um Put condicional de marcador por lançamento, um
+    único UpdateItem com o delta somado na linha do dia e o mesmo delta no
+    rollup mensal
+    """
+    agora = datetime.now(timezone.utc)
+    expira_em = expiracao_marcadores()
+
+    creditos = Decimal('0')
+    debitos = Decimal('0')
+    transact_items = []
+
+    for lancamento in lancamentos:
+        valor = Decimal(str(lancamento['valor']))
+        if lancamento['tipo'] == 'CREDITO':
+            creditos += valor
+        elif lancamento['tipo'] == 'DEBITO':
+            debitos += valor
+
+        transact_items.append({
+            'Put': {
+                'TableName': config.DYNAMODB_TABLE_CONSOLIDADO,
+                'Item': marcador_lancamento(lancamento['lancamentoId'], data, expira_em),
+                'ConditionExpression': 'attribute_not_exists(#data)',
+                'ExpressionAttributeNames': {'#data': 'data'}
+            }
+        })
+
+    valores = {
+        ':saldo_inicial': saldo_inicial,
+        ':delta': creditos - debitos,
+        ':creditos': creditos,
+        ':debitos': debitos,
+        ':quantidade': len(lancamentos),
+        ':mes': data[:7],
+        ':agora': agora.isoformat(),
+        ':ambiente': config.environment
+    }
+
+    # Contadores por tipo/categoria e tipo/tag somados no mesmo ADD
+    contadores = contadores_lancamentos(lancamentos)
+    add_contadores, nomes_contadores, valores_contadores = add_contadores_expression(contadores)
+    valores.update(valores_contadores)
+
+    update_dia = {
+        'TableName': config.DYNAMODB_TABLE_CONSOLIDADO,
+        'Key': {'data': data},
+        'UpdateExpression': (
+            'SET saldo_inicial = if_not_exists(saldo_inicial, :saldo_inicial), '
+            'saldo_final = if_not_exists(saldo_final, :saldo_inicial) + :delta, '
+            'mes = :mes, ultima_atualizacao = :agora, ambiente = :ambiente '
+            'ADD total_creditos :creditos, total_debitos :debitos, quantidade_lancamentos :quantidade'
+            f", {add_contadores}"
+        ),
+        'ExpressionAttributeNames': nomes_contadores,
+        'ExpressionAttributeValues': valores
+    }
+    transact_items.append({'Update': update_dia})
+
+    # Rollup mensal recebe o mesmo delta (o anual é somado após a transação)
+    valores_rollup = (':creditos', ':debitos', ':quantidade', ':agora', ':ambiente')
+    transact_items.append({
+        'Update': {
+            'TableName': config.DYNAMODB_TABLE_CONSOLIDADO,
+            'Key': {'data': f"{PREFIXO_ROLLUP_MES}{data[:7]}"},
+            'UpdateExpression': f"{ROLLUP_UPDATE_EXPRESSION}, {add_contadores}",
+            'ExpressionAttributeNames': nomes_contadores,
+            'ExpressionAttributeValues': {
+                **{k: v for k, v in valores.items() if k in valores_rollup},
+                **valores_contadores
+            }
         }
+    })
 
-        config.tableConsolidado.put_item(Item=item)
-        config.logger.info(f"Saldo diário salvo: {saldo.data}")
+    return transact_items
+
+
+def chaves_rollup(data: str) -> List[str]:
+    """
+    Chaves das linhas de rollup (mês e ano) que contêm o dia
+    """
+    return [f"{PREFIXO_ROLLUP_MES}{data[:7]}", f"{PREFIXO_ROLLUP_ANO}{data[:4]}"]
+
+
+def update_rollups(data: str, creditos: Decimal, debitos: Decimal, quantidade: int,
+                   contadores: Optional[Dict[str, Any]] = None, chaves: Optional[List[str]] = None) -> None:
+    """
+    Aplica uma diferença de créditos/débitos/quantidade (e dos contadores por
+    tipo/categoria e tipo/tag) aos rollups do dia (ou apenas às chaves informadas)
+    """
+    if not (creditos or debitos or quantidade or contadores):
+        return
+
+    for chave in chaves or chaves_rollup(data):
+        # Contadores em blocos para respeitar o tamanho máximo da expressão;
+        # os totais entram apenas no primeiro bloco
+        itens_contadores = sorted(contadores_rollup(chave, contadores or {}).items())
+        blocos = [
+            dict(itens_contadores[i:i + MAX_CONTADORES_TRANSACAO])
+            for i in range(0, len(itens_contadores), MAX_CONTADORES_TRANSACAO)
+        ] or [{}]
+
+        for indice, bloco in enumerate(blocos):
+            update_expression = ROLLUP_UPDATE_EXPRESSION
+            update_kwargs = {}
+            valores = {
+                ':creditos': creditos if indice == 0 else Decimal('0'),
+                ':debitos': debitos if indice == 0 else Decimal('0'),
+                ':quantidade': quantidade if indice == 0 else 0,
+                ':agora': datetime.now(timezone.utc).isoformat(),
+                ':ambiente': config.environment
+            }
+
+            if bloco:
+                add_contadores, nomes_contadores, valores_contadores = add_contadores_expression(bloco)
+                update_expression = f"{update_expression}, {add_contadores}"
+                update_kwargs['ExpressionAttributeNames'] = nomes_contadores
+                valores.update(valores_contadores)
+
+            config.tableConsolidado.update_item(
+                Key={'data': chave},
+                UpdateExpression=update_expression,
+                ExpressionAttributeValues=valores,
+                **update_kwargs
+            )
+
+
+@xray_recorder.capture('rebuild_rollups')
+def rebuild_rollups(ano: str) -> int:
+    """
+    Reconstrói os rollups mensais e o anual de um ano a partir das linhas
+    diárias (backfill/reparo; o put substitui o rollup, removendo do anual
+    contadores de tag gravados antes). Retorna a quantidade de rollups gravados.
+    """
+    rollups: Dict[str, Dict[str, Any]] = {}
+
+    for linha in query_saldos_periodo(f"{ano}-01-01", f"{ano}-12-31"):
+        for chave in chaves_rollup(linha['data']):
+            rollup = rollups.setdefault(chave, {
+                'data': chave,
+                'total_creditos': Decimal('0'),
+                'total_debitos': Decimal('0'),
+                'quantidade_lancamentos': 0
+            })
+            rollup['total_creditos'] += Decimal(str(linha['total_creditos']))
+            rollup['total_debitos'] += Decimal(str(linha['total_debitos']))
+            rollup['quantidade_lancamentos'] += int(linha['quantidade_lancamentos'])
+            for contador, valor in contadores_rollup(chave, extrair_contadores(linha)).items():
+                rollup[contador] = rollup.get(contador, 0) + valor
+
+    agora = datetime.now(timezone.utc).isoformat()
+    with config.tableConsolidado.batch_writer() as batch:
+        for rollup in rollups.values():
+            rollup['ultima_atualizacao'] = agora
+            rollup['ambiente'] = config.environment
+            batch.put_item(Item=rollup)
+
+    config.logger.info(f"Rollups de {ano} reconstruídos: {len(rollups)}")
+    return len(rollups)
+
+
+def limites_janela(periodo: str, data_fim: str) -> Tuple[str, str]:
+    """
+    Primeiro dia da janela do período que termina em data_fim e primeiro dia da
+    sua segunda metade (a primeira metade fica com a parte inteira da divisão)
+    """
+    inicio = date.fromisoformat(data_fim) - timedelta(days=PERIODOS_METRICAS[periodo])
+    meio = inicio + timedelta(days=(PERIODOS_METRICAS[periodo] + 1) // 2)
+    return inicio.isoformat(), meio.isoformat()
 
-    except BaseException as e:
-        config.logger.error(f"Erro ao salvar saldo diário: {str(e)}")
-        raise "Erro ao salvar consolidado"
+
+def chave_janela(periodo: str, data_fim: str) -> str:
+    return f"{PREFIXO_JANELA_METRICAS}{periodo}#{data_fim}"
+
+
+def build_janela_update(periodo: str, hoje: str, agora: datetime,
+                        deltas: Dict[str, Tuple[Decimal, Decimal, int]]) -> Optional[Dict[str, Any]]:
+    """
+    UpdateItem que soma diferenças por dia (créditos, débitos, quantidade) à
+    janela do período que termina hoje, ignorando os dias fora dela. Antes do
+    tick a janela é criada parcial (sem materializado_em).
+    """
+    inicio, meio = limites_janela(periodo, hoje)
+    dias = sorted((dia, delta) for dia, delta in deltas.items() if inicio <= dia <= hoje and any(delta))
+    if not dias:
+        return None
+
+    nomes = {'#primeira': 'volume_primeira_metade', '#segunda': 'volume_segunda_metade'}
+    valores = {
+        ':creditos': sum((creditos for _, (creditos, _, _) in dias), Decimal('0')),
+        ':debitos': sum((debitos for _, (_, debitos, _) in dias), Decimal('0')),
+        ':quantidade': sum(quantidade for _, (_, _, quantidade) in dias),
+        ':primeira': sum((creditos + debitos for dia, (creditos, debitos, _) in dias if dia < meio), Decimal('0')),
+        ':segunda': sum((creditos + debitos for dia, (creditos, debitos, _) in dias if dia >= meio), Decimal('0')),
+        ':um': 1,
+        ':inicio': inicio,
+        ':meio': meio,
+        ':fim': hoje,
+        ':expira_em': int((agora + timedelta(days=JANELA_METRICAS_TTL_DIAS)).timestamp()),
+        ':agora': agora.isoformat(),
+        ':ambiente': config.environment
+    }
+
+    # Volume de cada dia somado no mesmo ADD
+    partes = []
+    for indice, (dia, (creditos, debitos, _)) in enumerate(dias):
+        partes.append(f"#vol{indice} :vol{indice}")
+        nomes[f"#vol{indice}"] = f"{PREFIXO_VOLUME_DIA}{dia}"
+        valores[f":vol{indice}"] = creditos + debitos
+
+    return {
+        'TableName': config.DYNAMODB_TABLE_CONSOLIDADO,
+        'Key': {'data': chave_janela(periodo, hoje)},
+        'UpdateExpression': (
+            'SET data_inicio = :inicio, data_meio = :meio, data_fim = :fim, expira_em = :expira_em, '
+            'ultima_atualizacao = :agora, ambiente = :ambiente '
+            'ADD total_creditos :creditos, total_debitos :debitos, quantidade_lancamentos :quantidade, '
+            '#primeira :primeira, #segunda :segunda, versao :um, '
+            f"{', '.join(partes)}"
+        ),
+        'ExpressionAttributeNames': nomes,
+        'ExpressionAttributeValues': valores
+    }
+
+
+def update_janelas_metricas(deltas: Dict[str, Tuple[Decimal, Decimal, int]]) -> None:
+    """
+    Aplica diferenças por dia às janelas de métricas de hoje (após a transação
+    do delta, reprocessamento e lacunas); o tick seguinte corrige divergências
+    """
+    agora = datetime.now(timezone.utc)
+    hoje = agora.strftime('%Y-%m-%d')
+
+    # Dias em blocos para respeitar o tamanho máximo da expressão
+    itens = sorted(deltas.items())
+    for periodo in PERIODOS_METRICAS:
+        for i in range(0, len(itens), MAX_DIAS_UPDATE_JANELA):
+            update_janela = build_janela_update(periodo, hoje, agora, dict(itens[i:i + MAX_DIAS_UPDATE_JANELA]))
+            if update_janela:
+                config.dynamodbClient.update_item(**update_janela)
+
+
+def montar_janela(periodo: str, hoje: str, consistente: bool = False) -> Dict[str, Any]:
+    """
+    Janela do período que termina hoje somada a partir das linhas diárias
+    (sem versao; usada na materialização e como fallback da leitura)
+    """
+    inicio, meio = limites_janela(periodo, hoje)
+
+    volumes = {}
+    creditos = Decimal('0')
+    debitos = Decimal('0')
+    quantidade = 0
+    for dia, linha in batch_get_consolidado(listar_dias(inicio, hoje), consistente=consistente).items():
+        if not int(linha.get('quantidade_lancamentos', 0)):
+            continue
+        creditos += Decimal(str(linha['total_creditos']))
+        debitos += Decimal(str(linha['total_debitos']))
+        quantidade += int(linha['quantidade_lancamentos'])
+        volumes[dia] = Decimal(str(linha['total_creditos'])) + Decimal(str(linha['total_debitos']))
+
+    agora = datetime.now(timezone.utc)
+    return {
+        'data': chave_janela(periodo, hoje),
+        'data_inicio': inicio,
+        'data_meio': meio,
+        'data_fim': hoje,
+        'total_creditos': creditos,
+        'total_debitos': debitos,
+        'quantidade_lancamentos': quantidade,
+        'volume_primeira_metade': sum((volume for dia, volume in volumes.items() if dia < meio), Decimal('0')),
+        'volume_segunda_metade': sum((volume for dia, volume in volumes.items() if dia >= meio), Decimal('0')),
+        'materializado_em': agora.isoformat(),
+        'ultima_atualizacao': agora.isoformat(),
+        'expira_em': int((agora + timedelta(days=JANELA_METRICAS_TTL_DIAS)).timestamp()),
+        'ambiente': config.environment,
+        **{f"{PREFIXO_VOLUME_DIA}{dia}": volume for dia, volume in volumes.items()}
+    }
+
+
+@xray_recorder.capture('materializar_janela')
+def materializar_janela(periodo: str, hoje: str) -> Optional[Dict[str, Any]]:
+    """
+    Regrava a janela do período que termina hoje a partir das linhas diárias
+    (leituras consistentes), já sem os dias que saíram dela. A versão é lida
+    antes das linhas: um delta aplicado no meio da montagem a incrementa e a
+    gravação condicional é refeita. Retorna a janela gravada.
+    """
+    chave = chave_janela(periodo, hoje)
+
+    for _ in range(MAX_TENTATIVAS_JANELA):
+        atual = config.tableConsolidado.get_item(Key={'data': chave}, ConsistentRead=True).get('Item')
+        janela = montar_janela(periodo, hoje, consistente=True)
+        janela['versao'] = int(atual['versao']) if atual else 0
+
+        if atual:
+            condicao = {
+                'ConditionExpression': 'versao = :versao',
+                'ExpressionAttributeValues': {':versao': janela['versao']}
+            }
+        else:
+            condicao = {
+                'ConditionExpression': 'attribute_not_exists(#data)',
+                'ExpressionAttributeNames': {'#data': 'data'}
+            }
+
+        try:
+            config.tableConsolidado.put_item(Item=janela, **condicao)
+            config.logger.info(f"Janela {chave} materializada: {janela['quantidade_lancamentos']} lançamento(s)")
+            return janela
+
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            config.logger.info(f"Janela {chave} alterada durante a materialização, repetindo")
+
+    config.logger.warning(f"Janela {chave} não materializada após {MAX_TENTATIVAS_JANELA} tentativas")
+    return None
+
+
+@xray_recorder.capture('materializar_janelas_metricas')
+def materializar_janelas_metricas() -> Dict[str, Any]:
+    """
+    Tick diário (EventBridge): materializa as janelas que terminam hoje; as de
+    ontem expiram pelo TTL. Falha se alguma janela não for materializada, para
+    o agendamento tentar de novo.
+    """
+    hoje = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    materializadas = []
+    falhas = []
+    for periodo in PERIODOS_METRICAS:
+        try:
+            janela = materializar_janela(periodo, hoje)
+        except ClientError as e:
+            config.logger.error(f"Erro ao materializar a janela {periodo} de {hoje}: {str(e)}")
+            janela = None
+        (materializadas if janela else falhas).append(periodo)
+
+    config.logger.info(f"Janelas de métricas de {hoje} materializadas: {', '.join(materializadas)}")
+    if falhas:
+        raise RuntimeError(f"Janelas de métricas de {hoje} não materializadas: {', '.join(falhas)}")
+    return {'data_fim': hoje, 'janelas': materializadas}
+
+
+def get_janela_metricas(periodo: str, hoje: str) -> Optional[Dict[str, Any]]:
+    janela = config.tableConsolidado.get_item(Key={'data': chave_janela(periodo, hoje)}).get('Item')
+    if janela and 'materializado_em' in janela:
+        return janela
+
+    # Tick ainda não executado hoje: a janela não existe ou só tem os deltas do dia
+    return materializar_janela(periodo, hoje)
+
+
+@xray_recorder.capture('reprocess_saldo_diario')
+def reprocess_saldo_diario(data: str) -> SaldoDiario:
+    """
+    Reparo: recalcula o consolidado do dia a partir de todos os lançamentos.
+    A linha é lida antes dos lançamentos e regravada, com os marcadores
+    LANCAMENTO# dos lançamentos somados, somente se continuar como foi lida:
+    um delta aplicado no meio do recálculo cancela a gravação e o recálculo é
+    refeito, e os deltas posteriores desses lançamentos são ignorados.
+    """
+    saldo_anterior = get_saldo_anterior(data)
+
+    for _ in range(MAX_TENTATIVAS_RECALCULO):
+        anterior = config.tableConsolidado.get_item(Key={'data': data}, ConsistentRead=True).get('Item')
+        lancamentos = get_lancamentos_by_date_range(f"{data}T00:00:00", f"{data}T23:59:59")
+        saldo_diario = calculate_saldo_diario(data, saldo_anterior, lancamentos)
+
+        # Marcadores que não cabem na transação são gravados antes: se a
+        # gravação for cancelada, a nova tentativa soma os mesmos lançamentos
+        lancamento_ids = [lancamento['id'] for lancamento in lancamentos]
+        gravar_marcadores(data, lancamento_ids[MAX_MARCADORES_LINHA:])
+
+        if gravar_linha_com_marcadores(saldo_diario, lancamento_ids[:MAX_MARCADORES_LINHA], condicao_linha(anterior)):
+            config.logger.info(f"Saldo diário recalculado: {data}")
+            aplicar_diferenca_linha(saldo_diario, anterior or {})
+            return saldo_diario
+
+        config.logger.info(f"Linha de {data} alterada durante o recálculo, repetindo")
+
+    raise RuntimeError(f"Saldo de {data} não recalculado após {MAX_TENTATIVAS_RECALCULO} tentativas")
 
 
 @xray_recorder.capture('get_saldo_diario')
@@ -134,63 +953,114 @@ def get_saldo_diario(data: str, use_cache: bool = True) -> Optional[SaldoDiario]
     """
     Recupera saldo diário do cache ou DynamoDB
     """
-    cache_key = f"saldo_diario:{data}:{config.environment}"
+    return get_saldos_diarios([data], use_cache).get(data)
 
-    # Tentar recuperar do cache primeiro
-    if use_cache:
-        cached_data = get_from_cache(cache_key)
-        if cached_data:
-            try:
-                # Garantir conversão correta dos tipos
-                return SaldoDiario(
-                    data=cached_data['data'],
-                    saldo_inicial=Decimal(str(cached_data['saldo_inicial'])),
-                    total_creditos=Decimal(str(cached_data['total_creditos'])),
-                    total_debitos=Decimal(str(cached_data['total_debitos'])),
-                    saldo_final=Decimal(str(cached_data['saldo_final'])),
-                    quantidade_lancamentos=int(cached_data['quantidade_lancamentos']),
-                    ultima_atualizacao=cached_data['ultima_atualizacao']
-                )
-            except (KeyError, ValueError, TypeError) as e:
-                config.logger.warning(f"Erro ao reconstruir SaldoDiario do cache: {str(e)}")
-                # Se houver erro, invalida o cache e continua para DynamoDB
-                invalidate_cache(cache_key)
 
-    try:
-        response = config.tableConsolidado.get_item(Key={'data': data})
+def saldo_from_dict(item: Dict[str, Any]) -> SaldoDiario:
+    """
+    Reconstrói SaldoDiario a partir de um item do DynamoDB ou do cache
+    """
+    return SaldoDiario(
+        data=item['data'],
+        saldo_inicial=Decimal(str(item['saldo_inicial'])),
+        total_creditos=Decimal(str(item['total_creditos'])),
+        total_debitos=Decimal(str(item['total_debitos'])),
+        saldo_final=Decimal(str(item['saldo_final'])),
+        quantidade_lancamentos=int(item['quantidade_lancamentos']),
+        ultima_atualizacao=item['ultima_atualizacao'],
+        contadores=extrair_contadores(item)
+    )
 
-        if 'Item' in response:
-            item = response['Item']
-            saldo = SaldoDiario(
-                data=item['data'],
-                saldo_inicial=Decimal(str(item['saldo_inicial'])),
-                total_creditos=Decimal(str(item['total_creditos'])),
-                total_debitos=Decimal(str(item['total_debitos'])),
-                saldo_final=Decimal(str(item['saldo_final'])),
-                quantidade_lancamentos=int(item['quantidade_lancamentos']),
-                ultima_atualizacao=item['ultima_atualizacao']
-            )
 
-            # Armazenar no cache
-            if use_cache:
-                # Converter Decimal para string para serialização JSON
-                cache_data = {
-                    'data': saldo.data,
-                    'saldo_inicial': str(saldo.saldo_inicial),
-                    'total_creditos': str(saldo.total_creditos),
-                    'total_debitos': str(saldo.total_debitos),
-                    'saldo_final': str(saldo.saldo_final),
-                    'quantidade_lancamentos': saldo.quantidade_lancamentos,
-                    'ultima_atualizacao': saldo.ultima_atualizacao
-                }
-                set_cache(cache_key, cache_data, ttl=3600)
+def saldo_to_cache(saldo: SaldoDiario) -> Dict[str, Any]:
+    """
+    Converte SaldoDiario para o formato do cache (Decimal como string)
+    """
+    return {
+        'data': saldo.data,
+        'saldo_inicial': str(saldo.saldo_inicial),
+        'total_creditos': str(saldo.total_creditos),
+        'total_debitos': str(saldo.total_debitos),
+        'saldo_final': str(saldo.saldo_final),
+        'quantidade_lancamentos': saldo.quantidade_lancamentos,
+        'ultima_atualizacao': saldo.ultima_atualizacao,
+        **{chave: str(valor) for chave, valor in saldo.contadores.items()}
+    }
+
+
+def codificar_saldo_cache(saldo: SaldoDiario) -> bytes:
+    # JSON legado apenas quando algum valor não cabe no formato binário
+    return codificar_saldo(saldo) or serializar_json(saldo_to_cache(saldo))
 
-            return saldo
+
+def decodificar_saldo_cache(payload: bytes) -> SaldoDiario:
+    # Entradas gravadas antes do formato binário continuam legíveis até expirar
+    if is_binario(payload):
+        return decodificar_saldo(payload)
+    return saldo_from_dict(json.loads(payload))
+
+
+def batch_get_consolidado(chaves: List[str], consistente: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Recupera linhas do consolidado por chave com BatchGetItem em blocos de 100,
+    reenviando UnprocessedKeys. Retorna apenas as chaves encontradas.
+    """
+    items = {}
+    for i in range(0, len(chaves), 100):
+        request_items = {
+            config.DYNAMODB_TABLE_CONSOLIDADO: {
+                'Keys': [{'data': chave} for chave in chaves[i:i + 100]],
+                'ConsistentRead': consistente
+            }
+        }
+        tentativa = 0
+        while request_items:
+            if tentativa:
+                time.sleep(min(0.05 * 2 ** tentativa, 1))
+            response = config.dynamodbResource.batch_get_item(RequestItems=request_items)
+            for item in response.get('Responses', {}).get(config.DYNAMODB_TABLE_CONSOLIDADO, []):
+                items[item['data']] = item
+            request_items = response.get('UnprocessedKeys')
+            tentativa += 1
+
+    return items
+
+
+@xray_recorder.capture('get_saldos_diarios')
+def get_saldos_diarios(datas: List[str], use_cache: bool = True) -> Dict[str, SaldoDiario]:
+    """
+    Recupera saldos diários em lote: um MGET no Redis, BatchGetItem apenas
+    para as datas ausentes do cache e um pipeline de SETEX para repopulá-lo.
+    Retorna apenas as datas que possuem consolidado.
+    """
+    saldos = {}
+    cache_keys = {data: f"saldo_diario:{data}:{config.environment}" for data in datas}
+
+    if use_cache:
+        datas_referencia = {cache_key: data for data, cache_key in cache_keys.items()}
+        cached = get_many_from_cache(list(cache_keys.values()), datas_referencia, decodificar=decodificar_saldo_cache)
+        for data, cache_key in cache_keys.items():
+            if cache_key in cached:
+                saldos[data] = cached[cache_key]
+
+    faltantes = [data for data in datas if data not in saldos]
+    if not faltantes:
+        return saldos
+
+    try:
+        novos = {}
+        for data, item in batch_get_consolidado(faltantes).items():
+            saldo = saldo_from_dict(item)
+            saldos[data] = saldo
+            novos[cache_keys[data]] = saldo
+
+        if use_cache:
+            set_many_cache(novos, ttl=3600, datas_referencia=datas_referencia, codificar=codificar_saldo_cache)
 
     except BaseException as e:
-        config.logger.error(f"Erro ao recuperar saldo diário: {str(e)}")
+        config.logger.error(f"Erro ao recuperar saldos diários: {str(e)}")
 
-    return None
+    return saldos
 
 
 @xray_recorder.capture('get_saldo_anterior')
@@ -212,112 +1082,384 @@ def get_saldo_anterior(data: str) -> Decimal:
     return Decimal('0')
 
 
+# Dias por lote na leitura do relatório dia a dia (limite do BatchGetItem)
+LOTE_DIAS_RELATORIO = 100
+
+
+def totalizar_dia(dia: str) -> Tuple[Decimal, Decimal, int, Dict[str, Any], List[str]]:
+    """
+    Créditos, débitos, quantidade, contadores e IDs dos lançamentos do dia
+    (executado no pool de threads, independente dos outros dias)
+    """
+    lancamentos = query_lancamentos_dia(dia, f"{dia}T00:00:00", f"{dia}T23:59:59")
+    creditos, debitos = somar_lancamentos(lancamentos)
+    return (creditos, debitos, len(lancamentos), contadores_lancamentos(lancamentos),
+            [lancamento['id'] for lancamento in lancamentos])
+
+
+@xray_recorder.capture('preencher_dias_faltantes')
+def preencher_dias_faltantes(dias: List[str], saldos_existentes: Dict[str, SaldoDiario],
+                             saldo_anterior: Optional[Decimal] = None) -> List[SaldoDiario]:
+    """
+    Preenche as lacunas de consolidado de uma sequência de dias (em ordem):
+    os lançamentos dos dias faltantes são totalizados em paralelo, os saldos
+    são encadeados em uma única passada (soma acumulada) e as linhas novas são
+    gravadas, com os marcadores dos lançamentos somados, apenas se o dia
+    continuar sem linha. Retorna os saldos de todos os dias.
+    """
+    faltantes = [dia for dia in dias if dia not in saldos_existentes]
+    if not faltantes:
+        return [saldos_existentes[dia] for dia in dias]
+
+    totais = dict(zip(faltantes, executar_paralelo(totalizar_dia, [(dia,) for dia in faltantes])))
+
+    if saldo_anterior is None and dias[0] in totais:
+        saldo_anterior = get_saldo_anterior(dias[0])
+
+    agora = datetime.now(timezone.utc).isoformat()
+    saldos = []
+    novos = []
+    lancamentos_por_dia = {}
+    for dia in dias:
+        saldo = saldos_existentes.get(dia)
+        if not saldo:
+            creditos, debitos, quantidade, contadores, lancamentos_por_dia[dia] = totais[dia]
+            saldo = SaldoDiario(
+                data=dia,
+                saldo_inicial=saldo_anterior,
+                total_creditos=creditos,
+                total_debitos=debitos,
+                saldo_final=saldo_anterior + creditos - debitos,
+                quantidade_lancamentos=quantidade,
+                ultima_atualizacao=agora,
+                contadores=contadores
+            )
+            novos.append(saldo)
+
+        saldos.append(saldo)
+        saldo_anterior = saldo.saldo_final
+
+    gravados = save_saldos_diarios(novos, lancamentos_por_dia)
+    config.logger.info(f"Lacunas preenchidas: {len(gravados)} dia(s) entre {dias[0]} e {dias[-1]}")
+
+    # Dias com movimentação que ainda não estavam consolidados alteram métricas e relatórios em cache
+    com_movimentacao = [saldo.data for saldo in gravados if saldo.quantidade_lancamentos]
+    if com_movimentacao:
+        invalidate_cache_from_date(com_movimentacao[0])
+    return saldos
+
+
+def gravar_saldo_novo(saldo: SaldoDiario, lancamento_ids: List[str]) -> bool:
+    """
+    Grava a linha do dia, com os marcadores dos lançamentos somados nela, apenas
+    se ela não existir. Retorna False se outra gravação (relatório concorrente
+    ou delta da fila) criou a linha antes ou se os marcadores não cabem na
+    transação; nesse caso o saldo calculado é usado só em memória e o dia fica
+    para os deltas e o reprocessamento.
+    """
+    if len(lancamento_ids) > MAX_MARCADORES_LINHA:
+        config.logger.info(f"Linha de {saldo.data} não gravada: {len(lancamento_ids)} lançamentos excedem a transação")
+        return False
+
+    if not gravar_linha_com_marcadores(saldo, lancamento_ids, condicao_linha(None)):
+        config.logger.info(f"Linha de {saldo.data} criada concorrentemente, mantida")
+        return False
+    return True
+
+
+@xray_recorder.capture('save_saldos_diarios')
+def save_saldos_diarios(saldos: List[SaldoDiario], lancamentos_por_dia: Dict[str, List[str]]) -> List[SaldoDiario]:
+    """
+    Grava em paralelo linhas novas do consolidado (dias sem linha), cada uma
+    com os marcadores dos lançamentos de lancamentos_por_dia e condicionada a
+    continuar inexistente, e soma aos rollups (um update por mês) e às janelas
+    de métricas apenas as efetivamente gravadas, para que gravações
+    concorrentes do mesmo dia não sejam contadas duas vezes.
+    Retorna os saldos gravados.
+    """
+    gravados = [
+        saldo for saldo, gravado in zip(saldos, executar_paralelo(
+            gravar_saldo_novo, [(saldo, lancamentos_por_dia.get(saldo.data, [])) for saldo in saldos]
+        ))
+        if gravado
+    ]
+
+    rollups: Dict[str, Dict[str, Any]] = {}
+    for saldo in gravados:
+        rollup = rollups.setdefault(saldo.data[:7], {
+            'total_creditos': Decimal('0'),
+            'total_debitos': Decimal('0'),
+            'quantidade_lancamentos': 0,
+            'contadores': {}
+        })
+        rollup['total_creditos'] += saldo.total_creditos
+        rollup['total_debitos'] += saldo.total_debitos
+        rollup['quantidade_lancamentos'] += saldo.quantidade_lancamentos
+        for contador, valor in saldo.contadores.items():
+            rollup['contadores'][contador] = rollup['contadores'].get(contador, 0) + valor
+
+    for mes, rollup in rollups.items():
+        update_rollups(f"{mes}-01", rollup['total_creditos'], rollup['total_debitos'],
+                       rollup['quantidade_lancamentos'], rollup['contadores'])
+
+    update_janelas_metricas({
+        saldo.data: (saldo.total_creditos, saldo.total_debitos, saldo.quantidade_lancamentos)
+        for saldo in gravados if saldo.quantidade_lancamentos
+    })
+    return gravados
+
+
+def iterar_saldos_relatorio(data_inicio: str, data_fim: str, use_cache: bool = True,
+                            progresso: Optional[Callable[[int, int], None]] = None):
+    """
+    Percorre o período em lotes de até LOTE_DIAS_RELATORIO dias, em ordem,
+    gerando listas de SaldoDiario e calculando os dias sem consolidado. Mantém
+    em memória apenas um lote por vez. progresso(dias_processados, total_dias)
+    é chamado ao final de cada lote.
+    """
+    dias = listar_dias(data_inicio, data_fim)
+    saldo_anterior: Optional[Decimal] = None
+
+    for inicio in range(0, len(dias), LOTE_DIAS_RELATORIO):
+        lote = dias[inicio:inicio + LOTE_DIAS_RELATORIO]
+
+        # Recuperar em lote os saldos já consolidados e calcular os faltantes
+        saldos_existentes = get_saldos_diarios(lote, use_cache)
+        saldos = preencher_dias_faltantes(lote, saldos_existentes, saldo_anterior)
+        saldo_anterior = saldos[-1].saldo_final
+
+        if progresso:
+            progresso(inicio + len(lote), len(dias))
+
+        yield saldos
+
+
+def build_relatorio_diario(data_inicio: str, data_fim: str,
+                           progresso: Optional[Callable[[int, int], None]] = None) -> RelatorioConsolidado:
+    """
+    Monta o relatório dia a dia, calculando os dias sem consolidado
+    """
+    saldos_diarios = []
+    for saldos in iterar_saldos_relatorio(data_inicio, data_fim, progresso=progresso):
+        saldos_diarios.extend(saldos)
+
+    # Acumular totais do período
+    saldo_inicial_periodo = saldos_diarios[0].saldo_inicial if saldos_diarios else Decimal('0')
+    total_creditos_periodo = sum((saldo.total_creditos for saldo in saldos_diarios), Decimal('0'))
+    total_debitos_periodo = sum((saldo.total_debitos for saldo in saldos_diarios), Decimal('0'))
+
+    # Saldo final do período
+    saldo_final_periodo = saldos_diarios[-1].saldo_final if saldos_diarios else Decimal('0')
+
+    return RelatorioConsolidado(
+        periodo_inicio=data_inicio,
+        periodo_fim=data_fim,
+        saldo_inicial_periodo=saldo_inicial_periodo,
+        saldo_final_periodo=saldo_final_periodo,
+        total_creditos_periodo=total_creditos_periodo,
+        total_debitos_periodo=total_debitos_periodo,
+        quantidade_dias=len(saldos_diarios),
+        saldos_diarios=saldos_diarios
+    )
+
+
+def segmentar_periodo(data_inicio: str, data_fim: str,
+                      usar_rollup_ano: bool = True) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Divide o período em chaves de rollup (anos e meses completos) e
+    intervalos de dias das bordas (meses parciais). Sem usar_rollup_ano os
+    anos completos são lidos pelos rollups mensais.
+    """
+    chaves = []
+    intervalos = []
+    atual = date.fromisoformat(data_inicio)
+    fim = date.fromisoformat(data_fim)
+
+    while atual <= fim:
+        ultimo_dia_mes = atual.replace(day=calendar.monthrange(atual.year, atual.month)[1])
+
+        if usar_rollup_ano and atual.month == 1 and atual.day == 1 and date(atual.year, 12, 31) <= fim:
+            chaves.append(f"{PREFIXO_ROLLUP_ANO}{atual.year}")
+            atual = date(atual.year + 1, 1, 1)
+        elif atual.day == 1 and ultimo_dia_mes <= fim:
+            chaves.append(f"{PREFIXO_ROLLUP_MES}{atual.strftime('%Y-%m')}")
+            atual = ultimo_dia_mes + timedelta(days=1)
+        else:
+            borda_fim = min(ultimo_dia_mes, fim)
+            if intervalos and date.fromisoformat(intervalos[-1][1]) + timedelta(days=1) == atual:
+                intervalos[-1] = (intervalos[-1][0], borda_fim.isoformat())
+            else:
+                intervalos.append((atual.isoformat(), borda_fim.isoformat()))
+            atual = borda_fim + timedelta(days=1)
+
+    return chaves, intervalos
+
+
+def build_relatorio_rollups(data_inicio: str, data_fim: str) -> RelatorioConsolidado:
+    """
+    Monta o relatório resumido em O(meses + dias de borda): anos e meses
+    completos vêm dos rollups e os meses parciais das linhas diárias
+    """
+    chaves, intervalos = segmentar_periodo(data_inicio, data_fim)
+
+    total_creditos_periodo = Decimal('0')
+    total_debitos_periodo = Decimal('0')
+
+    for rollup in batch_get_consolidado(chaves).values():
+        total_creditos_periodo += Decimal(str(rollup.get('total_creditos', 0)))
+        total_debitos_periodo += Decimal(str(rollup.get('total_debitos', 0)))
+
+    for borda_inicio, borda_fim in intervalos:
+        for linha in query_saldos_periodo(borda_inicio, borda_fim):
+            total_creditos_periodo += Decimal(str(linha['total_creditos']))
+            total_debitos_periodo += Decimal(str(linha['total_debitos']))
+
+    saldo_inicio = get_saldo_diario(data_inicio)
+    saldo_inicial_periodo = saldo_inicio.saldo_inicial if saldo_inicio else get_saldo_anterior(data_inicio)
+
+    return RelatorioConsolidado(
+        periodo_inicio=data_inicio,
+        periodo_fim=data_fim,
+        saldo_inicial_periodo=saldo_inicial_periodo,
+        saldo_final_periodo=saldo_inicial_periodo + total_creditos_periodo - total_debitos_periodo,
+        total_creditos_periodo=total_creditos_periodo,
+        total_debitos_periodo=total_debitos_periodo,
+        quantidade_dias=len(listar_dias(data_inicio, data_fim)),
+        saldos_diarios=[]
+    )
+
+
+def agregar_breakdown(linhas: List[Dict[str, Any]], dimensoes: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Soma os contadores das linhas (dias ou rollups) por dimensão e valor da
+    dimensão, separando créditos e débitos
+    """
+    breakdown: Dict[str, Dict[str, Dict[str, Any]]] = {dimensao: {} for dimensao in dimensoes}
+
+    for linha in linhas:
+        for chave, valor in extrair_contadores(linha).items():
+            prefixo, tipo, nome = chave.split('#', 2)
+            if tipo not in ('CREDITO', 'DEBITO'):
+                continue
+            sufixo = 'creditos' if tipo == 'CREDITO' else 'debitos'
+
+            for dimensao in dimensoes:
+                prefixo_valor, prefixo_quantidade = DIMENSOES_BREAKDOWN[dimensao]
+                if f"{prefixo}#" not in (prefixo_valor, prefixo_quantidade):
+                    continue
+
+                grupo = breakdown[dimensao].setdefault(nome, {
+                    'total_creditos': Decimal('0'),
+                    'total_debitos': Decimal('0'),
+                    'quantidade_creditos': 0,
+                    'quantidade_debitos': 0
+                })
+                if f"{prefixo}#" == prefixo_valor:
+                    grupo[f"total_{sufixo}"] += valor
+                else:
+                    grupo[f"quantidade_{sufixo}"] += valor
+
+    return breakdown
+
+
+@xray_recorder.capture('get_breakdown_periodo')
+def get_breakdown_periodo(data_inicio: str, data_fim: str, dimensoes: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Breakdown do período por categoria e/ou tag a partir dos contadores:
+    anos e meses completos vêm dos rollups e os meses parciais das linhas diárias
+    (o rollup anual não tem contadores de tag: com tag os anos vêm dos meses)
+    """
+    chaves, intervalos = segmentar_periodo(data_inicio, data_fim, usar_rollup_ano='tag' not in dimensoes)
+
+    linhas = list(batch_get_consolidado(chaves).values())
+    for borda_inicio, borda_fim in intervalos:
+        linhas.extend(query_saldos_periodo(borda_inicio, borda_fim))
+
+    return agregar_breakdown(linhas, dimensoes)
+
+
+
+@xray_recorder.capture('get_metricas_periodo')
+def get_metricas_periodo(periodo: str) -> Dict[str, Any]:
+    """
+    Métricas da janela móvel do período que termina hoje, lidas da janela
+    materializada (um GetItem) ou, se ela não puder ser materializada, somadas
+    das linhas diárias. O resultado fica em cache por periodo e é invalidado
+    pela consolidação de qualquer dia da janela.
+    Volume do dia = créditos + débitos.
+    """
+    data_fim = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+    cache_key = f"metricas:{periodo}:{data_fim}:{config.environment}"
+    metricas = get_from_cache(cache_key, data_referencia=data_fim)
+    if metricas:
+        return metricas
+
+    janela = get_janela_metricas(periodo, data_fim)
+    if not janela:
+        config.logger.warning(f"Janela de métricas {periodo} indisponível, somando as linhas diárias")
+        janela = montar_janela(periodo, data_fim)
+
+    # Dias com volume zerado por reprocessamento não têm movimentação
+    volumes = {
+        chave[len(PREFIXO_VOLUME_DIA):]: valor
+        for chave, valor in janela.items()
+        if chave.startswith(PREFIXO_VOLUME_DIA) and valor > 0
+    }
+    meio = janela['data_meio']
+
+    metricas = {
+        'data_inicio': janela['data_inicio'],
+        'data_fim': janela['data_fim'],
+        'dias_total': (date.fromisoformat(janela['data_fim']) - date.fromisoformat(janela['data_inicio'])).days + 1,
+        'total_lancamentos': int(janela['quantidade_lancamentos']),
+        'total_creditos': float(janela['total_creditos']),
+        'total_debitos': float(janela['total_debitos']),
+        'dias_com_movimentacao': len(volumes),
+        'maior_volume_dia': float(max(volumes.values())) if volumes else 0.0,
+        'menor_volume_dia': float(min(volumes.values())) if volumes else 0.0,
+        'metades': {
+            'primeira': {
+                'volume': float(janela['volume_primeira_metade']),
+                'dias_com_movimentacao': sum(1 for dia in volumes if dia < meio)
+            },
+            'segunda': {
+                'volume': float(janela['volume_segunda_metade']),
+                'dias_com_movimentacao': sum(1 for dia in volumes if dia >= meio)
+            }
+        }
+    }
+
+    set_cache(cache_key, metricas, ttl=3600, data_referencia=data_fim)
+    return metricas
+
+
 @xray_recorder.capture('generate_relatorio_periodo')
-def generate_relatorio_periodo(data_inicio: str, data_fim: str) -> RelatorioConsolidado:
-    cache_key = f"relatorio:{data_inicio}:{data_fim}:{config.environment}"
+def generate_relatorio_periodo(data_inicio: str, data_fim: str, incluir_detalhes: bool = True,
+                               progresso: Optional[Callable[[int, int], None]] = None) -> RelatorioConsolidado:
+    """
+    Gera o relatório do período. Sem incluir_detalhes o relatório é composto
+    pelos rollups mensais/anuais e pelos dias das bordas, sem saldos_diarios.
+    progresso é repassado à montagem dia a dia (jobs assíncronos).
+    """
+    if incluir_detalhes:
+        cache_key = f"relatorio:{data_inicio}:{data_fim}:{config.environment}"
+    else:
+        cache_key = f"relatorio:resumo:{data_inicio}:{data_fim}:{config.environment}"
 
     # Tentar recuperar do cache
-    cached_data = get_from_cache(cache_key)
-    if cached_data:
-        try:
-            # Reconstruir objetos SaldoDiario do cache
-            saldos_diarios = []
-            for saldo_data in cached_data.get('saldos_diarios', []):
-                saldo = SaldoDiario(
-                    data=saldo_data['data'],
-                    saldo_inicial=Decimal(str(saldo_data['saldo_inicial'])),
-                    total_creditos=Decimal(str(saldo_data['total_creditos'])),
-                    total_debitos=Decimal(str(saldo_data['total_debitos'])),
-                    saldo_final=Decimal(str(saldo_data['saldo_final'])),
-                    quantidade_lancamentos=int(saldo_data['quantidade_lancamentos']),
-                    ultima_atualizacao=saldo_data['ultima_atualizacao']
-                )
-                saldos_diarios.append(saldo)
-            
-            return RelatorioConsolidado(
-                periodo_inicio=cached_data['periodo_inicio'],
-                periodo_fim=cached_data['periodo_fim'],
-                saldo_inicial_periodo=Decimal(str(cached_data['saldo_inicial_periodo'])),
-                saldo_final_periodo=Decimal(str(cached_data['saldo_final_periodo'])),
-                total_creditos_periodo=Decimal(str(cached_data['total_creditos_periodo'])),
-                total_debitos_periodo=Decimal(str(cached_data['total_debitos_periodo'])),
-                quantidade_dias=int(cached_data['quantidade_dias']),
-                saldos_diarios=saldos_diarios
-            )
-        except (KeyError, ValueError, TypeError) as e:
-            config.logger.warning(f"Erro ao reconstruir RelatorioConsolidado do cache: {str(e)}")
-            # Se houver erro, invalida o cache e recalcula
-            invalidate_cache(cache_key)
+    relatorio = get_from_cache(cache_key, data_referencia=data_fim, decodificar=decodificar_relatorio_cache)
+    if relatorio:
+        return relatorio
 
     try:
-        # Gerar lista de datas no período
-        start_date = datetime.fromisoformat(data_inicio)
-        end_date = datetime.fromisoformat(data_fim)
-
-        saldos_diarios = []
-        saldo_inicial_periodo = Decimal('0')
-        total_creditos_periodo = Decimal('0')
-        total_debitos_periodo = Decimal('0')
-
-        current_date = start_date
-        while current_date <= end_date:
-            data_str = current_date.strftime('%Y-%m-%d')
-
-            # Recuperar ou calcular saldo diário
-            saldo = get_saldo_diario(data_str)
-            if not saldo:
-                saldo_anterior = get_saldo_anterior(data_str)
-                saldo = calculate_saldo_diario(data_str, saldo_anterior)
-                save_saldo_diario(saldo)
-
-            saldos_diarios.append(saldo)
-
-            # Acumular totais do período
-            if current_date == start_date:
-                saldo_inicial_periodo = saldo.saldo_inicial
-
-            total_creditos_periodo += saldo.total_creditos
-            total_debitos_periodo += saldo.total_debitos
-
-            current_date += timedelta(days=1)
-
-        # Saldo final do período
-        saldo_final_periodo = saldos_diarios[-1].saldo_final if saldos_diarios else Decimal('0')
-
-        relatorio = RelatorioConsolidado(
-            periodo_inicio=data_inicio,
-            periodo_fim=data_fim,
-            saldo_inicial_periodo=saldo_inicial_periodo,
-            saldo_final_periodo=saldo_final_periodo,
-            total_creditos_periodo=total_creditos_periodo,
-            total_debitos_periodo=total_debitos_periodo,
-            quantidade_dias=len(saldos_diarios),
-            saldos_diarios=saldos_diarios
-        )
+        if incluir_detalhes:
+            relatorio = build_relatorio_diario(data_inicio, data_fim, progresso)
+        else:
+            relatorio = build_relatorio_rollups(data_inicio, data_fim)
 
-        # Armazenar no cache (converter Decimal para string)
-        cache_data = {
-            'periodo_inicio': relatorio.periodo_inicio,
-            'periodo_fim': relatorio.periodo_fim,
-            'saldo_inicial_periodo': str(relatorio.saldo_inicial_periodo),
-            'saldo_final_periodo': str(relatorio.saldo_final_periodo),
-            'total_creditos_periodo': str(relatorio.total_creditos_periodo),
-            'total_debitos_periodo': str(relatorio.total_debitos_periodo),
-            'quantidade_dias': relatorio.quantidade_dias,
-            'saldos_diarios': [
-                {
-                    'data': saldo.data,
-                    'saldo_inicial': str(saldo.saldo_inicial),
-                    'total_creditos': str(saldo.total_creditos),
-                    'total_debitos': str(saldo.total_debitos),
-                    'saldo_final': str(saldo.saldo_final),
-                    'quantidade_lancamentos': saldo.quantidade_lancamentos,
-                    'ultima_atualizacao': saldo.ultima_atualizacao
-                }
-                for saldo in relatorio.saldos_diarios
-            ]
-        }
-        set_cache(cache_key, cache_data, ttl=7200)
+        # Armazenar no cache (formato binário do cache_codec)
+        set_cache(cache_key, relatorio, ttl=7200, data_referencia=data_fim, codificar=codificar_relatorio_cache)
 
         return relatorio
 
@@ -326,6 +1468,75 @@ def generate_relatorio_periodo(data_inicio: str, data_fim: str) -> RelatorioCons
         raise "Erro ao gerar relatório consolidado"
 
 
+def relatorio_to_cache(relatorio: RelatorioConsolidado) -> Dict[str, Any]:
+    """
+    Converte RelatorioConsolidado para o formato JSON legado do cache (Decimal como string)
+    """
+    return {
+        'periodo_inicio': relatorio.periodo_inicio,
+        'periodo_fim': relatorio.periodo_fim,
+        'saldo_inicial_periodo': str(relatorio.saldo_inicial_periodo),
+        'saldo_final_periodo': str(relatorio.saldo_final_periodo),
+        'total_creditos_periodo': str(relatorio.total_creditos_periodo),
+        'total_debitos_periodo': str(relatorio.total_debitos_periodo),
+        'quantidade_dias': relatorio.quantidade_dias,
+        'saldos_diarios': [
+            {
+                'data': saldo.data,
+                'saldo_inicial': str(saldo.saldo_inicial),
+                'total_creditos': str(saldo.total_creditos),
+                'total_debitos': str(saldo.total_debitos),
+                'saldo_final': str(saldo.saldo_final),
+                'quantidade_lancamentos': saldo.quantidade_lancamentos,
+                'ultima_atualizacao': saldo.ultima_atualizacao
+            }
+            for saldo in relatorio.saldos_diarios
+        ]
+    }
+
+
+def relatorio_from_cache(item: Dict[str, Any]) -> RelatorioConsolidado:
+    """
+    Reconstrói RelatorioConsolidado a partir do formato JSON legado do cache
+    """
+    # Reconstruir objetos SaldoDiario do cache
+    saldos_diarios = []
+    for saldo_data in item.get('saldos_diarios', []):
+        saldo = SaldoDiario(
+            data=saldo_data['data'],
+            saldo_inicial=Decimal(str(saldo_data['saldo_inicial'])),
+            total_creditos=Decimal(str(saldo_data['total_creditos'])),
+            total_debitos=Decimal(str(saldo_data['total_debitos'])),
+            saldo_final=Decimal(str(saldo_data['saldo_final'])),
+            quantidade_lancamentos=int(saldo_data['quantidade_lancamentos']),
+            ultima_atualizacao=saldo_data['ultima_atualizacao']
+        )
+        saldos_diarios.append(saldo)
+
+    return RelatorioConsolidado(
+        periodo_inicio=item['periodo_inicio'],
+        periodo_fim=item['periodo_fim'],
+        saldo_inicial_periodo=Decimal(str(item['saldo_inicial_periodo'])),
+        saldo_final_periodo=Decimal(str(item['saldo_final_periodo'])),
+        total_creditos_periodo=Decimal(str(item['total_creditos_periodo'])),
+        total_debitos_periodo=Decimal(str(item['total_debitos_periodo'])),
+        quantidade_dias=int(item['quantidade_dias']),
+        saldos_diarios=saldos_diarios
+    )
+
+
+def codificar_relatorio_cache(relatorio: RelatorioConsolidado) -> bytes:
+    # JSON legado apenas quando algum valor não cabe no formato binário
+    return codificar_relatorio(relatorio) or serializar_json(relatorio_to_cache(relatorio))
+
+
+def decodificar_relatorio_cache(payload: bytes) -> RelatorioConsolidado:
+    # Entradas gravadas antes do formato binário continuam legíveis até expirar
+    if is_binario(payload):
+        return decodificar_relatorio(payload)
+    return relatorio_from_cache(json.loads(payload))
+
+
 @xray_recorder.capture('save_relatorio_to_s3')
 def save_relatorio_to_s3(relatorio: RelatorioConsolidado) -> str:
     """
@@ -383,45 +1594,118 @@ def save_relatorio_to_s3(relatorio: RelatorioConsolidado) -> str:
         raise "Erro ao salvar relatório"
 
 
-@xray_recorder.capture('recalculate_subsequent_balances')
-def recalculate_subsequent_balances(data_inicio: str, max_days: int = 30) -> None:
+def listar_meses(data_inicio: str, data_fim: str) -> List[str]:
     """
-    Recalcula saldos dos dias seguintes após uma alteração
+    Lista os meses (YYYY-MM) entre duas datas, inclusive
     """
-    try:
-        data_obj = datetime.fromisoformat(data_inicio)
+    return sorted({dia[:7] for dia in listar_dias(data_inicio, data_fim)})
 
-        for i in range(1, max_days + 1):
-            data_atual = (data_obj + timedelta(days=i)).strftime('%Y-%m-%d')
 
-            # Verificar se há lançamentos para esta data
-            if not has_lancamentos_for_date(data_atual):
-                break
+def query_saldos_periodo(data_inicio: str, data_fim: str) -> List[Dict[str, Any]]:
+    """
+    Recupera as linhas de consolidado do período, em ordem de data, com uma
+    Query por mês no índice mes-data-index
+    """
+    items = []
+    for mes in listar_meses(data_inicio, data_fim):
+        items.extend(paginar(
+            config.tableConsolidado.query,
+            IndexName=config.DYNAMODB_INDEX_MES,
+            KeyConditionExpression='mes = :mes AND #data BETWEEN :data_inicio AND :data_fim',
+            ExpressionAttributeNames={'#data': 'data'},
+            ExpressionAttributeValues={
+                ':mes': mes,
+                ':data_inicio': data_inicio,
+                ':data_fim': data_fim
+            }
+        ))
 
-            # Recalcular saldo
-            saldo_anterior = get_saldo_anterior(data_atual)
-            saldo_diario = calculate_saldo_diario(data_atual, saldo_anterior)
-            save_saldo_diario(saldo_diario)
+    return items
 
-            # Invalidar cache
-            invalidate_cache(f"saldo_diario:{data_atual}:*")
 
-    except BaseException as e:
-        config.logger.warning(f"Erro ao recalcular saldos subsequentes: {str(e)}")
+# Releituras de uma linha cujo saldo_inicial mudou durante a propagação
+MAX_TENTATIVAS_PROPAGACAO = 5
 
 
-def has_lancamentos_for_date(data: str) -> bool:
+def propagar_saldo_dia(linha: Dict[str, Any], saldo_inicial: Decimal, agora: str) -> Tuple[Decimal, bool]:
     """
-    Verifica se há lançamentos para uma data específica
+    Grava o novo saldo_inicial do dia e desloca saldo_final pela mesma
+    diferença, condicionado ao saldo_inicial lido. Só os saldos são gravados:
+    deltas concorrentes nos totais e contadores são preservados. Em conflito
+    relê a linha. Retorna o saldo final do dia e se a linha foi alterada.
     """
-    data_inicio = f"{data}T00:00:00"
-    data_fim = f"{data}T23:59:59"
+    for _ in range(MAX_TENTATIVAS_PROPAGACAO):
+        anterior = Decimal(str(linha['saldo_inicial']))
+        if anterior == saldo_inicial:
+            return Decimal(str(linha['saldo_final'])), False
+
+        try:
+            response = config.tableConsolidado.update_item(
+                Key={'data': linha['data']},
+                UpdateExpression='SET saldo_inicial = :saldo_inicial, saldo_final = saldo_final + :diferenca, '
+                                 'ultima_atualizacao = :agora',
+                ConditionExpression='saldo_inicial = :anterior',
+                ExpressionAttributeValues={
+                    ':saldo_inicial': saldo_inicial,
+                    ':diferenca': saldo_inicial - anterior,
+                    ':anterior': anterior,
+                    ':agora': agora
+                },
+                ReturnValues='ALL_NEW'
+            )
+            return Decimal(str(response['Attributes']['saldo_final'])), True
+
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            linha = config.tableConsolidado.get_item(Key={'data': linha['data']}, ConsistentRead=True)['Item']
 
+    raise RuntimeError(f"Saldo de {linha['data']} alterado concorrentemente {MAX_TENTATIVAS_PROPAGACAO} vezes")
+
+
+@xray_recorder.capture('recalculate_subsequent_balances')
+def recalculate_subsequent_balances(data_inicio: str, max_days: int = 30) -> None:
+    """
+    Propaga o saldo final de data_inicio para os dias seguintes da janela.
+    O saldo de partida e as linhas da janela vêm de leituras consistentes (o
+    delta recém-aplicado está incluído); cada dia alterado recebe um update
+    condicional apenas dos saldos, e dias sem linha apenas carregam o saldo.
+    """
     try:
-        lancamentos = get_lancamentos_by_date_range(data_inicio, data_fim)
-        return len(lancamentos) > 0
-    except BaseException:
-        return False
+        inicial = config.tableConsolidado.get_item(Key={'data': data_inicio}, ConsistentRead=True).get('Item')
+        if not inicial:
+            return
+
+        inicio = datetime.fromisoformat(data_inicio)
+        dias = listar_dias(
+            (inicio + timedelta(days=1)).strftime('%Y-%m-%d'),
+            (inicio + timedelta(days=max_days)).strftime('%Y-%m-%d')
+        )
+        linhas = batch_get_consolidado(dias, consistente=True)
+
+        saldo_corrente = Decimal(str(inicial['saldo_final']))
+        agora = datetime.now(timezone.utc).isoformat()
+        alteradas = []
+
+        for dia in dias:
+            if dia not in linhas:
+                continue
+
+            saldo_corrente, alterada = propagar_saldo_dia(linhas[dia], saldo_corrente, agora)
+            if alterada:
+                alteradas.append(dia)
+
+        if not alteradas:
+            return
+
+        # Invalidar cache (Redis e caches locais das instâncias)
+        delete_cache(*[f"saldo_diario:{dia}:{config.environment}" for dia in alteradas])
+        invalidate_cache_from_date(alteradas[0])
+
+        config.logger.info(f"Saldos propagados a partir de {data_inicio}: {len(alteradas)} dia(s) atualizados")
+
+    except BaseException as e:
+        config.logger.warning(f"Erro ao recalcular saldos subsequentes: {str(e)}")
 
 
 # # Função utilitária para debug de tipos
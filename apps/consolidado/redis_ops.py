@@ -1,24 +1,44 @@
 import json
-from typing import Dict, Any, Optional
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Callable, TYPE_CHECKING
 from configuration import Config
 from aws_xray_sdk.core import xray_recorder
-from aws_xray_sdk.core import patch_all
-import redis
+from bootstrap import medir_import
+from cache_local import CacheLocal
+
+if TYPE_CHECKING:
+    import redis
 
-patch_all()
 config = Config()
 
+# Índice de invalidação por data (maior TTL usado pelas chaves indexadas)
+CACHE_INDEX_TTL = 86400
+CACHE_SCAN_COUNT = 500
+CACHE_UNLINK_CHUNK = 500
+
+# Histórico de invalidações publicado para os caches locais das demais instâncias
+CACHE_INVALIDACOES_MAX = 1000
+
 _redis_client = None
 
-def get_redis_client() -> Optional[redis.Redis]:
+# Camada local à frente do Redis: dias passados com TTL longo, dia corrente com TTL curto
+_cache_local = CacheLocal(config.LOCAL_CACHE_MAX_ITENS)
+
+def get_redis_client() -> Optional['redis.Redis']:
     global _redis_client
 
     if _redis_client is None and config.REDIS_ENDPOINT:
         try:
+            # Import adiado para o primeiro acesso ao cache (fora do cold start)
+            with medir_import('redis'):
+                import redis
+
             _redis_client = redis.Redis(
                 host=config.REDIS_ENDPOINT,
                 port=config.REDIS_PORT,
-                decode_responses=True,
+                # Valores binários (cache_codec): respostas em bytes
+                decode_responses=False,
                 socket_connect_timeout=10,
                 socket_timeout=10,
                 retry_on_timeout=True,
@@ -37,19 +57,106 @@ def get_redis_client() -> Optional[redis.Redis]:
     return _redis_client
 
 
+def get_cache_versao_key() -> str:
+    return f"cache_versao:{config.environment}"
+
+
+def get_cache_invalidacoes_key() -> str:
+    return f"cache_invalidacoes:{config.environment}"
+
+
+def ttl_cache_local(data_referencia: Optional[str]) -> int:
+    """
+    TTL local da chave: dias fechados mudam apenas com lançamentos retroativos
+    (que publicam invalidação), o dia corrente muda a cada consolidação
+    """
+    hoje = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    if data_referencia and data_referencia < hoje:
+        return config.LOCAL_CACHE_TTL_PASSADO
+    return config.LOCAL_CACHE_TTL_HOJE
+
+
+def sincronizar_cache_local(redis_client: 'redis.Redis') -> bool:
+    """
+    Aplica ao cache local as invalidações publicadas no Redis desde a última
+    versão vista (no máximo uma verificação a cada LOCAL_CACHE_VERSAO_INTERVALO).
+    Retorna False se o cache local não puder ser usado.
+    """
+    if _cache_local.max_itens <= 0:
+        return False
+
+    agora = time.monotonic()
+    if _cache_local.versao is not None and agora - _cache_local.versao_verificada_em < config.LOCAL_CACHE_VERSAO_INTERVALO:
+        return True
+
+    try:
+        versao = int(redis_client.get(get_cache_versao_key()) or 0)
+        versao_local = _cache_local.versao
+
+        if versao_local is None:
+            _cache_local.limpar()
+        elif versao != versao_local:
+            eventos = redis_client.zrangebyscore(get_cache_invalidacoes_key(), f"({versao_local}", versao)
+            if versao < versao_local or len(eventos) < versao - versao_local:
+                # Histórico incompleto: não há como saber quais datas mudaram
+                _cache_local.limpar()
+            else:
+                _cache_local.remover_a_partir_de(min(evento.decode('utf-8').split('|', 1)[1] for evento in eventos))
+
+        _cache_local.versao = versao
+        _cache_local.versao_verificada_em = agora
+        return True
+    except BaseException as e:
+        config.logger.warning(f"Erro ao sincronizar cache local: {str(e)}")
+        _cache_local.limpar()
+        _cache_local.versao = None
+        return False
+
+
+def publicar_invalidacao(redis_client: 'redis.Redis', data: str) -> None:
+    """
+    Publica a invalidação das chaves com data_referencia >= data para os caches
+    locais: incrementa a versão e registra a data no histórico
+    """
+    versao = redis_client.incr(get_cache_versao_key())
+    invalidacoes_key = get_cache_invalidacoes_key()
+
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.zadd(invalidacoes_key, {f"{versao}|{data}": versao})
+    pipeline.zremrangebyrank(invalidacoes_key, 0, -(CACHE_INVALIDACOES_MAX + 1))
+    pipeline.expire(invalidacoes_key, CACHE_INDEX_TTL)
+    pipeline.execute()
+
+
+def estatisticas_cache_local() -> Dict[str, Any]:
+    return _cache_local.estatisticas()
+
+
+def serializar_json(data: Any) -> bytes:
+    return json.dumps(data, default=str).encode('utf-8')
+
+
 @xray_recorder.capture('get_from_cache')
-def get_from_cache(key: str) -> Optional[Dict[str, Any]]:
+def get_from_cache(key: str, data_referencia: Optional[str] = None,
+                   decodificar: Callable[[bytes], Any] = json.loads) -> Optional[Any]:
     """
-    Recupera dados do cache Redis
+    Recupera dados do cache Redis. Com data_referencia a chave passa antes pelo
+    cache local da instância, que guarda o valor serializado.
     """
     redis_client = get_redis_client()
     if not redis_client:
         return None
 
     try:
-        cached_data = redis_client.get(key)
+        local = data_referencia is not None and sincronizar_cache_local(redis_client)
+        cached_data = _cache_local.get(key) if local else None
+        if cached_data is None:
+            cached_data = redis_client.get(key)
+            if cached_data and local:
+                _cache_local.set(key, cached_data, ttl_cache_local(data_referencia), data_referencia)
+
         if cached_data:
-            return json.loads(cached_data)
+            return decodificar(cached_data)
     except BaseException as e:
         config.logger.warning(f"Erro ao recuperar do cache: {str(e)}")
 
@@ -57,33 +164,231 @@ def get_from_cache(key: str) -> Optional[Dict[str, Any]]:
 
 
 @xray_recorder.capture('set_cache')
-def set_cache(key: str, data: Dict[str, Any], ttl: int = 3600) -> None:
+def set_cache(key: str, data: Any, ttl: int = 3600, data_referencia: Optional[str] = None,
+              codificar: Callable[[Any], bytes] = serializar_json) -> None:
     """
-    Armazena dados no cache Redis
+    Armazena dados no cache Redis. Com data_referencia (YYYY-MM-DD) a chave é
+    registrada no índice de invalidação: uma alteração em qualquer data até
+    data_referencia (inclusive) remove a chave.
     """
     redis_client = get_redis_client()
     if not redis_client:
         return
 
     try:
-        redis_client.setex(key, ttl, json.dumps(data, default=str))
+        valor = codificar(data)
+        if not data_referencia:
+            redis_client.setex(key, ttl, valor)
+            return
+
+        if sincronizar_cache_local(redis_client):
+            _cache_local.set(key, valor, min(ttl, ttl_cache_local(data_referencia)), data_referencia)
+
+        # Índices com membro = "<data_referencia>|<chave>": por data (score =
+        # data_referencia como YYYYMMDD) e por expiração (score = expiração da chave)
+        membro = f"{data_referencia}|{key}"
+        index_key = get_cache_index_key()
+        expiracao_key = get_cache_expiracao_key()
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.setex(key, ttl, valor)
+        pipeline.zadd(index_key, {membro: score_data_referencia(data_referencia)})
+        pipeline.zadd(expiracao_key, {membro: time.time() + ttl})
+        pipeline.expire(index_key, CACHE_INDEX_TTL)
+        pipeline.expire(expiracao_key, CACHE_INDEX_TTL)
+        pipeline.execute()
     except BaseException as e:
         config.logger.warning(f"Erro ao armazenar no cache: {str(e)}")
 
 
+def get_cache_index_key() -> str:
+    return f"cache_index:{config.environment}"
+
+
+def get_cache_expiracao_key() -> str:
+    return f"cache_index_expiracao:{config.environment}"
+
+
+def score_data_referencia(data: str) -> int:
+    # YYYY-MM-DD -> YYYYMMDD: a ordem numérica é a ordem das datas
+    return int(data[:10].replace('-', ''))
+
+
+def remover_expirados_indice(redis_client: 'redis.Redis') -> None:
+    """
+    Remove dos índices até CACHE_UNLINK_CHUNK membros de chaves já expiradas
+    """
+    expiracao_key = get_cache_expiracao_key()
+    expirados = redis_client.zrangebyscore(expiracao_key, '-inf', time.time(), start=0, num=CACHE_UNLINK_CHUNK)
+    if not expirados:
+        return
+
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.zrem(get_cache_index_key(), *expirados)
+    pipeline.zrem(expiracao_key, *expirados)
+    pipeline.execute()
+
+
+@xray_recorder.capture('delete_cache')
+def delete_cache(*keys: str) -> None:
+    """
+    Remove chaves exatas do cache (UNLINK, sem bloquear o Redis)
+    """
+    _cache_local.remover(*keys)
+
+    redis_client = get_redis_client()
+    if not redis_client or not keys:
+        return
+
+    try:
+        redis_client.unlink(*keys)
+    except BaseException as e:
+        config.logger.warning(f"Erro ao invalidar cache: {str(e)}")
+
+
+@xray_recorder.capture('invalidate_cache_from_date')
+def invalidate_cache_from_date(data: str) -> None:
+    """
+    Invalida as chaves indexadas cuja data_referencia é maior ou igual a data,
+    inclusive nos caches locais das instâncias. Se o índice ainda não existir,
+    recorre ao SCAN das chaves de relatório legadas.
+    """
+    _cache_local.remover_a_partir_de(data)
+
+    redis_client = get_redis_client()
+    if not redis_client:
+        return
+
+    try:
+        try:
+            index_key = get_cache_index_key()
+            if not redis_client.exists(index_key):
+                invalidate_cache(f"relatorio:*:{config.environment}")
+                return
+
+            remover_expirados_indice(redis_client)
+
+            # Faixa de score: apenas as chaves com data_referencia >= data
+            membros = [m.decode('utf-8') for m in redis_client.zrangebyscore(index_key, score_data_referencia(data), '+inf')]
+            if not membros:
+                return
+
+            expiracao_key = get_cache_expiracao_key()
+            pipeline = redis_client.pipeline(transaction=False)
+            for i in range(0, len(membros), CACHE_UNLINK_CHUNK):
+                bloco = membros[i:i + CACHE_UNLINK_CHUNK]
+                pipeline.unlink(*[membro.split('|', 1)[1] for membro in bloco])
+                pipeline.zrem(index_key, *bloco)
+                pipeline.zrem(expiracao_key, *bloco)
+            pipeline.execute()
+            config.logger.info(f"Cache invalidado a partir de {data}: {len(membros)} chaves removidas")
+        finally:
+            # Só depois do UNLINK: uma instância que sincronizar antes dele
+            # recarregaria do Redis o valor antigo para o cache local
+            publicar_invalidacao(redis_client, data)
+    except BaseException as e:
+        config.logger.warning(f"Erro ao invalidar cache: {str(e)}")
+
+
 @xray_recorder.capture('invalidate_cache')
 def invalidate_cache(pattern: str) -> None:
     """
-    Invalida cache baseado em pattern
+    Invalida cache baseado em pattern (SCAN incremental + UNLINK, sem KEYS)
     """
+    # O pattern não indica datas: descarta todo o cache local
+    _cache_local.limpar()
+
     redis_client = get_redis_client()
     if not redis_client:
         return
 
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            redis_client.delete(*keys)
-            config.logger.info(f"Cache invalidado: {len(keys)} chaves removidas")
+        removidas = 0
+        bloco = []
+        for key in redis_client.scan_iter(match=pattern, count=CACHE_SCAN_COUNT):
+            bloco.append(key)
+            if len(bloco) >= CACHE_UNLINK_CHUNK:
+                redis_client.unlink(*bloco)
+                removidas += len(bloco)
+                bloco = []
+
+        if bloco:
+            redis_client.unlink(*bloco)
+            removidas += len(bloco)
+
+        if removidas:
+            config.logger.info(f"Cache invalidado: {removidas} chaves removidas")
     except BaseException as e:
         config.logger.warning(f"Erro ao invalidar cache: {str(e)}")
+
+
+@xray_recorder.capture('get_many_from_cache')
+def get_many_from_cache(keys: List[str], datas_referencia: Optional[Dict[str, str]] = None,
+                        decodificar: Callable[[bytes], Any] = json.loads) -> Dict[str, Any]:
+    """
+    Recupera várias chaves do cache Redis com um único MGET. As chaves com
+    data_referencia (datas_referencia[chave]) passam antes pelo cache local e
+    só as ausentes vão ao Redis. Retorna apenas as chaves encontradas.
+    """
+    redis_client = get_redis_client()
+    if not redis_client or not keys:
+        return {}
+
+    try:
+        datas_referencia = datas_referencia or {}
+        local = bool(datas_referencia) and sincronizar_cache_local(redis_client)
+
+        encontrados = {}
+        if local:
+            for key in keys:
+                if key in datas_referencia:
+                    valor = _cache_local.get(key)
+                    if valor is not None:
+                        encontrados[key] = valor
+
+        faltantes = [key for key in keys if key not in encontrados]
+        if faltantes:
+            for key, valor in zip(faltantes, redis_client.mget(faltantes)):
+                if not valor:
+                    continue
+                encontrados[key] = valor
+                if local and key in datas_referencia:
+                    _cache_local.set(key, valor, ttl_cache_local(datas_referencia[key]), datas_referencia[key])
+    except BaseException as e:
+        config.logger.warning(f"Erro ao recuperar do cache: {str(e)}")
+        return {}
+
+    # Valores que não decodificam são tratados como ausentes (e regravados pelo chamador)
+    resultado = {}
+    for key, valor in encontrados.items():
+        try:
+            resultado[key] = decodificar(valor)
+        except (ValueError, KeyError, TypeError) as e:
+            config.logger.warning(f"Erro ao decodificar {key} do cache: {str(e)}")
+            _cache_local.remover(key)
+    return resultado
+
+
+@xray_recorder.capture('set_many_cache')
+def set_many_cache(items: Dict[str, Any], ttl: int = 3600, datas_referencia: Optional[Dict[str, str]] = None,
+                   codificar: Callable[[Any], bytes] = serializar_json) -> None:
+    """
+    Armazena várias chaves no cache Redis com SETEX em um único pipeline (e no
+    cache local, para as chaves com data_referencia)
+    """
+    redis_client = get_redis_client()
+    if not redis_client or not items:
+        return
+
+    try:
+        datas_referencia = datas_referencia or {}
+        local = bool(datas_referencia) and sincronizar_cache_local(redis_client)
+
+        pipeline = redis_client.pipeline(transaction=False)
+        for key, data in items.items():
+            valor = codificar(data)
+            pipeline.setex(key, ttl, valor)
+            if local and key in datas_referencia:
+                _cache_local.set(key, valor, min(ttl, ttl_cache_local(datas_referencia[key])), datas_referencia[key])
+        pipeline.execute()
+    except BaseException as e:
+        config.logger.warning(f"Erro ao armazenar no cache: {str(e)}")
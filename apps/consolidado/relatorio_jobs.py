@@ -0,0 +1,281 @@
+import json
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Any, Optional, Callable
+from aws_xray_sdk.core import xray_recorder
+from botocore.exceptions import ClientError
+from configuration import Config
+
+config = Config()
+
+# Ciclo de vida: PENDENTE -> PROCESSANDO -> CONCLUIDO | ERRO
+STATUS_PENDENTE = 'PENDENTE'
+STATUS_PROCESSANDO = 'PROCESSANDO'
+STATUS_CONCLUIDO = 'CONCLUIDO'
+STATUS_ERRO = 'ERRO'
+
+EVENTO_PROCESSAR_JOB = 'RELATORIO_PROCESSAR'
+
+# Intervalo mínimo entre gravações de progresso no DynamoDB (segundos)
+INTERVALO_PROGRESSO = 2
+
+
+def chave_resultado_job(job_id: str) -> str:
+    return f"relatorios/{config.environment}/jobs/{job_id}.json"
+
+
+@xray_recorder.capture('criar_job_relatorio')
+def criar_job_relatorio(tipo: str, parametros: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Registra o job como PENDENTE e o envia para a fila de relatórios,
+    processada pela função de relatórios (timeout maior que o do API Gateway)
+    """
+    agora = datetime.now(timezone.utc)
+    job = {
+        'job_id': uuid.uuid4().hex,
+        'tipo': tipo,
+        'status': STATUS_PENDENTE,
+        'parametros': parametros,
+        'progresso': 0,
+        'tentativas': 0,
+        'criado_em': agora.isoformat(),
+        'atualizado_em': agora.isoformat(),
+        'expira_em': int(agora.timestamp()) + config.RELATORIO_JOB_TTL_DIAS * 86400
+    }
+    config.tableRelatorioJobs.put_item(Item=job)
+
+    try:
+        config.sqsClient.send_message(
+            QueueUrl=config.RELATORIO_JOBS_QUEUE_URL,
+            MessageBody=json.dumps({
+                'eventType': EVENTO_PROCESSAR_JOB,
+                'jobId': job['job_id'],
+                'timestamp': agora.isoformat(),
+                'ambiente': config.environment
+            }),
+            MessageAttributes={
+                'EventType': {
+                    'StringValue': EVENTO_PROCESSAR_JOB,
+                    'DataType': 'String'
+                }
+            }
+        )
+    except BaseException as e:
+        registrar_erro_job(job['job_id'], f"Erro ao enfileirar job: {str(e)}", final=True)
+        raise
+
+    config.logger.info(f"Job de relatório {job['job_id']} criado ({tipo})")
+    return job
+
+
+def get_job_relatorio(job_id: str) -> Optional[Dict[str, Any]]:
+    response = config.tableRelatorioJobs.get_item(Key={'job_id': job_id})
+    return response.get('Item')
+
+
+def iniciar_job(job_id: str, tentativa: int) -> Optional[Dict[str, Any]]:
+    """
+    Marca o job como PROCESSANDO. Retorna None se o job não existe ou já foi
+    finalizado (mensagem reentregue)
+    """
+    agora = datetime.now(timezone.utc).isoformat()
+    try:
+        response = config.tableRelatorioJobs.update_item(
+            Key={'job_id': job_id},
+            UpdateExpression='SET #status = :processando, tentativas = :tentativa, atualizado_em = :agora, '
+                             'iniciado_em = if_not_exists(iniciado_em, :agora)',
+            ConditionExpression='#status IN (:pendente, :processando)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':processando': STATUS_PROCESSANDO,
+                ':pendente': STATUS_PENDENTE,
+                ':tentativa': tentativa,
+                ':agora': agora
+            },
+            ReturnValues='ALL_NEW'
+        )
+        return response['Attributes']
+
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise
+
+
+def criar_callback_progresso(job_id: str) -> Callable[[int, int], None]:
+    """
+    Callback progresso(dias_processados, total_dias) para a montagem do
+    relatório. Grava no máximo a cada INTERVALO_PROGRESSO segundos; 100% só
+    ao concluir o job.
+    """
+    ultima_gravacao = [0.0]
+
+    def progresso(dias_processados: int, total_dias: int) -> None:
+        agora = time.monotonic()
+        if agora - ultima_gravacao[0] < INTERVALO_PROGRESSO:
+            return
+        ultima_gravacao[0] = agora
+
+        try:
+            config.tableRelatorioJobs.update_item(
+                Key={'job_id': job_id},
+                UpdateExpression='SET progresso = :progresso, dias_processados = :dias, total_dias = :total, '
+                                 'atualizado_em = :agora',
+                ExpressionAttributeValues={
+                    ':progresso': min(99, dias_processados * 100 // total_dias) if total_dias else 0,
+                    ':dias': dias_processados,
+                    ':total': total_dias,
+                    ':agora': datetime.now(timezone.utc).isoformat()
+                }
+            )
+        except BaseException as e:
+            # Progresso é informativo: não interrompe o processamento
+            config.logger.warning(f"Erro ao gravar progresso do job {job_id}: {str(e)}")
+
+    return progresso
+
+
+@xray_recorder.capture('concluir_job')
+def concluir_job(job_id: str, corpo: Dict[str, Any]) -> None:
+    """
+    Grava o resultado (mesmo corpo da resposta síncrona) no S3 e marca o job
+    como CONCLUIDO, com os arquivos gerados pelo relatório
+    """
+    key = chave_resultado_job(job_id)
+    config.s3Client.put_object(
+        Bucket=config.S3_BUCKET,
+        Key=key,
+        Body=json.dumps(corpo, default=str, ensure_ascii=False).encode('utf-8'),
+        ContentType='application/json',
+        ServerSideEncryption='aws:kms'
+    )
+
+    config.tableRelatorioJobs.update_item(
+        Key={'job_id': job_id},
+        UpdateExpression='SET #status = :concluido, progresso = :cem, resultado = :resultado, arquivos = :arquivos, '
+                         'concluido_em = :agora, atualizado_em = :agora REMOVE ultimo_erro',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={
+            ':concluido': STATUS_CONCLUIDO,
+            ':cem': 100,
+            ':resultado': {'bucket': config.S3_BUCKET, 'key': key},
+            ':arquivos': corpo.get('arquivos', {}),
+            ':agora': datetime.now(timezone.utc).isoformat()
+        }
+    )
+
+    config.logger.info(f"Job de relatório {job_id} concluído: s3://{config.S3_BUCKET}/{key}")
+
+
+def registrar_erro_job(job_id: str, erro: str, final: bool) -> None:
+    """
+    Registra o erro do job. Sem final o job continua PROCESSANDO e a mensagem
+    volta para a fila para nova tentativa.
+    """
+    agora = datetime.now(timezone.utc).isoformat()
+    try:
+        if final:
+            config.tableRelatorioJobs.update_item(
+                Key={'job_id': job_id},
+                UpdateExpression='SET #status = :erro, erro = :mensagem, atualizado_em = :agora',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':erro': STATUS_ERRO, ':mensagem': erro, ':agora': agora}
+            )
+        else:
+            config.tableRelatorioJobs.update_item(
+                Key={'job_id': job_id},
+                UpdateExpression='SET ultimo_erro = :mensagem, atualizado_em = :agora',
+                ExpressionAttributeValues={':mensagem': erro, ':agora': agora}
+            )
+    except BaseException as e:
+        config.logger.error(f"Erro ao registrar falha do job {job_id}: {str(e)}")
+
+
+def expirar_job_travado(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Marca como ERRO o job PROCESSANDO há mais de RELATORIO_JOB_PRAZO_SEGUNDOS
+    (timeout ou queda da função até a mensagem ir para a DLQ deixam o job sem
+    conclusão). Retorna o job atualizado.
+    """
+    if job['status'] != STATUS_PROCESSANDO or not job.get('iniciado_em'):
+        return job
+
+    agora = datetime.now(timezone.utc)
+    prazo = datetime.fromisoformat(job['iniciado_em']) + timedelta(seconds=config.RELATORIO_JOB_PRAZO_SEGUNDOS)
+    if agora < prazo:
+        return job
+
+    try:
+        # Condicionado ao mesmo início: não sobrescreve um job concluído nesse meio tempo
+        response = config.tableRelatorioJobs.update_item(
+            Key={'job_id': job['job_id']},
+            UpdateExpression='SET #status = :erro, erro = :mensagem, atualizado_em = :agora',
+            ConditionExpression='#status = :processando AND iniciado_em = :iniciado_em',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':erro': STATUS_ERRO,
+                ':processando': STATUS_PROCESSANDO,
+                ':iniciado_em': job['iniciado_em'],
+                ':mensagem': job.get('ultimo_erro') or 'Prazo de processamento do job esgotado',
+                ':agora': agora.isoformat()
+            },
+            ReturnValues='ALL_NEW'
+        )
+        config.logger.warning(f"Job de relatório {job['job_id']} expirado em PROCESSANDO desde {job['iniciado_em']}")
+        return response['Attributes']
+
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return get_job_relatorio(job['job_id']) or job
+        raise
+
+
+def gerar_url_download(bucket: str, key: str) -> str:
+    return config.s3Client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket, 'Key': key},
+        ExpiresIn=config.RELATORIO_JOB_URL_EXPIRACAO
+    )
+
+
+def formatar_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converte o item do job para a resposta de status, com URLs pré-assinadas
+    do resultado e dos arquivos quando CONCLUIDO
+    """
+    resposta = {
+        'job_id': job['job_id'],
+        'tipo': job['tipo'],
+        'status': job['status'],
+        'progresso': int(job.get('progresso', 0)),
+        'parametros': job.get('parametros', {}),
+        'tentativas': int(job.get('tentativas', 0)),
+        'criado_em': job.get('criado_em'),
+        'atualizado_em': job.get('atualizado_em')
+    }
+
+    if job['status'] == STATUS_PROCESSANDO and 'total_dias' in job:
+        resposta['dias_processados'] = int(job['dias_processados'])
+        resposta['total_dias'] = int(job['total_dias'])
+
+    if job['status'] == STATUS_ERRO:
+        resposta['erro'] = job.get('erro')
+
+    if job['status'] == STATUS_CONCLUIDO:
+        resposta['concluido_em'] = job.get('concluido_em')
+        resposta['resultado'] = {
+            'url': gerar_url_download(job['resultado']['bucket'], job['resultado']['key']),
+            'expira_em_segundos': config.RELATORIO_JOB_URL_EXPIRACAO
+        }
+        arquivos = {
+            nome: {
+                **{campo: int(valor) if campo in ('linhas', 'bytes') else valor for campo, valor in arquivo.items()},
+                'url': gerar_url_download(arquivo['bucket'], arquivo['key'])
+            }
+            for nome, arquivo in job.get('arquivos', {}).items()
+        }
+        if arquivos:
+            resposta['arquivos'] = arquivos
+
+    return resposta
@@ -1,19 +1,26 @@
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 from aws_xray_sdk.core import xray_recorder
-from aws_xray_sdk.core import patch_all
 from datetime import datetime, timezone
-from operacoes import get_saldo_anterior, calculate_saldo_diario, save_saldo_diario, recalculate_subsequent_balances
-from redis_ops import invalidate_cache
+from operacoes import apply_lancamentos_delta, reprocess_saldo_diario, recalculate_subsequent_balances
+from redis_ops import delete_cache, invalidate_cache_from_date
+from relatorio_jobs import EVENTO_PROCESSAR_JOB
+from utils import executar_job_relatorio
 from configuration import Config
 
-patch_all()
 config = Config()
 
 @xray_recorder.capture('handle_sqs_event')
-def handle_sqs_event(event: Dict[str, Any]) -> None:
+def handle_sqs_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Processa o lote SQS e retorna apenas as mensagens que falharam
+    (ReportBatchItemFailures), evitando o reprocessamento do lote inteiro
+    """
     records = event.get('Records', [])
 
+    messages = []
+    jobs = []
+    falhas = []
     for record in records:
         try:
             # Extrair corpo da mensagem
@@ -23,48 +30,149 @@ def handle_sqs_event(event: Dict[str, Any]) -> None:
             else:
                 message = body
 
-            # Processar mensagem
-            process_sqs_message(message)
+            if message.get('eventType') == EVENTO_PROCESSAR_JOB:
+                # Fila de relatórios: a tentativa decide se o erro do job é final
+                tentativa = int(record.get('attributes', {}).get('ApproximateReceiveCount', 1))
+                jobs.append((record.get('messageId'), message, tentativa))
+            else:
+                messages.append((record.get('messageId'), message))
+
+        except BaseException as e:
+            config.logger.error(f"Erro ao processar registro SQS {record.get('messageId')}: {str(e)}")
+            falhas.append(record.get('messageId'))
 
-            config.logger.info(f"Mensagem SQS processada com sucesso: {record.get('messageId')}")
+    # Processar o lote agrupado por data
+    falhas.extend(process_sqs_messages(messages))
 
+    # Jobs de relatório assíncronos
+    for message_id, message, tentativa in jobs:
+        try:
+            executar_job_relatorio(message.get('jobId'), tentativa)
         except BaseException as e:
-            config.logger.error(f"Erro ao processar registro SQS: {str(e)}")
-            # Relançar exceção para que a mensagem seja enviada para DLQ
-            raise
+            config.logger.error(f"Erro ao processar job de relatório {message.get('jobId')}: {str(e)}")
+            falhas.append(message_id)
 
+    config.logger.info(f"Lote SQS processado: {len(records) - len(falhas)} sucesso, {len(falhas)} falha(s)")
 
-@xray_recorder.capture('process_sqs_message')
-def process_sqs_message(message: Dict[str, Any]) -> None:
-    try:
-        # Extrair dados da mensagem
-        event_type = message.get('eventType')
-        lancamento_data = message.get('data', message.get('timestamp', datetime.now(timezone.utc).isoformat()))
+    # Mensagens com falha voltam para a fila (e para a DLQ após o maxReceiveCount)
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in falhas]}
+
+
+def get_data_lancamento(message: Dict[str, Any]) -> str:
+    """
+    Extrai a data (YYYY-MM-DD) do lançamento da mensagem
+    """
+    lancamento_data = message.get('data', message.get('timestamp', datetime.now(timezone.utc).isoformat()))
+    return lancamento_data.split('T')[0]
 
-        if event_type != 'LANCAMENTO_CRIADO':
+
+@xray_recorder.capture('process_sqs_messages')
+def process_sqs_messages(messages: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """
+    Processa um lote de mensagens (messageId, mensagem): agrupa por data,
+    consolida cada dia uma única vez e propaga os saldos uma única vez a partir
+    da menor data afetada. Retorna os messageIds que falharam.
+    """
+    mensagens_por_data: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    falhas = []
+
+    for message_id, message in messages:
+        event_type = message.get('eventType')
+        if event_type not in ('LANCAMENTO_CRIADO', 'CONSOLIDADO_REPROCESSAR'):
             config.logger.warning(f"Tipo de evento não suportado: {event_type}")
-            return
+            continue
+
+        try:
+            mensagens_por_data.setdefault(get_data_lancamento(message), []).append((message_id, message))
+        except BaseException as e:
+            config.logger.error(f"Mensagem SQS {message_id} sem data válida: {str(e)}")
+            falhas.append(message_id)
 
-        # Extrair data do lançamento
-        data_lancamento = lancamento_data.split('T')[0]
+    datas_alteradas = []
+    for data_lancamento in sorted(mensagens_por_data):
+        grupo = mensagens_por_data[data_lancamento]
+        try:
+            alterado = process_messages_for_date(data_lancamento, [message for _, message in grupo])
+        except BaseException as e:
+            config.logger.warning(f"Erro ao consolidar {data_lancamento} em lote, isolando mensagens: {str(e)}")
+            alterado, falhas_dia = process_messages_individually(data_lancamento, grupo)
+            falhas.extend(falhas_dia)
 
-        # Recalcular saldo para a data
-        saldo_anterior = get_saldo_anterior(data_lancamento)
-        saldo_diario = calculate_saldo_diario(data_lancamento, saldo_anterior)
+        if alterado:
+            datas_alteradas.append(data_lancamento)
 
-        # Salvar saldo atualizado
-        save_saldo_diario(saldo_diario)
+    if not datas_alteradas:
+        return falhas
 
-        # Invalidar cache para a data
-        invalidate_cache(f"saldo_diario:{data_lancamento}:*")
-        invalidate_cache(f"relatorio:*")
+    # Invalidar cache das datas alteradas e dos relatórios que terminam nelas ou depois
+    delete_cache(*[f"saldo_diario:{data_lancamento}:{config.environment}" for data_lancamento in datas_alteradas])
+    invalidate_cache_from_date(datas_alteradas[0])
 
-        # Recalcular saldos dos dias seguintes (se necessário)
-        recalculate_subsequent_balances(data_lancamento)
+    # Recalcular saldos dos dias seguintes a partir da menor data alterada,
+    # cobrindo os 30 dias seguintes à maior
+    distancia = (datetime.fromisoformat(datas_alteradas[-1]) - datetime.fromisoformat(datas_alteradas[0])).days
+    recalculate_subsequent_balances(datas_alteradas[0], max_days=distancia + 30)
 
-        config.logger.info(f"Consolidado atualizado para {data_lancamento}")
+    config.logger.info(f"Consolidado atualizado para {', '.join(datas_alteradas)}")
+    return falhas
 
-    except BaseException as e:
-        config.logger.error(f"Erro ao processar mensagem SQS: {str(e)}")
-        #raise ConsolidadoError(f"Erro no processamento: {str(e)}")
-        raise f"Erro no processamento: {str(e)}"
\ No newline at end of file
+
+def process_messages_individually(data_lancamento: str, grupo: List[Tuple[str, Dict[str, Any]]]) -> Tuple[bool, List[str]]:
+    """
+    Consolida as mensagens do dia uma a uma para isolar as que falham.
+    Retorna se o consolidado mudou e os messageIds com falha.
+    """
+    alterado = False
+    falhas = []
+
+    for message_id, message in grupo:
+        try:
+            alterado = process_messages_for_date(data_lancamento, [message]) or alterado
+        except BaseException as e:
+            config.logger.error(f"Erro ao processar mensagem SQS {message_id}: {str(e)}")
+            falhas.append(message_id)
+
+    return alterado, falhas
+
+
+def process_messages_for_date(data_lancamento: str, messages: List[Dict[str, Any]]) -> bool:
+    """
+    Consolida as mensagens de um dia. Retorna True se o consolidado do dia mudou.
+    """
+    reprocessar = False
+    lancamentos = []
+
+    for message in messages:
+        lancamento_id = message.get('lancamentoId')
+        tipo = message.get('tipo')
+        valor = message.get('valor')
+
+        if message.get('eventType') == 'CONSOLIDADO_REPROCESSAR' or not (lancamento_id and tipo and valor is not None):
+            reprocessar = True
+        else:
+            lancamentos.append({
+                'lancamentoId': lancamento_id,
+                'tipo': tipo,
+                'valor': valor,
+                'categoria': message.get('categoria'),
+                'tags': message.get('tags')
+            })
+
+    # Delta (com os marcadores LANCAMENTO#) das mensagens válidas antes de um
+    # eventual reprocessamento: sem os marcadores, uma reentrega dessas
+    # mensagens seria somada de novo sobre a linha recalculada (reentregas
+    # não alteram o consolidado)
+    alterado = bool(lancamentos) and len(apply_lancamentos_delta(data_lancamento, lancamentos)) > 0
+
+    if reprocessar:
+        # Reparo: recálculo completo do dia a partir dos lançamentos
+        reprocess_saldo_diario(data_lancamento)
+        return True
+
+    return alterado
+
+
+@xray_recorder.capture('process_sqs_message')
+def process_sqs_message(message: Dict[str, Any]) -> None:
+    if process_sqs_messages([(None, message)]):
+        raise ValueError(f"Erro no processamento da mensagem: {message.get('lancamentoId')}")
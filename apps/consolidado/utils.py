@@ -1,17 +1,24 @@
 import json
-from datetime import datetime, timezone, timedelta
+import re
+from datetime import datetime, timezone
 from decimal import Decimal
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Callable
 from aws_xray_sdk.core import xray_recorder
-from aws_xray_sdk.core import patch_all
 from configuration import Config
 
-from operacoes import get_saldo_diario, get_saldo_anterior, calculate_saldo_diario, save_saldo_diario \
-                     ,generate_relatorio_periodo, save_relatorio_to_s3, get_lancamentos_by_date_range
+from operacoes import get_saldo_diario, reprocess_saldo_diario \
+                     ,generate_relatorio_periodo, save_relatorio_to_s3, get_metricas_periodo \
+                     ,agregar_breakdown, get_breakdown_periodo, DIMENSOES_BREAKDOWN, PERIODOS_METRICAS, listar_dias
+from modelos import RelatorioConsolidado
+from exportacao import exportar_relatorio_s3, formato_disponivel, FORMATOS_EXPORTACAO
+from relatorio_jobs import criar_job_relatorio, get_job_relatorio, iniciar_job, criar_callback_progresso, \
+                           concluir_job, registrar_erro_job, formatar_job, expirar_job_travado
 
-patch_all()
 config = Config()
 
+# Identificador dos jobs de relatório (uuid4 hex)
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
 
 def create_response(status_code: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
     default_headers = {
@@ -58,6 +65,9 @@ def route_http_request(event: Dict[str, Any]) -> Dict[str, Any]:
         
         elif resource_path == '/consolidado/relatorio':
             return handle_relatorio_request(event)
+
+        elif resource_path == '/consolidado/relatorio/jobs/{job_id}':
+            return handle_job_status_request(event)
         
         elif resource_path == '/metricas':
             return handle_metricas_request(event)
@@ -100,8 +110,17 @@ def handle_saldo_request(event: Dict[str, Any]) -> Dict[str, Any]:
         data_fim = query_params.get('data_fim')  # Período fim
         incluir_detalhes = query_params.get('incluir_detalhes', 'false').lower() == 'true'
         salvar_s3 = query_params.get('salvar_s3', 'false').lower() == 'true'
+        detalhar_por = [d.strip() for d in query_params.get('detalhar_por', '').split(',') if d.strip()]  # Breakdown
+        assincrono = query_params.get('assincrono', 'false').lower() == 'true'  # Período via job
 
         # Validar parâmetros
+        dimensoes_invalidas = [d for d in detalhar_por if d not in DIMENSOES_BREAKDOWN]
+        if dimensoes_invalidas:
+            return create_response(400, {
+                'error': 'Detalhamento inválido',
+                'message': f"detalhar_por aceita: {', '.join(DIMENSOES_BREAKDOWN)}"
+            })
+
         if data:
             # Consulta de saldo para data específica
             try:
@@ -114,10 +133,8 @@ def handle_saldo_request(event: Dict[str, Any]) -> Dict[str, Any]:
 
             saldo = get_saldo_diario(data)
             if not saldo:
-                # Calcular saldo se não existir
-                saldo_anterior = get_saldo_anterior(data)
-                saldo = calculate_saldo_diario(data, saldo_anterior)
-                save_saldo_diario(saldo)
+                # Calcular saldo se não existir (com os marcadores dos lançamentos somados)
+                saldo = reprocess_saldo_diario(data)
 
             response_data = {
                 'success': True,
@@ -151,66 +168,25 @@ def handle_saldo_request(event: Dict[str, Any]) -> Dict[str, Any]:
                     'message': 'Data início deve ser menor ou igual à data fim'
                 })
 
-            # Gerar relatório
-            relatorio = generate_relatorio_periodo(data_inicio, data_fim)
-
-            # Preparar resposta
-            response_data = {
-                'success': True,
-                'tipo': 'relatorio_periodo',
-                'data': {
-                    'periodo_inicio': relatorio.periodo_inicio,
-                    'periodo_fim': relatorio.periodo_fim,
-                    'saldo_inicial_periodo': float(relatorio.saldo_inicial_periodo),
-                    'saldo_final_periodo': float(relatorio.saldo_final_periodo),
-                    'total_creditos_periodo': float(relatorio.total_creditos_periodo),
-                    'total_debitos_periodo': float(relatorio.total_debitos_periodo),
-                    'quantidade_dias': relatorio.quantidade_dias,
-                    'resumo_movimentacao': {
-                        'variacao_saldo': float(relatorio.saldo_final_periodo - relatorio.saldo_inicial_periodo),
-                        'media_creditos_dia': float(
-                            relatorio.total_creditos_periodo / relatorio.quantidade_dias) if relatorio.quantidade_dias > 0 else 0,
-                        'media_debitos_dia': float(
-                            relatorio.total_debitos_periodo / relatorio.quantidade_dias) if relatorio.quantidade_dias > 0 else 0
-                    }
-                },
-                'timestamp': datetime.now(timezone.utc).isoformat()
+            parametros = {
+                'data_inicio': data_inicio,
+                'data_fim': data_fim,
+                'incluir_detalhes': incluir_detalhes,
+                'salvar_s3': salvar_s3,
+                'detalhar_por': detalhar_por
             }
 
-            # Incluir detalhes diários se solicitado
-            if incluir_detalhes:
-                response_data['data']['saldos_diarios'] = [
-                    {
-                        'data': saldo.data,
-                        'saldo_inicial': float(saldo.saldo_inicial),
-                        'total_creditos': float(saldo.total_creditos),
-                        'total_debitos': float(saldo.total_debitos),
-                        'saldo_final': float(saldo.saldo_final),
-                        'quantidade_lancamentos': saldo.quantidade_lancamentos,
-                        'ultima_atualizacao': saldo.ultima_atualizacao
-                    }
-                    for saldo in relatorio.saldos_diarios
-                ]
-
-            # Salvar no S3 se solicitado
-            if salvar_s3:
-                try:
-                    s3_filename = save_relatorio_to_s3(relatorio)
-                    response_data['s3_backup'] = {
-                        'filename': s3_filename,
-                        'bucket': config.S3_BUCKET
-                    }
-                except Exception as e:
-                    config.logger.warning(f"Erro ao salvar no S3: {str(e)}")
+            if assincrono:
+                return create_response(202, format_job_criado(criar_job_relatorio('saldo_periodo', parametros)))
+
+            response_data = montar_saldo_periodo(**parametros)
 
         else:
             # Consulta de hoje se nenhum parâmetro fornecido
             hoje = datetime.now(timezone.utc).strftime('%Y-%m-%d')
             saldo = get_saldo_diario(hoje)
             if not saldo:
-                saldo_anterior = get_saldo_anterior(hoje)
-                saldo = calculate_saldo_diario(hoje, saldo_anterior)
-                save_saldo_diario(saldo)
+                saldo = reprocess_saldo_diario(hoje)
 
             response_data = {
                 'success': True,
@@ -227,6 +203,11 @@ def handle_saldo_request(event: Dict[str, Any]) -> Dict[str, Any]:
                 'timestamp': datetime.now(timezone.utc).isoformat()
             }
 
+        # Breakdown do dia a partir dos contadores consolidados (o do período vem de montar_saldo_periodo)
+        if detalhar_por and response_data['tipo'] != 'relatorio_periodo':
+            breakdown = agregar_breakdown([saldo.contadores], detalhar_por)
+            response_data['data']['breakdown'] = format_breakdown(breakdown)
+
         return create_response(200, response_data)
 
     except Exception as e:
@@ -284,76 +265,34 @@ def handle_relatorio_request(event: Dict[str, Any]) -> Dict[str, Any]:
         formato = query_params.get('formato', 'json')
         incluir_detalhes = query_params.get('incluir_detalhes', 'false').lower() == 'true'
         salvar_s3 = query_params.get('salvar_s3', 'false').lower() == 'true'
-        
-        # Gerar relatório
-        relatorio = generate_relatorio_periodo(data_inicio, data_fim)
-        
-        # Conversões seguras para float
-        saldo_inicial = safe_decimal_to_float(relatorio.saldo_inicial_periodo)
-        saldo_final = safe_decimal_to_float(relatorio.saldo_final_periodo)
-        total_creditos = safe_decimal_to_float(relatorio.total_creditos_periodo)
-        total_debitos = safe_decimal_to_float(relatorio.total_debitos_periodo)
-        quantidade_dias = safe_int_conversion(relatorio.quantidade_dias)
-        
-        # Calcular percentual de crescimento
-        percentual_crescimento = 0.0
-        if saldo_inicial > 0:
-            percentual_crescimento = ((saldo_final - saldo_inicial) / saldo_inicial) * 100
-        
-        # Preparar resposta
-        response_data = {
-            'success': True,
-            'tipo': 'relatorio_periodo',
-            'data': {
-                'periodo': {
-                    'inicio': relatorio.periodo_inicio,
-                    'fim': relatorio.periodo_fim,
-                    'quantidade_dias': quantidade_dias
-                },
-                'resumo_financeiro': {
-                    'saldo_inicial_periodo': saldo_inicial,
-                    'saldo_final_periodo': saldo_final,
-                    'total_creditos_periodo': total_creditos,
-                    'total_debitos_periodo': total_debitos,
-                    'variacao_liquida': saldo_final - saldo_inicial,
-                    'percentual_crescimento': round(percentual_crescimento, 2)
-                }
-            },
-            'metadados': {
-                'gerado_em': datetime.now(timezone.utc).isoformat(),
-                'formato': formato,
-                'incluir_detalhes': incluir_detalhes
-            },
-            'timestamp': datetime.now(timezone.utc).isoformat()
+        assincrono = query_params.get('assincrono', 'false').lower() == 'true'
+
+        if formato != 'json' and formato not in FORMATOS_EXPORTACAO:
+            return create_response(400, {
+                'error': 'Formato inválido',
+                'message': f"formato deve ser um dos valores: json, {', '.join(FORMATOS_EXPORTACAO)}"
+            })
+
+        if formato != 'json' and not formato_disponivel(formato):
+            return create_response(501, {
+                'error': 'Formato indisponível',
+                'message': f'O formato {formato} não está disponível neste ambiente'
+            })
+
+        parametros = {
+            'data_inicio': data_inicio,
+            'data_fim': data_fim,
+            'formato': formato,
+            'incluir_detalhes': incluir_detalhes,
+            'salvar_s3': salvar_s3
         }
-        
-        # Incluir detalhes se solicitado
-        if incluir_detalhes:
-            response_data['data']['saldos_diarios'] = [
-                {
-                    'data': saldo.data,
-                    'saldo_inicial': safe_decimal_to_float(saldo.saldo_inicial),
-                    'total_creditos': safe_decimal_to_float(saldo.total_creditos),
-                    'total_debitos': safe_decimal_to_float(saldo.total_debitos),
-                    'saldo_final': safe_decimal_to_float(saldo.saldo_final),
-                    'quantidade_lancamentos': safe_int_conversion(saldo.quantidade_lancamentos)
-                }
-                for saldo in relatorio.saldos_diarios
-            ]
-        
-        # Salvar no S3 se solicitado
-        if salvar_s3:
-            try:
-                s3_filename = save_relatorio_to_s3(relatorio)
-                response_data['arquivos'] = {
-                    's3_backup': {
-                        'bucket': config.S3_BUCKET,
-                        'key': s3_filename
-                    }
-                }
-            except Exception as e:
-                config.logger.warning(f"Erro ao salvar no S3: {str(e)}")
-        
+
+        # Períodos longos: o job é processado fora do limite de 30 s do API Gateway
+        if assincrono:
+            return create_response(202, format_job_criado(criar_job_relatorio('relatorio_periodo', parametros)))
+
+        response_data = montar_relatorio_periodo(**parametros)
+
         return create_response(200, response_data)
         
     except Exception as e:
@@ -364,6 +303,262 @@ def handle_relatorio_request(event: Dict[str, Any]) -> Dict[str, Any]:
         })
 
 
+def montar_saldo_periodo(data_inicio: str, data_fim: str, incluir_detalhes: bool = False, salvar_s3: bool = False,
+                         detalhar_por: Optional[List[str]] = None,
+                         progresso: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Corpo da resposta de GET /consolidado com período (data_inicio/data_fim),
+    usado também pelos jobs assíncronos
+    """
+    # Gerar relatório (sem detalhes/S3 o resumo vem dos rollups)
+    relatorio = generate_relatorio_periodo(data_inicio, data_fim, incluir_detalhes or salvar_s3, progresso)
+
+    # Preparar resposta
+    response_data = {
+        'success': True,
+        'tipo': 'relatorio_periodo',
+        'data': {
+            'periodo_inicio': relatorio.periodo_inicio,
+            'periodo_fim': relatorio.periodo_fim,
+            'saldo_inicial_periodo': float(relatorio.saldo_inicial_periodo),
+            'saldo_final_periodo': float(relatorio.saldo_final_periodo),
+            'total_creditos_periodo': float(relatorio.total_creditos_periodo),
+            'total_debitos_periodo': float(relatorio.total_debitos_periodo),
+            'quantidade_dias': relatorio.quantidade_dias,
+            'resumo_movimentacao': {
+                'variacao_saldo': float(relatorio.saldo_final_periodo - relatorio.saldo_inicial_periodo),
+                'media_creditos_dia': float(
+                    relatorio.total_creditos_periodo / relatorio.quantidade_dias) if relatorio.quantidade_dias > 0 else 0,
+                'media_debitos_dia': float(
+                    relatorio.total_debitos_periodo / relatorio.quantidade_dias) if relatorio.quantidade_dias > 0 else 0
+            }
+        },
+        'timestamp': datetime.now(timezone.utc).isoformat()
+    }
+
+    # Incluir detalhes diários se solicitado
+    if incluir_detalhes:
+        response_data['data']['saldos_diarios'] = [
+            {
+                'data': saldo.data,
+                'saldo_inicial': float(saldo.saldo_inicial),
+                'total_creditos': float(saldo.total_creditos),
+                'total_debitos': float(saldo.total_debitos),
+                'saldo_final': float(saldo.saldo_final),
+                'quantidade_lancamentos': saldo.quantidade_lancamentos,
+                'ultima_atualizacao': saldo.ultima_atualizacao
+            }
+            for saldo in relatorio.saldos_diarios
+        ]
+
+    # Salvar no S3 se solicitado
+    if salvar_s3:
+        try:
+            s3_filename = save_relatorio_to_s3(relatorio)
+            response_data['arquivos'] = {
+                's3_backup': {
+                    'bucket': config.S3_BUCKET,
+                    'key': s3_filename
+                }
+            }
+        except Exception as e:
+            config.logger.warning(f"Erro ao salvar no S3: {str(e)}")
+
+    # Breakdown por categoria/tag a partir dos rollups do período
+    if detalhar_por:
+        response_data['data']['breakdown'] = format_breakdown(get_breakdown_periodo(data_inicio, data_fim, detalhar_por))
+
+    return response_data
+
+
+def montar_relatorio_periodo(data_inicio: str, data_fim: str, formato: str = 'json', incluir_detalhes: bool = False,
+                             salvar_s3: bool = False,
+                             progresso: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Corpo da resposta de GET /consolidado/relatorio, usado também pelos jobs
+    assíncronos
+    """
+    # Formatos de exportação: saldos diários gravados no S3 em streaming
+    exportacao = exportar_relatorio_s3(data_inicio, data_fim, formato, progresso) if formato != 'json' else None
+
+    if exportacao and not incluir_detalhes:
+        # Resumo acumulado pela própria exportação, sem ler o período de novo
+        resumo = exportacao['resumo']
+        relatorio = RelatorioConsolidado(
+            periodo_inicio=data_inicio,
+            periodo_fim=data_fim,
+            saldo_inicial_periodo=resumo['saldo_inicial_periodo'],
+            saldo_final_periodo=resumo['saldo_final_periodo'],
+            total_creditos_periodo=resumo['total_creditos_periodo'],
+            total_debitos_periodo=resumo['total_debitos_periodo'],
+            quantidade_dias=len(listar_dias(data_inicio, data_fim)),
+            saldos_diarios=[]
+        )
+    else:
+        # Gerar relatório (sem detalhes/S3 o resumo vem dos rollups); na exportação o progresso vem dela
+        relatorio = generate_relatorio_periodo(data_inicio, data_fim, incluir_detalhes or (salvar_s3 and not exportacao),
+                                               None if exportacao else progresso)
+    
+    # Conversões seguras para float
+    saldo_inicial = safe_decimal_to_float(relatorio.saldo_inicial_periodo)
+    saldo_final = safe_decimal_to_float(relatorio.saldo_final_periodo)
+    total_creditos = safe_decimal_to_float(relatorio.total_creditos_periodo)
+    total_debitos = safe_decimal_to_float(relatorio.total_debitos_periodo)
+    quantidade_dias = safe_int_conversion(relatorio.quantidade_dias)
+    
+    # Calcular percentual de crescimento
+    percentual_crescimento = 0.0
+    if saldo_inicial > 0:
+        percentual_crescimento = ((saldo_final - saldo_inicial) / saldo_inicial) * 100
+    
+    # Preparar resposta
+    response_data = {
+        'success': True,
+        'tipo': 'relatorio_periodo',
+        'data': {
+            'periodo': {
+                'inicio': relatorio.periodo_inicio,
+                'fim': relatorio.periodo_fim,
+                'quantidade_dias': quantidade_dias
+            },
+            'resumo_financeiro': {
+                'saldo_inicial_periodo': saldo_inicial,
+                'saldo_final_periodo': saldo_final,
+                'total_creditos_periodo': total_creditos,
+                'total_debitos_periodo': total_debitos,
+                'variacao_liquida': saldo_final - saldo_inicial,
+                'percentual_crescimento': round(percentual_crescimento, 2)
+            }
+        },
+        'metadados': {
+            'gerado_em': datetime.now(timezone.utc).isoformat(),
+            'formato': formato,
+            'incluir_detalhes': incluir_detalhes
+        },
+        'timestamp': datetime.now(timezone.utc).isoformat()
+    }
+    
+    # Incluir detalhes se solicitado
+    if incluir_detalhes:
+        response_data['data']['saldos_diarios'] = [
+            {
+                'data': saldo.data,
+                'saldo_inicial': safe_decimal_to_float(saldo.saldo_inicial),
+                'total_creditos': safe_decimal_to_float(saldo.total_creditos),
+                'total_debitos': safe_decimal_to_float(saldo.total_debitos),
+                'saldo_final': safe_decimal_to_float(saldo.saldo_final),
+                'quantidade_lancamentos': safe_int_conversion(saldo.quantidade_lancamentos)
+            }
+            for saldo in relatorio.saldos_diarios
+        ]
+    
+    if exportacao:
+        response_data['arquivos'] = {
+            'exportacao': {
+                'bucket': exportacao['bucket'],
+                'key': exportacao['key'],
+                'formato': exportacao['formato'],
+                'linhas': exportacao['linhas'],
+                'bytes': exportacao['bytes']
+            }
+        }
+
+    # Salvar no S3 se solicitado (backup JSON do relatório)
+    elif salvar_s3:
+        try:
+            s3_filename = save_relatorio_to_s3(relatorio)
+            response_data['arquivos'] = {
+                's3_backup': {
+                    'bucket': config.S3_BUCKET,
+                    'key': s3_filename
+                }
+            }
+        except Exception as e:
+            config.logger.warning(f"Erro ao salvar no S3: {str(e)}")
+
+    return response_data
+
+
+@xray_recorder.capture('handle_job_status_request')
+def handle_job_status_request(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Handler para GET /consolidado/relatorio/jobs/{job_id}
+    Retorna status e progresso do job e, quando concluído, URLs pré-assinadas
+    """
+    try:
+        job_id = (event.get('pathParameters') or {}).get('job_id', '')
+
+        if not JOB_ID_PATTERN.match(job_id):
+            return create_response(400, {
+                'error': 'Job inválido',
+                'message': 'job_id inválido'
+            })
+
+        job = get_job_relatorio(job_id)
+        if not job:
+            return create_response(404, {
+                'error': 'Job não encontrado',
+                'message': f'Job {job_id} não existe ou expirou'
+            })
+
+        # Job PROCESSANDO além do prazo: a função de relatórios não vai mais concluí-lo
+        job = expirar_job_travado(job)
+
+        return create_response(200, {
+            'success': True,
+            'data': formatar_job(job),
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        })
+
+    except Exception as e:
+        config.logger.error(f"Erro ao consultar job: {str(e)}", exc_info=True)
+        return create_response(500, {
+            'error': 'Erro interno',
+            'message': f'Erro ao consultar job: {str(e)}'
+        })
+
+
+def format_job_criado(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'success': True,
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'status_url': f"/consolidado/relatorio/jobs/{job['job_id']}",
+        'timestamp': job['criado_em']
+    }
+
+
+# Construtores do corpo da resposta por tipo de job
+CONSTRUTORES_JOB = {
+    'relatorio_periodo': montar_relatorio_periodo,
+    'saldo_periodo': montar_saldo_periodo
+}
+
+
+@xray_recorder.capture('executar_job_relatorio')
+def executar_job_relatorio(job_id: str, tentativa: int) -> None:
+    """
+    Processa o job (worker da fila de relatórios). Falhas antes da última
+    tentativa são relançadas para que a mensagem volte à fila.
+    """
+    job = iniciar_job(job_id, tentativa)
+    if not job:
+        config.logger.info(f"Job {job_id} inexistente ou já finalizado, ignorando")
+        return
+
+    try:
+        construtor = CONSTRUTORES_JOB[job['tipo']]
+        corpo = construtor(**job['parametros'], progresso=criar_callback_progresso(job_id))
+        concluir_job(job_id, corpo)
+
+    except BaseException as e:
+        final = tentativa >= config.RELATORIO_JOB_MAX_TENTATIVAS
+        config.logger.error(f"Erro no job {job_id} (tentativa {tentativa}): {str(e)}", exc_info=True)
+        registrar_erro_job(job_id, str(e), final)
+        if not final:
+            raise
+
+
 @xray_recorder.capture('handle_metricas_request')
 def handle_metricas_request(event: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -378,68 +573,26 @@ def handle_metricas_request(event: Dict[str, Any]) -> Dict[str, Any]:
         incluir_tendencias = query_params.get('incluir_tendencias', 'false').lower() == 'true'
         
         # Validar período
-        if periodo not in ['7d', '30d', '90d', '1y']:
+        if periodo not in PERIODOS_METRICAS:
             return create_response(400, {
                 'error': 'Período inválido',
                 'message': 'Período deve ser: 7d, 30d, 90d ou 1y'
             })
         
-        # Calcular datas baseado no período
-        hoje = datetime.now(timezone.utc)
-        if periodo == '7d':
-            data_inicio = (hoje - timedelta(days=7)).strftime('%Y-%m-%d')
-        elif periodo == '30d':
-            data_inicio = (hoje - timedelta(days=30)).strftime('%Y-%m-%d')
-        elif periodo == '90d':
-            data_inicio = (hoje - timedelta(days=90)).strftime('%Y-%m-%d')
-        else:  # 1y
-            data_inicio = (hoje - timedelta(days=365)).strftime('%Y-%m-%d')
-        
-        data_fim = hoje.strftime('%Y-%m-%d')
-        
-        # Buscar lançamentos do período
-        data_inicio_iso = f"{data_inicio}T00:00:00"
-        data_fim_iso = f"{data_fim}T23:59:59"
-        
-        lancamentos = get_lancamentos_by_date_range(data_inicio_iso, data_fim_iso)
-        
-        # Calcular métricas com conversões seguras
-        total_lancamentos = len(lancamentos)
-        total_creditos = 0.0
-        total_debitos = 0.0
-        
-        for lancamento in lancamentos:
-            valor = safe_decimal_to_float(lancamento.get('valor', 0))
-            tipo = lancamento.get('tipo', '')
-            
-            if tipo == 'CREDITO':
-                total_creditos += valor
-            elif tipo == 'DEBITO':
-                total_debitos += valor
+        # Janela móvel materializada (com cache por período)
+        metricas = get_metricas_periodo(periodo)
         
+        data_inicio = metricas['data_inicio']
+        data_fim = metricas['data_fim']
+        dias_periodo = metricas['dias_total']
+        total_lancamentos = metricas['total_lancamentos']
+        total_creditos = metricas['total_creditos']
+        total_debitos = metricas['total_debitos']
         saldo_liquido = total_creditos - total_debitos
         
-        # Calcular dias com dados
-        dias_periodo = (datetime.fromisoformat(data_fim) - datetime.fromisoformat(data_inicio)).days + 1
-        
-        # Agrupar por data para análises
-        lancamentos_por_data = {}
-        for lancamento in lancamentos:
-            data_lanc = lancamento['data'][:10]  # YYYY-MM-DD
-            if data_lanc not in lancamentos_por_data:
-                lancamentos_por_data[data_lanc] = []
-            lancamentos_por_data[data_lanc].append(lancamento)
-        
-        dias_com_movimentacao = len(lancamentos_por_data)
-        
-        # Calcular maior e menor volume diário
-        volumes_diarios = []
-        for data, lancs in lancamentos_por_data.items():
-            volume_dia = sum(safe_decimal_to_float(l.get('valor', 0)) for l in lancs)
-            volumes_diarios.append(volume_dia)
-        
-        maior_volume_dia = max(volumes_diarios) if volumes_diarios else 0.0
-        menor_volume_dia = min(volumes_diarios) if volumes_diarios else 0.0
+        dias_com_movimentacao = metricas['dias_com_movimentacao']
+        maior_volume_dia = metricas['maior_volume_dia']
+        menor_volume_dia = metricas['menor_volume_dia']
         
         response_data = {
             'success': True,
@@ -468,14 +621,16 @@ def handle_metricas_request(event: Dict[str, Any]) -> Dict[str, Any]:
         }
         
         # Incluir análise de tendências se solicitado
-        if incluir_tendencias and len(volumes_diarios) > 1:
+        if incluir_tendencias and dias_com_movimentacao > 1:
             try:
-                # Análise simples de tendência
-                primeira_metade = volumes_diarios[:len(volumes_diarios)//2]
-                segunda_metade = volumes_diarios[len(volumes_diarios)//2:]
+                # Análise simples de tendência: volume médio por dia com movimentação em cada metade da janela
+                primeira_metade = metricas['metades']['primeira']
+                segunda_metade = metricas['metades']['segunda']
                 
-                media_primeira = sum(primeira_metade) / len(primeira_metade) if primeira_metade else 0.0
-                media_segunda = sum(segunda_metade) / len(segunda_metade) if segunda_metade else 0.0
+                dias_primeira = primeira_metade['dias_com_movimentacao']
+                media_primeira = primeira_metade['volume'] / dias_primeira if dias_primeira else 0.0
+                media_segunda = segunda_metade['volume'] / segunda_metade['dias_com_movimentacao'] \
+                    if segunda_metade['dias_com_movimentacao'] else 0.0
                 
                 if media_segunda > media_primeira * 1.1:
                     direcao = "CRESCIMENTO"
@@ -488,8 +643,8 @@ def handle_metricas_request(event: Dict[str, Any]) -> Dict[str, Any]:
                     intensidade = "BAIXA"
                 
                 crescimento_medio = 0.0
-                if len(primeira_metade) > 0:
-                    crescimento_medio = (media_segunda - media_primeira) / len(primeira_metade)
+                if dias_primeira > 0:
+                    crescimento_medio = (media_segunda - media_primeira) / dias_primeira
                 
                 response_data['data']['tendencias'] = {
                     'direcao': direcao,
@@ -532,6 +687,26 @@ def create_response(status_code: int, body: Dict[str, Any], headers: Dict[str, s
     }
 
 
+def format_breakdown(breakdown: Dict[str, Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Converte o breakdown para a resposta (float) com saldo líquido e quantidade total
+    """
+    return {
+        dimensao: {
+            nome: {
+                'total_creditos': safe_decimal_to_float(grupo['total_creditos']),
+                'total_debitos': safe_decimal_to_float(grupo['total_debitos']),
+                'saldo_liquido': safe_decimal_to_float(grupo['total_creditos'] - grupo['total_debitos']),
+                'quantidade_creditos': grupo['quantidade_creditos'],
+                'quantidade_debitos': grupo['quantidade_debitos'],
+                'quantidade_lancamentos': grupo['quantidade_creditos'] + grupo['quantidade_debitos']
+            }
+            for nome, grupo in sorted(grupos.items())
+        }
+        for dimensao, grupos in breakdown.items()
+    }
+
+
 def safe_decimal_to_float(value: Any) -> float:
     """Converte Decimal para float de forma segura"""
     if isinstance(value, Decimal):
@@ -0,0 +1,65 @@
+from configuration import Config
+from typing import Dict, Any
+from botocore.exceptions import ClientError
+from dynamodb import ambiente_shard
+
+config = Config()
+
+
+def backfill_ambiente_shard(dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Preenche (ou corrige, após alterar DYNAMODB_AMBIENTE_SHARDS) o atributo
+    ambiente_shard dos lançamentos gravados antes do índice ambiente_shard-data-index
+    """
+    scan_kwargs = {
+        'ProjectionExpression': 'id, ambiente_shard'
+    }
+
+    lidos = 0
+    atualizados = 0
+    last_evaluated_key = None
+
+    while True:
+        if last_evaluated_key:
+            scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+        response = config.tableLancamentos.scan(**scan_kwargs)
+        items = response.get('Items', [])
+        lidos += len(items)
+
+        for item in items:
+            shard = ambiente_shard(item['id'])
+            if item.get('ambiente_shard') == shard:
+                continue
+
+            if dry_run:
+                atualizados += 1
+                continue
+
+            try:
+                config.tableLancamentos.update_item(
+                    Key={'id': item['id']},
+                    UpdateExpression='SET ambiente_shard = :shard',
+                    ConditionExpression='attribute_exists(id)',
+                    ExpressionAttributeValues={':shard': shard}
+                )
+                atualizados += 1
+            except ClientError as e:
+                # Lançamento removido depois do Scan
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+
+    config.logger.info(f"Backfill ambiente_shard concluído: {lidos} lidos, {atualizados} atualizados")
+    return {'lidos': lidos, 'atualizados': atualizados, 'dry_run': dry_run}
+
+
+def lambda_handler(event, context) -> Dict[str, Any]:
+    return backfill_ambiente_shard(dry_run=bool((event or {}).get('dry_run', False)))
+
+
+if __name__ == '__main__':
+    print(backfill_ambiente_shard())
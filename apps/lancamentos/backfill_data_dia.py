@@ -0,0 +1,63 @@
+from configuration import Config
+from typing import Dict, Any
+from botocore.exceptions import ClientError
+
+config = Config()
+
+
+def backfill_data_dia(dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Preenche o atributo data_dia dos lançamentos gravados antes do índice data_dia-data-index
+    """
+    scan_kwargs = {
+        'ProjectionExpression': 'id, #data, data_dia',
+        'ExpressionAttributeNames': {'#data': 'data'}
+    }
+
+    lidos = 0
+    atualizados = 0
+    last_evaluated_key = None
+
+    while True:
+        if last_evaluated_key:
+            scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+        response = config.tableLancamentos.scan(**scan_kwargs)
+        items = response.get('Items', [])
+        lidos += len(items)
+
+        for item in items:
+            if item.get('data_dia') or not item.get('data'):
+                continue
+
+            if dry_run:
+                atualizados += 1
+                continue
+
+            try:
+                config.tableLancamentos.update_item(
+                    Key={'id': item['id']},
+                    UpdateExpression='SET data_dia = :data_dia',
+                    ConditionExpression='attribute_not_exists(data_dia)',
+                    ExpressionAttributeValues={':data_dia': item['data'][:10]}
+                )
+                atualizados += 1
+            except ClientError as e:
+                # Item já preenchido por uma gravação concorrente
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+
+    config.logger.info(f"Backfill data_dia concluído: {lidos} lidos, {atualizados} atualizados")
+    return {'lidos': lidos, 'atualizados': atualizados, 'dry_run': dry_run}
+
+
+def lambda_handler(event, context) -> Dict[str, Any]:
+    return backfill_data_dia(dry_run=bool((event or {}).get('dry_run', False)))
+
+
+if __name__ == '__main__':
+    print(backfill_data_dia())
@@ -0,0 +1,53 @@
+from configuration import Config
+from typing import Dict, Any
+from dynamodb import build_tag_entries
+
+config = Config()
+
+
+def backfill_tags(dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Grava no índice invertido de tags as entradas dos lançamentos criados antes
+    da tabela lancamentos-tags (a gravação é idempotente)
+    """
+    scan_kwargs = {
+        'ProjectionExpression': 'id, #data, tags',
+        'ExpressionAttributeNames': {'#data': 'data'}
+    }
+
+    lidos = 0
+    gravadas = 0
+    last_evaluated_key = None
+
+    with config.tableLancamentosTags.batch_writer() as batch:
+        while True:
+            if last_evaluated_key:
+                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+            response = config.tableLancamentos.scan(**scan_kwargs)
+            items = response.get('Items', [])
+            lidos += len(items)
+
+            for item in items:
+                if not item.get('data'):
+                    continue
+
+                for entrada in build_tag_entries(item):
+                    if not dry_run:
+                        batch.put_item(Item=entrada)
+                    gravadas += 1
+
+            last_evaluated_key = response.get('LastEvaluatedKey')
+            if not last_evaluated_key:
+                break
+
+    config.logger.info(f"Backfill de tags concluído: {lidos} lidos, {gravadas} entradas gravadas")
+    return {'lidos': lidos, 'gravadas': gravadas, 'dry_run': dry_run}
+
+
+def lambda_handler(event, context) -> Dict[str, Any]:
+    return backfill_tags(dry_run=bool((event or {}).get('dry_run', False)))
+
+
+if __name__ == '__main__':
+    print(backfill_tags())
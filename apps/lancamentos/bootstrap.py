@@ -0,0 +1,88 @@
+import json
+import time
+import importlib
+import logging
+from os import environ
+from contextlib import contextmanager
+from typing import Dict, Any
+
+# Início do carregamento do handler (o bootstrap é o primeiro módulo importado)
+_inicio = time.perf_counter()
+
+_tempos_import: Dict[str, float] = {}
+_relatorio_registrado = False
+_tracing_configurado = False
+
+# Orçamento de tempo de import do handler (0 desativa o alerta)
+IMPORT_BUDGET_MS = float(environ.get('IMPORT_BUDGET_MS', 0))
+
+# Bibliotecas instrumentadas pelo X-Ray (apenas as usadas pela Lambda)
+XRAY_PATCH_MODULES = tuple(
+    modulo.strip() for modulo in environ.get('XRAY_PATCH_MODULES', 'botocore').split(',') if modulo.strip()
+)
+
+
+@contextmanager
+def medir_import(modulo: str):
+    """
+    Registra o tempo de import do bloco com o nome do módulo
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _tempos_import[modulo] = round((time.perf_counter() - inicio) * 1000, 2)
+
+
+def importar(*modulos: str) -> None:
+    """
+    Importa os módulos na ordem informada, medindo cada um. Importar das
+    dependências para os dependentes faz cada tempo refletir só o próprio módulo.
+    """
+    for modulo in modulos:
+        with medir_import(modulo):
+            importlib.import_module(modulo)
+
+
+def configurar_tracing() -> None:
+    """
+    Aplica o patch do X-Ray uma única vez por processo, apenas nas bibliotecas usadas
+    """
+    global _tracing_configurado
+
+    if _tracing_configurado:
+        return
+
+    with medir_import('aws_xray_sdk'):
+        from aws_xray_sdk.core import patch
+        patch(XRAY_PATCH_MODULES)
+
+    _tracing_configurado = True
+
+
+def relatorio_import() -> Dict[str, Any]:
+    """
+    Tempos de import por módulo (ms) e total desde o início do bootstrap
+    """
+    return {
+        'modulos': dict(sorted(_tempos_import.items(), key=lambda item: item[1], reverse=True)),
+        'total_ms': round((time.perf_counter() - _inicio) * 1000, 2),
+        'budget_ms': IMPORT_BUDGET_MS or None
+    }
+
+
+def registrar_relatorio_import(logger: logging.Logger) -> None:
+    """
+    Registra o relatório de import na primeira invocação (cold start)
+    """
+    global _relatorio_registrado
+
+    if _relatorio_registrado:
+        return
+
+    _relatorio_registrado = True
+    relatorio = relatorio_import()
+    logger.info(f"IMPORT_REPORT {json.dumps(relatorio)}")
+
+    if IMPORT_BUDGET_MS and relatorio['total_ms'] > IMPORT_BUDGET_MS:
+        logger.warning(f"Tempo de import {relatorio['total_ms']} ms acima do orçamento de {IMPORT_BUDGET_MS} ms")
@@ -1,32 +1,94 @@
 import boto3
+import threading
+import time
+from functools import cached_property
 from os import environ
 import logging
 
+# A sessão padrão do boto3 não é thread-safe na criação de clients
+_clients_lock = threading.Lock()
+
+
 class Config():
+    """
+    Configuração compartilhada pelo processo: todos os módulos recebem a mesma
+    instância e os clients AWS são criados apenas no primeiro uso, sendo
+    reaproveitados entre invocações da mesma instância (warm start)
+    """
 
-    def __init__(self):
-        self.s3Client = boto3.client('s3')
-        self.s3Resource = boto3.resource('s3')
-        self.dynamodbResource = boto3.resource('dynamodb')
-        self.sqsClient = boto3.client('sqs')
-        self.events = boto3.client('events')
-        self.secrets_manager = boto3.client('secretsmanager')
+    _instance = None
 
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super().__new__(cls)
+            instance._inicializar()
+            cls._instance = instance
+        return cls._instance
 
+    def _inicializar(self):
         self.environment = environ.get('ENVIRONMENT')
         self.region = environ.get('REGION')
         self.account_id = environ.get('ACCOUNT_ID')
         self.DYNAMODB_TABLE_LANCAMENTOS = environ.get('DYNAMODB_TABLE_LANCAMENTOS')
+        self.DYNAMODB_TABLE_LANCAMENTOS_TAGS = environ.get('DYNAMODB_TABLE_LANCAMENTOS_TAGS')
+        self.DYNAMODB_INDEX_DATA_DIA = environ.get('DYNAMODB_INDEX_DATA_DIA', 'data_dia-data-index')
+        self.DYNAMODB_INDEX_DATA_DIA_VALOR = environ.get('DYNAMODB_INDEX_DATA_DIA_VALOR', 'data_dia-valor-filtros-index')
+        self.DYNAMODB_INDEX_AMBIENTE_SHARD_DATA = environ.get('DYNAMODB_INDEX_AMBIENTE_SHARD_DATA', 'ambiente_shard-data-index')
+        self.DYNAMODB_INDEX_AMBIENTE_SHARD_VALOR = environ.get('DYNAMODB_INDEX_AMBIENTE_SHARD_VALOR', 'ambiente_shard-valor-index')
+        # Partições (ambiente_shard = <ambiente>#<n>) dos índices com período aberto;
+        # alterar exige regravar o atributo com o backfill_ambiente_shard
+        self.DYNAMODB_AMBIENTE_SHARDS = int(environ.get('DYNAMODB_AMBIENTE_SHARDS', 8))
+        self.DYNAMODB_TABLE_CONSOLIDADO = environ.get('DYNAMODB_TABLE_CONSOLIDADO')
+        self.DYNAMODB_INDEX_MES = environ.get('DYNAMODB_INDEX_MES', 'mes-data-index')
         self.SQS_QUEUE_URL = environ.get('SQS_QUEUE_URL')
         self.ENVIRONMENT = environ.get('ENVIRONMENT')
         self.SECRET_NAME = environ.get('SECRET_NAME')
 
-        self.tableLancamentos = self.dynamodbResource.Table(self.DYNAMODB_TABLE_LANCAMENTOS)
-
         self.function_name = f"Lancamentos - {self.environment.upper()}"
 
 
         self.logger = logging.getLogger()
         self.logger.setLevel(logging.INFO)
 
+    def _criar(self, fabrica, servico: str):
+        with _clients_lock:
+            inicio = time.perf_counter()
+            recurso = fabrica(servico)
+            self.logger.info(f"{fabrica.__name__} {servico} criado em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+            return recurso
+
+    @cached_property
+    def s3Client(self):
+        return self._criar(boto3.client, 's3')
+
+    @cached_property
+    def s3Resource(self):
+        return self._criar(boto3.resource, 's3')
+
+    @cached_property
+    def dynamodbResource(self):
+        return self._criar(boto3.resource, 'dynamodb')
+
+    @cached_property
+    def sqsClient(self):
+        return self._criar(boto3.client, 'sqs')
+
+    @cached_property
+    def events(self):
+        return self._criar(boto3.client, 'events')
+
+    @cached_property
+    def secrets_manager(self):
+        return self._criar(boto3.client, 'secretsmanager')
+
+    @cached_property
+    def tableLancamentos(self):
+        return self.dynamodbResource.Table(self.DYNAMODB_TABLE_LANCAMENTOS)
+
+    @cached_property
+    def tableLancamentosTags(self):
+        return self.dynamodbResource.Table(self.DYNAMODB_TABLE_LANCAMENTOS_TAGS)
 
+    @cached_property
+    def tableConsolidado(self):
+        return self.dynamodbResource.Table(self.DYNAMODB_TABLE_CONSOLIDADO)
@@ -1,40 +1,117 @@
 from configuration import Config
 import uuid
+import zlib
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, List
 from aws_xray_sdk.core import xray_recorder
-from aws_xray_sdk.core import patch_all
-
-patch_all()
 
 config = Config()
 
-@xray_recorder.capture('save_lancamento_to_dynamodb')
-def save_lancamento_to_dynamodb(lancamento_data: Dict[str, Any]) -> str:
+def build_lancamento_item(lancamento_data: Dict[str, Any]) -> Dict[str, Any]:
     # Gerar ID único
     lancamento_id = str(uuid.uuid4())
 
     # Preparar item para DynamoDB
-    item = {
+    return {
         'id': lancamento_id,
         'tipo': lancamento_data['tipo'],
         'valor': lancamento_data['valor'],
         'descricao': lancamento_data['descricao'],
         'data': lancamento_data['data'],
+        # Partição por dia (YYYY-MM-DD) usada pelo índice data_dia-data-index
+        'data_dia': lancamento_data['data'][:10],
         'categoria': lancamento_data['categoria'],
         'tags': lancamento_data['tags'],
         'data_criacao': datetime.now(timezone.utc).isoformat(),
         'data_atualizacao': datetime.now(timezone.utc).isoformat(),
         'status': 'ATIVO',
-        'ambiente': config.environment
+        'ambiente': config.environment,
+        'ambiente_shard': ambiente_shard(lancamento_id)
     }
 
+
+def ambiente_shard(lancamento_id: str) -> str:
+    """
+    Partição dos índices ordenados com período aberto (<ambiente>#<n>): o n
+    derivado do id distribui as gravações entre DYNAMODB_AMBIENTE_SHARDS partições
+    """
+    return f"{config.environment}#{zlib.crc32(lancamento_id.encode()) % config.DYNAMODB_AMBIENTE_SHARDS}"
+
+
+def particoes_ambiente() -> List[str]:
+    """
+    Todas as partições ambiente_shard do ambiente
+    """
+    return [f"{config.environment}#{shard}" for shard in range(config.DYNAMODB_AMBIENTE_SHARDS)]
+
+
+def build_tag_entries(item: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Entradas do índice invertido tag -> lançamento, ordenadas por data dentro
+    de cada tag (data_id = <data>#<id>)
+    """
+    # Mesma normalização das consultas por tag
+    tags = {tag.strip() for tag in item.get('tags') or [] if isinstance(tag, str) and tag.strip()}
+    return [
+        {'tag': tag, 'data_id': f"{item['data']}#{item['id']}", 'id': item['id']}
+        for tag in sorted(tags)
+    ]
+
+
+def save_tag_entries(items: List[Dict[str, Any]]) -> None:
+    """
+    Grava as entradas do índice de tags. Melhor esforço: o lançamento já está
+    salvo e ainda precisa ser publicado para consolidação; entradas faltantes
+    são recriadas pelo backfill_tags.
+    """
+    entradas = [entrada for item in items for entrada in build_tag_entries(item)]
+    if not entradas:
+        return
+
+    try:
+        with config.tableLancamentosTags.batch_writer() as batch:
+            for entrada in entradas:
+                batch.put_item(Item=entrada)
+
+    except BaseException as e:
+        ids = sorted({entrada['id'] for entrada in entradas})
+        config.logger.error(f"Erro ao salvar índice de tags dos lançamentos {ids}: {str(e)}")
+
+
+@xray_recorder.capture('save_lancamento_to_dynamodb')
+def save_lancamento_to_dynamodb(lancamento_data: Dict[str, Any]) -> str:
+    item = build_lancamento_item(lancamento_data)
+    lancamento_id = item['id']
+
     try:
         # Salvar no DynamoDB
         config.tableLancamentos.put_item(Item=item)
+        save_tag_entries([item])
         config.logger.info(f"Lançamento salvo com sucesso: {lancamento_id}")
         return lancamento_id
 
     except BaseException as e:
         config.logger.error(f"Erro ao salvar no DynamoDB: {str(e)}")
-        raise "Erro ao salvar lançamento"
\ No newline at end of file
+        raise
+
+
+@xray_recorder.capture('save_lancamentos_batch_to_dynamodb')
+def save_lancamentos_batch_to_dynamodb(lancamentos_data: List[Dict[str, Any]]) -> List[str]:
+    """
+    Salva vários lançamentos com batch_writer (BatchWriteItem de 25 itens,
+    com reenvio automático dos itens não processados)
+    """
+    items = [build_lancamento_item(lancamento_data) for lancamento_data in lancamentos_data]
+
+    try:
+        with config.tableLancamentos.batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=item)
+        save_tag_entries(items)
+
+        config.logger.info(f"Lote de lançamentos salvo com sucesso: {len(items)} itens")
+        return [item['id'] for item in items]
+
+    except BaseException as e:
+        config.logger.error(f"Erro ao salvar lote no DynamoDB: {str(e)}")
+        raise
@@ -1,44 +1,62 @@
 import json
 from configuration import Config
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 from aws_xray_sdk.core import xray_recorder
-from aws_xray_sdk.core import patch_all
-
-patch_all()
 
 config = Config()
 
+def build_event_entry(lancamento_id: str, lancamento_data: Dict[str, Any]) -> Dict[str, Any]:
+    # Preparar evento
+    event_detail = {
+        'lancamentoId': lancamento_id,
+        'tipo': lancamento_data['tipo'],
+        'valor': float(lancamento_data['valor']),
+        'data': lancamento_data['data'],
+        'categoria': lancamento_data['categoria'],
+        'ambiente': config.environment
+    }
+
+    return {
+        'Source': f'controle-fluxo-caixa.lancamentos',
+        'DetailType': 'Lançamento Criado',
+        'Detail': json.dumps(event_detail, default=str),
+        'Resources': [
+            f'arn:aws:dynamodb:{config.region}:{config.account_id}:table/{config.DYNAMODB_TABLE_LANCAMENTOS}']
+    }
+
+
 @xray_recorder.capture('send_to_eventbridge')
 def send_to_eventbridge(lancamento_id: str, lancamento_data: Dict[str, Any]) -> None:
     """
     Envia evento para o EventBridge
     """
     try:
-        # Preparar evento
-        event_detail = {
-            'lancamentoId': lancamento_id,
-            'tipo': lancamento_data['tipo'],
-            'valor': float(lancamento_data['valor']),
-            'data': lancamento_data['data'],
-            'categoria': lancamento_data['categoria'],
-            'ambiente': config.environment
-        }
-
         # Enviar para EventBridge
         response = config.events.put_events(
-            Entries=[
-                {
-                    'Source': f'controle-fluxo-caixa.lancamentos',
-                    'DetailType': 'Lançamento Criado',
-                    'Detail': json.dumps(event_detail, default=str),
-                    'Resources': [
-                        f'arn:aws:dynamodb:{config.region}:{config.account_id}:table/{config.DYNAMODB_TABLE_LANCAMENTOS}']
-                }
-            ]
+            Entries=[build_event_entry(lancamento_id, lancamento_data)]
         )
 
         config.logger.info(f"Evento enviado para EventBridge: {response['Entries'][0]['EventId']}")
 
     except BaseException as e:
         config.logger.error(f"Erro ao enviar para EventBridge: {str(e)}")
-        # Não falhar a requisição por erro no EventBridge
\ No newline at end of file
+        # Não falhar a requisição por erro no EventBridge
+
+
+@xray_recorder.capture('send_batch_to_eventbridge')
+def send_batch_to_eventbridge(lancamentos: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """
+    Envia eventos de (lancamento_id, dados) com put_events (10 entradas por chamada)
+    """
+    for i in range(0, len(lancamentos), 10):
+        bloco = lancamentos[i:i + 10]
+        try:
+            response = config.events.put_events(
+                Entries=[build_event_entry(lancamento_id, lancamento_data) for lancamento_id, lancamento_data in bloco]
+            )
+            if response.get('FailedEntryCount'):
+                config.logger.error(f"Erro ao enviar para EventBridge: {response['FailedEntryCount']} entradas falharam")
+
+        except BaseException as e:
+            config.logger.error(f"Erro ao enviar lote para EventBridge: {str(e)}")
+            # Não falhar a requisição por erro no EventBridge
@@ -1,14 +1,21 @@
+import bootstrap
+
+bootstrap.configurar_tracing()
+bootstrap.importar('configuration', 'utils', 'dynamodb', 'sqs', 'event_bridge', 'operacoes')
+
 import json
 import configuration
 from utils import create_response
 from typing import Dict, Any
 from aws_xray_sdk.core import xray_recorder
-from operacoes import cria_lancamento, get_lancamentos_list, get_lancamento_individual
+from operacoes import cria_lancamento, cria_lancamentos_lote, get_lancamentos_list, get_lancamento_individual
 
 config = configuration.Config()
 
 @xray_recorder.capture('lambda_handler')
 def lambda_handler(event, context) -> Dict[str, Any]:
+    bootstrap.registrar_relatorio_import(config.logger)
+
     try:
         # Log da requisição
         config.logger.info(f"Evento recebido: {json.dumps(event, default=str)}")
@@ -25,6 +32,9 @@ def lambda_handler(event, context) -> Dict[str, Any]:
         if http_method == 'POST' and resource_path == '/lancamentos':
             return cria_lancamento(event)
 
+        elif http_method == 'POST' and resource_path == '/lancamentos/lote':
+            return cria_lancamentos_lote(event)
+
         elif http_method == 'GET' and resource_path == '/lancamentos':
             return get_lancamentos_list(event)
 
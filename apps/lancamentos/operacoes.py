@@ -1,16 +1,76 @@
 import json
-from typing import Dict, Any, Optional
-from utils import create_response, validate_lancamento
-from dynamodb import save_lancamento_to_dynamodb
-from sqs import send_to_consolidacao_queue
-from event_bridge import send_to_eventbridge
-from datetime import datetime, timezone
+import base64
+import hashlib
+import heapq
+import time
+from functools import partial
+from itertools import islice
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+from utils import create_response, validate_lancamento, CursorInvalidoError
+from dynamodb import save_lancamento_to_dynamodb, save_lancamentos_batch_to_dynamodb, particoes_ambiente
+from sqs import send_to_consolidacao_queue, send_batch_to_consolidacao_queue
+from event_bridge import send_to_eventbridge, send_batch_to_eventbridge
+from datetime import datetime, timezone, timedelta
 from configuration import Config
 from aws_xray_sdk.core import xray_recorder
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 
 config = Config()
 
+# Pool reutilizado entre invocações da mesma instância (warm start)
+_publish_executor = ThreadPoolExecutor(max_workers=2)
+
+# Quantidade máxima de lançamentos por requisição de lote
+LOTE_MAX_ITENS = 500
+
+# Tentativas de envio do lote para a fila de consolidação (reenvia só as mensagens que falharam)
+TENTATIVAS_PUBLICACAO_LOTE = 3
+
+# A partir deste offset a paginação legada é registrada como profunda
+OFFSET_PROFUNDO = 1000
+
+# Índice cuja sort key atende cada ordenação com período aberto, lido nas
+# partições <ambiente>#<n> (período fechado usa data_dia-data-index ou
+# data_dia-valor-filtros-index, uma partição por dia)
+INDICES_ORDENACAO = {
+    'data_desc': config.DYNAMODB_INDEX_AMBIENTE_SHARD_DATA,
+    'data_asc': config.DYNAMODB_INDEX_AMBIENTE_SHARD_DATA,
+    'valor_desc': config.DYNAMODB_INDEX_AMBIENTE_SHARD_VALOR,
+    'valor_asc': config.DYNAMODB_INDEX_AMBIENTE_SHARD_VALOR
+}
+
+# Período fechado por valor: acima deste número de dias (uma Query por dia a
+# cada página) a leitura usa as partições do ambiente, com o período no filtro
+MAX_DIAS_VALOR_POR_DIA = 31
+
+# Contadores por tipo/categoria e tipo/tag das linhas do consolidado
+# (valor#<tipo>#<categoria>, qtd#<tipo>#<categoria>, tag_valor#<tipo>#<tag>, tag_qtd#<tipo>#<tag>)
+PREFIXO_CONTADOR_VALOR = 'valor#'
+PREFIXO_CONTADOR_QUANTIDADE = 'qtd#'
+PREFIXO_CONTADOR_TAG_VALOR = 'tag_valor#'
+PREFIXO_CONTADOR_TAG_QUANTIDADE = 'tag_qtd#'
+
+# Atributos de chave de cada índice, usados para montar o ExclusiveStartKey do cursor
+ATRIBUTOS_INDICE = {
+    config.DYNAMODB_INDEX_DATA_DIA: ('data_dia', 'data')
+}
+
+# Índices que projetam só as chaves e os atributos dos filtros: a página é
+# buscada na tabela com BatchGetItem
+INDICES_PROJECAO_PARCIAL = {
+    config.DYNAMODB_INDEX_DATA_DIA_VALOR,
+    config.DYNAMODB_INDEX_AMBIENTE_SHARD_DATA,
+    config.DYNAMODB_INDEX_AMBIENTE_SHARD_VALOR
+}
+
+# Combinação de várias tags no filtro: qualquer uma (OR) ou todas (AND)
+MODOS_TAGS = ('qualquer', 'todas')
+
+# Chaves por chamada BatchGetItem
+BATCH_GET_MAX_CHAVES = 100
+
 def cria_lancamento(event: Dict[str, Any]) -> Dict[str, Any]:
     try:
         # Extrair body da requisição
@@ -33,14 +93,11 @@ def cria_lancamento(event: Dict[str, Any]) -> Dict[str, Any]:
                 'message': str(e)
             })
 
-        # Salvar no DynamoDB
+        # Salvar no DynamoDB (gravação durável antes de qualquer publicação)
         lancamento_id = save_lancamento_to_dynamodb(validated_data)
 
-        # Enviar para fila de consolidação (assíncrono)
-        send_to_consolidacao_queue(lancamento_id, validated_data)
-
-        # Enviar evento para EventBridge (assíncrono)
-        send_to_eventbridge(lancamento_id, validated_data)
+        # Enviar para fila de consolidação e para o EventBridge em paralelo
+        publish_lancamento(lancamento_id, validated_data)
 
         # Resposta de sucesso
         response_body = {
@@ -69,6 +126,155 @@ def cria_lancamento(event: Dict[str, Any]) -> Dict[str, Any]:
         })
 
 
+def submit_traced(funcao, *args):
+    """
+    Submete funcao(*args) ao pool de publicação propagando o segmento X-Ray
+    """
+    trace_entity = xray_recorder.get_trace_entity()
+
+    def executar():
+        xray_recorder.set_trace_entity(trace_entity)
+        try:
+            return funcao(*args)
+        finally:
+            xray_recorder.clear_trace_entities()
+
+    return _publish_executor.submit(executar)
+
+
+def publish_lancamento(lancamento_id: str, lancamento_data: Dict[str, Any]) -> None:
+    """
+    Publica o lançamento no SQS e no EventBridge concorrentemente, aguardando
+    ambos (a Lambda é congelada após o retorno do handler)
+    """
+    futures = [
+        submit_traced(send_to_consolidacao_queue, lancamento_id, lancamento_data),
+        submit_traced(send_to_eventbridge, lancamento_id, lancamento_data)
+    ]
+    for future in futures:
+        future.result()
+
+
+def publish_lote_consolidacao(publicados: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """
+    Envia o lote para a fila de consolidação reenviando as mensagens que
+    falharam, com backoff. Retorna os IDs que continuaram sem envio
+    """
+    pendentes = publicados
+    for tentativa in range(TENTATIVAS_PUBLICACAO_LOTE):
+        if tentativa:
+            time.sleep(0.1 * 2 ** tentativa)
+        falhas = set(send_batch_to_consolidacao_queue(pendentes))
+        pendentes = [(lancamento_id, dados) for lancamento_id, dados in pendentes if lancamento_id in falhas]
+        if not pendentes:
+            break
+    return [lancamento_id for lancamento_id, _ in pendentes]
+
+
+def cria_lancamentos_lote(event: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        # Extrair body da requisição
+        body = event.get('body', '{}')
+        if isinstance(body, str):
+            try:
+                body = json.loads(body)
+            except json.JSONDecodeError:
+                return create_response(400, {
+                    'error': 'JSON inválido',
+                    'message': 'Body da requisição deve ser um JSON válido'
+                })
+
+        lancamentos = body.get('lancamentos') if isinstance(body, dict) else body
+        if not isinstance(lancamentos, list) or not lancamentos:
+            return create_response(400, {
+                'error': 'Dados inválidos',
+                'message': "Body deve conter a lista 'lancamentos' com ao menos um item"
+            })
+
+        if len(lancamentos) > LOTE_MAX_ITENS:
+            return create_response(400, {
+                'error': 'Lote muito grande',
+                'message': f'O lote deve ter no máximo {LOTE_MAX_ITENS} lançamentos'
+            })
+
+        # Validar cada item, registrando os erros por posição
+        resultados = []
+        validos = []
+        for indice, lancamento in enumerate(lancamentos):
+            try:
+                if not isinstance(lancamento, dict):
+                    raise ValueError('Lançamento deve ser um objeto JSON')
+                validos.append((indice, validate_lancamento(lancamento)))
+            except Exception as e:
+                resultados.append({'indice': indice, 'success': False, 'error': str(e)})
+
+        if not validos:
+            return create_response(400, {
+                'error': 'Dados inválidos',
+                'message': 'Nenhum lançamento válido no lote',
+                'data': {'itens': resultados}
+            })
+
+        # Salvar no DynamoDB (gravação durável antes de qualquer publicação)
+        lancamento_ids = save_lancamentos_batch_to_dynamodb([dados for _, dados in validos])
+        publicados = [(lancamento_id, dados) for lancamento_id, (_, dados) in zip(lancamento_ids, validos)]
+
+        # Enviar para fila de consolidação e para o EventBridge em paralelo
+        futures = [
+            submit_traced(publish_lote_consolidacao, publicados),
+            submit_traced(send_batch_to_eventbridge, publicados)
+        ]
+        falhas_consolidacao = set(futures[0].result())
+        futures[1].result()
+
+        if falhas_consolidacao:
+            config.logger.error(
+                f"Lançamentos gravados sem envio para consolidação: {sorted(falhas_consolidacao)}"
+            )
+
+        # Itens gravados mas não enviados à fila são reportados como falha (com o id, para reprocessamento)
+        for lancamento_id, (indice, _) in zip(lancamento_ids, validos):
+            if lancamento_id in falhas_consolidacao:
+                resultados.append({
+                    'indice': indice,
+                    'success': False,
+                    'id': lancamento_id,
+                    'error': 'Lançamento gravado, mas não enviado para consolidação'
+                })
+            else:
+                resultados.append({'indice': indice, 'success': True, 'id': lancamento_id})
+        resultados.sort(key=lambda resultado: resultado['indice'])
+
+        rejeitados = len(lancamentos) - len(validos)
+        sem_consolidacao = len(falhas_consolidacao)
+        completo = rejeitados == 0 and sem_consolidacao == 0
+        response_body = {
+            'success': completo,
+            'message': 'Lote processado com sucesso' if completo else 'Lote processado parcialmente',
+            'data': {
+                'total': len(lancamentos),
+                'criados': len(validos) - sem_consolidacao,
+                'rejeitados': rejeitados,
+                'nao_consolidados': sem_consolidacao,
+                'itens': resultados
+            },
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        }
+
+        config.logger.info(
+            f"Lote processado: {len(validos) - sem_consolidacao} criados, {rejeitados} rejeitados, "
+            f"{sem_consolidacao} não enviados para consolidação"
+        )
+        return create_response(201 if completo else 207, response_body)
+
+    except BaseException as e:
+        config.logger.error(f"Erro inesperado: {e}", exc_info=True)
+        return create_response(500, {
+            'error': 'Erro interno do servidor',
+            'message': 'Ocorreu um erro inesperado'
+        })
+
+
 def get_lancamentos_list(event: Dict[str, Any]) -> Dict[str, Any]:
     try:
         # Extrair parâmetros de query
@@ -126,15 +332,30 @@ def get_lancamentos_list(event: Dict[str, Any]) -> Dict[str, Any]:
                 'message': 'offset deve ser um número maior ou igual a 0'
             })
 
+        # Validar combinação de tags
+        if query_params.get('tags_modo', 'qualquer') not in MODOS_TAGS:
+            return create_response(400, {
+                'error': 'tags_modo inválido',
+                'message': f"tags_modo deve ser um dos valores: {', '.join(MODOS_TAGS)}"
+            })
+
         # Listar lançamentos
         result = list_lancamentos_with_filters(query_params)
 
+        # Offset informado: sinaliza a depreciação em favor do cursor
+        headers = {'Deprecation': 'true'} if 'offset' in result['pagination'] else None
+
         return create_response(200, {
             'success': True,
             'data': result,
             'timestamp': datetime.now(timezone.utc).isoformat()
-        })
+        }, headers)
 
+    except CursorInvalidoError as e:
+        return create_response(400, {
+            'error': 'Cursor inválido',
+            'message': str(e)
+        })
 
     except BaseException as e:
         config.logger.error(f"Erro ao listar lançamentos: {e}")
@@ -186,6 +407,21 @@ def get_lancamento_individual(event: Dict[str, Any]) -> Dict[str, Any]:
         })
 
 
+def listar_dias(data_inicio: str, data_fim: str) -> List[str]:
+    """
+    Lista os dias (YYYY-MM-DD) entre duas datas, inclusive
+    """
+    dia_atual = datetime.fromisoformat(data_inicio[:10])
+    dia_fim = datetime.fromisoformat(data_fim[:10])
+
+    dias = []
+    while dia_atual <= dia_fim:
+        dias.append(dia_atual.strftime('%Y-%m-%d'))
+        dia_atual += timedelta(days=1)
+
+    return dias
+
+
 @xray_recorder.capture('list_lancamentos_with_filters')
 def list_lancamentos_with_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
     try:
@@ -198,8 +434,11 @@ def list_lancamentos_with_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
         data_fim = filters.get('data_fim')
         tipo = filters.get('tipo')
         categoria = filters.get('categoria')
-        tags = filters.get('tags', '').split(',') if filters.get('tags') else []
+        tags = [tag.strip() for tag in filters.get('tags', '').split(',') if tag.strip()] if filters.get('tags') else []
+        todas_tags = filters.get('tags_modo') == 'todas'
         sort_order = filters.get('sort', 'data_desc')
+        if sort_order not in INDICES_ORDENACAO:
+            sort_order = 'data_desc'
 
         # Construir filtros para DynamoDB
         filter_expression_parts = []
@@ -207,19 +446,51 @@ def list_lancamentos_with_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
         expression_names = {}
 
         # Filtro por data
+        date_condition = None
         if data_inicio or data_fim:
             if data_inicio and data_fim:
-                filter_expression_parts.append('#data BETWEEN :data_inicio AND :data_fim')
+                date_condition = '#data BETWEEN :data_inicio AND :data_fim'
                 expression_values[':data_inicio'] = f"{data_inicio}T00:00:00"
                 expression_values[':data_fim'] = f"{data_fim}T23:59:59"
             elif data_inicio:
-                filter_expression_parts.append('#data >= :data_inicio')
+                date_condition = '#data >= :data_inicio'
                 expression_values[':data_inicio'] = f"{data_inicio}T00:00:00"
             elif data_fim:
-                filter_expression_parts.append('#data <= :data_fim')
+                date_condition = '#data <= :data_fim'
                 expression_values[':data_fim'] = f"{data_fim}T23:59:59"
             expression_names['#data'] = 'data'
 
+        # Leitura ordenada pelo sort key do índice, na direção pedida
+        crescente = sort_order.endswith('_asc')
+        atributo_ordem = 'data' if sort_order.startswith('data') else 'valor'
+        limites = (None, None)
+        if sort_order.startswith('data') and data_inicio and data_fim:
+            # Período fechado: Query por dia no índice data_dia-data-index
+            index_name = config.DYNAMODB_INDEX_DATA_DIA
+            particoes = listar_dias(data_inicio, data_fim)
+            if not crescente:
+                particoes.reverse()
+            key_condition = f'data_dia = :particao AND {date_condition}'
+        elif data_inicio and data_fim and len(listar_dias(data_inicio, data_fim)) <= MAX_DIAS_VALOR_POR_DIA:
+            # Período fechado por valor: Query por dia no índice data_dia-valor-filtros-index,
+            # intercaladas por valor (a partição do dia já delimita o período)
+            index_name = config.DYNAMODB_INDEX_DATA_DIA_VALOR
+            particoes = listar_dias(data_inicio, data_fim)
+            key_condition = 'data_dia = :particao'
+            del expression_values[':data_inicio'], expression_values[':data_fim'], expression_names['#data']
+        else:
+            # Período aberto (ou fechado longo, por valor): Query por partição
+            # <ambiente>#<n> no índice da ordenação, intercaladas; por data o
+            # período limita a sort key, por valor entra no filtro
+            index_name = INDICES_ORDENACAO[sort_order]
+            particoes = particoes_ambiente()
+            key_condition = 'ambiente_shard = :particao'
+            if sort_order.startswith('data'):
+                limites = (expression_values.pop(':data_inicio', None), expression_values.pop(':data_fim', None))
+                expression_names.pop('#data', None)
+            elif date_condition:
+                filter_expression_parts.append(date_condition)
+
         # Filtro por tipo
         if tipo and tipo in ['CREDITO', 'DEBITO']:
             filter_expression_parts.append('tipo = :tipo')
@@ -235,88 +506,75 @@ def list_lancamentos_with_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
         expression_values[':status'] = 'ATIVO'
         expression_names['#status'] = 'status'
 
-        # Construir parâmetros da query
-        scan_kwargs = {
+        # Construir parâmetros da leitura
+        read_kwargs = {
+            'IndexName': index_name,
+            'KeyConditionExpression': key_condition,
             'FilterExpression': ' AND '.join(filter_expression_parts),
             'ExpressionAttributeValues': expression_values,
-            'ExpressionAttributeNames': expression_names
+            'ExpressionAttributeNames': expression_names,
+            'ScanIndexForward': crescente
         }
 
-        # Executar scan com paginação
-        all_items = []
-        last_evaluated_key = None
-        items_scanned = 0
+        # Resumo do período fechado servido pelos contadores do consolidado
+        # (por categoria ou por uma única tag; combinações não são pré-agregadas)
+        resumo = None
+        if data_inicio and data_fim and (not tags or (len(tags) == 1 and not categoria)):
+            resumo = get_resumo_consolidado(
+                data_inicio, data_fim,
+                tipo if tipo in ['CREDITO', 'DEBITO'] else None,
+                categoria,
+                tags[0] if tags else None
+            )
 
-        while True:
-            if last_evaluated_key:
-                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+        # Leituras que intercalam várias sequências ordenadas: tags com ordenação por
+        # data (índice invertido tag -> lançamento, custo proporcional aos lançamentos
+        # das tags), período fechado por valor (uma sequência por dia) e os
+        # demais índices (uma sequência por partição do ambiente)
+        leitura_intercalada = None
+        if tags and sort_order.startswith('data'):
+            criterios = {'status': 'ATIVO'}
+            if tipo in ['CREDITO', 'DEBITO']:
+                criterios['tipo'] = tipo
+            if categoria:
+                criterios['categoria'] = categoria
 
-            #TODO: Criar indice/GSI para evitar Scan
-            response = config.tableLancamentos.scan(**scan_kwargs)
-            items = response.get('Items', [])
+            leitura_intercalada = partial(ler_pagina_tags, tags, todas_tags, data_inicio, data_fim, crescente, criterios)
+        elif index_name != config.DYNAMODB_INDEX_DATA_DIA:
+            leitura_intercalada = partial(ler_pagina_ordenada, read_kwargs, particoes, atributo_ordem, limites,
+                                          tags, todas_tags, crescente)
 
-            # Filtrar por tags se especificado
-            if tags and tags[0]:  # Verificar se não é lista vazia
-                items = [
-                    item for item in items
-                    if any(tag.strip() in item.get('tags', []) for tag in tags if tag.strip())
-                ]
+        # Paginação por offset (depreciada): mantida apenas quando offset é informado
+        if filters.get('offset') is not None and not filters.get('cursor'):
+            if leitura_intercalada:
+                # Um item além da página para indicar has_more
+                items, _ = leitura_intercalada(offset + limit + 1, {})
+                return paginar_offset(items, limit, offset, resumo)
+            return list_lancamentos_offset(read_kwargs, particoes, tags, limit, offset, resumo, todas_tags)
 
-            all_items.extend(items)
-            items_scanned += len(items)
+        posicao = decodificar_cursor(filters['cursor']) if filters.get('cursor') else {}
+        assinatura = assinatura_filtros(filters)
+        if posicao and posicao.get('f') != assinatura:
+            raise CursorInvalidoError('Cursor não corresponde aos filtros da consulta')
 
-            last_evaluated_key = response.get('LastEvaluatedKey')
-            if not last_evaluated_key or len(all_items) >= (offset + limit):
-                break
+        if leitura_intercalada:
+            items, proxima_posicao = leitura_intercalada(limit, posicao)
+        else:
+            items, proxima_posicao = ler_pagina_cursor(read_kwargs, particoes, tags, limit, posicao, todas_tags)
 
-        # Ordenação
-        if sort_order == 'data_desc':
-            all_items.sort(key=lambda x: x.get('data', ''), reverse=True)
-        elif sort_order == 'data_asc':
-            all_items.sort(key=lambda x: x.get('data', ''))
-        elif sort_order == 'valor_desc':
-            all_items.sort(key=lambda x: float(x.get('valor', 0)), reverse=True)
-        elif sort_order == 'valor_asc':
-            all_items.sort(key=lambda x: float(x.get('valor', 0)))
-
-        # Aplicar paginação
-        total_items = len(all_items)
-        paginated_items = all_items[offset:offset + limit]
-
-        # Converter Decimal para float e limpar dados
-        cleaned_items = []
-        for item in paginated_items:
-            cleaned_item = dict(item)
-            if 'valor' in cleaned_item:
-                cleaned_item['valor'] = float(cleaned_item['valor'])
-            # Remover campos internos
-            cleaned_item.pop('ambiente', None)
-            cleaned_items.append(cleaned_item)
-
-        # Calcular resumo financeiro
-        total_creditos = sum(
-            float(item['valor']) for item in all_items
-            if item.get('tipo') == 'CREDITO'
-        )
-        total_debitos = sum(
-            float(item['valor']) for item in all_items
-            if item.get('tipo') == 'DEBITO'
-        )
+        proximo_cursor = None
+        if proxima_posicao:
+            proxima_posicao['f'] = assinatura
+            proximo_cursor = codificar_cursor(proxima_posicao)
 
         return {
-            'lancamentos': cleaned_items,
+            'lancamentos': [limpar_lancamento(item) for item in items],
             'pagination': {
-                'total': total_items,
                 'limit': limit,
-                'offset': offset,
-                'has_more': offset + limit < total_items
+                'next_cursor': proximo_cursor,
+                'has_more': proximo_cursor is not None
             },
-            'summary': {
-                'total_creditos': total_creditos,
-                'total_debitos': total_debitos,
-                'saldo_liquido': total_creditos - total_debitos,
-                'quantidade_total': total_items
-            }
+            'summary': resumo or resumir_lancamentos(items)
         }
 
     except ClientError as e:
@@ -324,6 +582,483 @@ def list_lancamentos_with_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
         raise "Erro ao acessar dados dos lançamentos"
 
 
+def list_lancamentos_offset(read_kwargs: Dict[str, Any], particoes: List[str], tags: List[str],
+                            limit: int, offset: int, resumo: Optional[Dict[str, Any]] = None,
+                            todas_tags: bool = False) -> Dict[str, Any]:
+    """
+    Paginação legada por offset: lê offset + limit itens já ordenados antes de
+    fatiar, ficando mais lenta a cada página. Use cursor.
+    """
+    all_items = []
+
+    for particao in particoes:
+        last_evaluated_key = None
+        read_kwargs.pop('ExclusiveStartKey', None)
+        read_kwargs['ExpressionAttributeValues'][':particao'] = particao
+
+        while True:
+            if last_evaluated_key:
+                read_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+            response = config.tableLancamentos.query(**read_kwargs)
+            all_items.extend(filtrar_por_tags(response.get('Items', []), tags, todas_tags))
+
+            last_evaluated_key = response.get('LastEvaluatedKey')
+            if not last_evaluated_key or len(all_items) >= (offset + limit):
+                break
+
+        if len(all_items) >= (offset + limit):
+            break
+
+    return paginar_offset(all_items, limit, offset, resumo)
+
+
+def paginar_offset(all_items: List[Dict[str, Any]], limit: int, offset: int,
+                   resumo: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Aplicar paginação
+    total_items = len(all_items)
+    paginated_items = all_items[offset:offset + limit]
+
+    if offset >= OFFSET_PROFUNDO:
+        config.logger.warning(f"Paginação por offset profundo ({offset}); clientes devem migrar para cursor")
+
+    return {
+        'lancamentos': [limpar_lancamento(item) for item in paginated_items],
+        'pagination': {
+            'total': total_items,
+            'limit': limit,
+            'offset': offset,
+            'has_more': offset + limit < total_items,
+            'deprecated': 'offset está depreciado; use next_cursor/cursor'
+        },
+        'summary': resumo or resumir_lancamentos(all_items)
+    }
+
+
+def ler_pagina_cursor(read_kwargs: Dict[str, Any], particoes: List[str], tags: List[str],
+                      limit: int, posicao: Dict[str, Any], todas_tags: bool = False) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Lê até limit itens a partir da posição do cursor (partição e chave do último
+    item entregue). Retorna os itens e a posição da próxima página, ou None no fim.
+    """
+    inicio = 0
+    if posicao.get('d') is not None:
+        if posicao['d'] not in particoes:
+            raise CursorInvalidoError('Cursor fora do período consultado')
+        inicio = particoes.index(posicao['d'])
+
+    # Limit limita os itens avaliados por chamada, não os retornados pelo filtro
+    read_kwargs['Limit'] = limit
+    items = []
+
+    for indice in range(inicio, len(particoes)):
+        particao = particoes[indice]
+        last_evaluated_key = posicao.get('k') if indice == inicio else None
+        read_kwargs.pop('ExclusiveStartKey', None)
+        read_kwargs['ExpressionAttributeValues'][':particao'] = particao
+
+        while True:
+            if last_evaluated_key:
+                read_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+            response = config.tableLancamentos.query(**read_kwargs)
+            last_evaluated_key = response.get('LastEvaluatedKey')
+            pagina = filtrar_por_tags(response.get('Items', []), tags, todas_tags)
+
+            for posicao_item, item in enumerate(pagina):
+                items.append(item)
+                if len(items) == limit:
+                    restante = posicao_item < len(pagina) - 1 or last_evaluated_key or indice < len(particoes) - 1
+                    proxima = {'d': particao, 'k': chave_lancamento(item, read_kwargs['IndexName'])}
+                    return items, (proxima if restante else None)
+
+            if not last_evaluated_key:
+                break
+
+    return items, None
+
+
+@xray_recorder.capture('ler_pagina_ordenada')
+def ler_pagina_ordenada(read_kwargs: Dict[str, Any], particoes: List[str], atributo: str,
+                        limites: Tuple[Optional[Any], Optional[Any]], tags: List[str], todas_tags: bool,
+                        crescente: bool, limit: int,
+                        posicao: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Lê até limit lançamentos em ordem do atributo (data ou valor) intercalando
+    uma Query por partição do índice (empates ordenados por id). limites são os
+    extremos (inferior, superior) da sort key. A posição do cursor é o atributo
+    e o id do último item entregue.
+    """
+    inicio = None
+    if posicao:
+        if not isinstance(posicao.get('v'), str) or not isinstance(posicao.get('i'), str):
+            raise CursorInvalidoError('Cursor inválido')
+        try:
+            inicio = (Decimal(posicao['v']) if atributo == 'valor' else posicao['v'], posicao['i'])
+        except ArithmeticError:
+            raise CursorInvalidoError('Cursor inválido')
+
+    fluxos = [
+        iterar_particao_ordenada(read_kwargs, particao, atributo, limites, crescente, inicio, limit, tags, todas_tags)
+        for particao in particoes
+    ]
+
+    # Um item além do limite indica se há próxima página
+    ordem = partial(chave_ordem, atributo)
+    encontrados = list(islice(heapq.merge(*fluxos, key=ordem, reverse=not crescente), limit + 1))
+    items = encontrados[:limit]
+    proxima = None
+    if len(encontrados) > limit:
+        proxima = {'v': str(items[-1][atributo]), 'i': items[-1]['id']}
+
+    if read_kwargs['IndexName'] in INDICES_PROJECAO_PARCIAL:
+        # O índice só tem as chaves e os atributos dos filtros
+        lancamentos = buscar_lancamentos([item['id'] for item in items])
+        items = [lancamentos[item['id']] for item in items if item['id'] in lancamentos]
+    return items, proxima
+
+
+def chave_ordem(atributo: str, item: Dict[str, Any]) -> Tuple[Any, str]:
+    return item[atributo], item['id']
+
+
+def iterar_particao_ordenada(read_kwargs: Dict[str, Any], particao: str, atributo: str,
+                             limites: Tuple[Optional[Any], Optional[Any]], crescente: bool,
+                             inicio: Optional[Tuple[Any, str]], tamanho_pagina: int, tags: List[str], todas_tags: bool):
+    """
+    Percorre os lançamentos de uma partição do índice em ordem do atributo,
+    lendo uma página por vez, a partir da posição (atributo, id) do cursor
+    """
+    query_kwargs = dict(read_kwargs)
+    query_kwargs['ExpressionAttributeValues'] = {**read_kwargs['ExpressionAttributeValues'], ':particao': particao}
+    query_kwargs['Limit'] = tamanho_pagina
+
+    # O cursor substitui o extremo de onde a leitura parte
+    inferior, superior = limites
+    if inicio:
+        if crescente:
+            inferior = inicio[0]
+        else:
+            superior = inicio[0]
+
+    if inferior is not None or superior is not None:
+        query_kwargs['ExpressionAttributeNames'] = {**read_kwargs['ExpressionAttributeNames'], '#ordem': atributo}
+        if inferior is not None and superior is not None:
+            condicao = '#ordem BETWEEN :ordem_inicio AND :ordem_fim'
+        elif inferior is not None:
+            condicao = '#ordem >= :ordem_inicio'
+        else:
+            condicao = '#ordem <= :ordem_fim'
+        query_kwargs['KeyConditionExpression'] += f' AND {condicao}'
+        if inferior is not None:
+            query_kwargs['ExpressionAttributeValues'][':ordem_inicio'] = inferior
+        if superior is not None:
+            query_kwargs['ExpressionAttributeValues'][':ordem_fim'] = superior
+
+    def posteriores(empatados):
+        # O índice não ordena itens de mesmo valor: ordenar por id e descartar os já entregues
+        for item in sorted(empatados, key=partial(chave_ordem, atributo), reverse=not crescente):
+            if inicio is None or (chave_ordem(atributo, item) > inicio if crescente else chave_ordem(atributo, item) < inicio):
+                yield item
+
+    empatados = []
+    while True:
+        response = config.tableLancamentos.query(**query_kwargs)
+        for item in filtrar_por_tags(response.get('Items', []), tags, todas_tags):
+            if empatados and item[atributo] != empatados[0][atributo]:
+                yield from posteriores(empatados)
+                empatados = []
+            empatados.append(item)
+
+        if not response.get('LastEvaluatedKey'):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    yield from posteriores(empatados)
+
+
+@xray_recorder.capture('ler_pagina_tags')
+def ler_pagina_tags(tags: List[str], todas_tags: bool, data_inicio: Optional[str], data_fim: Optional[str],
+                    crescente: bool, criterios: Dict[str, Any], limit: int,
+                    posicao: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    Lê até limit lançamentos pelo índice invertido de tags, em ordem de data.
+    Com qualquer tag (OR) as sequências de cada tag são intercaladas; com todas
+    (AND) percorre apenas a primeira tag e confere as demais no lançamento.
+    A posição do cursor é o data_id (<data>#<id>) do último item entregue.
+    """
+    if posicao and not isinstance(posicao.get('t'), str):
+        raise CursorInvalidoError('Cursor inválido')
+
+    key_condition, valores = condicao_periodo_tags(data_inicio, data_fim)
+    tamanho_lote = min(limit, BATCH_GET_MAX_CHAVES)
+
+    fluxos = [
+        iterar_indice_tag(tag, key_condition, valores, crescente, posicao.get('t'), tamanho_lote)
+        for tag in (tags[:1] if todas_tags else tags)
+    ]
+    candidatos = entradas_distintas(heapq.merge(*fluxos, key=lambda entrada: entrada['data_id'], reverse=not crescente))
+
+    # Um item além do limite indica se há próxima página
+    encontrados = list(islice(
+        iterar_lancamentos_tags(candidatos, tamanho_lote, tags, todas_tags, criterios), limit + 1
+    ))
+    items = [item for _, item in encontrados[:limit]]
+    if len(encontrados) > limit:
+        return items, {'t': encontrados[limit - 1][0]['data_id']}
+    return items, None
+
+
+def iterar_lancamentos_tags(candidatos, tamanho_lote: int, tags: List[str], todas_tags: bool,
+                            criterios: Dict[str, Any]):
+    """
+    Busca os lançamentos das entradas candidatas em lotes (BatchGetItem) e
+    produz (entrada, lançamento) dos que atendem aos filtros, na mesma ordem
+    """
+    while True:
+        lote = list(islice(candidatos, tamanho_lote))
+        if not lote:
+            return
+
+        lancamentos = buscar_lancamentos([entrada['id'] for entrada in lote])
+        for entrada in lote:
+            item = lancamentos.get(entrada['id'])
+            if not item or any(item.get(campo) != valor for campo, valor in criterios.items()):
+                continue
+            if not filtrar_por_tags([item], tags, todas_tags):
+                continue
+
+            yield entrada, item
+
+
+def condicao_periodo_tags(data_inicio: Optional[str], data_fim: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Condição de chave do índice de tags para o período (data_id = <data>#<id>)
+    """
+    # '#~' fecha o último segundo do dia para qualquer id
+    valores = {}
+    key_condition = 'tag = :tag'
+    if data_inicio and data_fim:
+        key_condition += ' AND data_id BETWEEN :data_inicio AND :data_fim'
+        valores[':data_inicio'] = f"{data_inicio}T00:00:00"
+        valores[':data_fim'] = f"{data_fim}T23:59:59#~"
+    elif data_inicio:
+        key_condition += ' AND data_id >= :data_inicio'
+        valores[':data_inicio'] = f"{data_inicio}T00:00:00"
+    elif data_fim:
+        key_condition += ' AND data_id <= :data_fim'
+        valores[':data_fim'] = f"{data_fim}T23:59:59#~"
+
+    return key_condition, valores
+
+
+def iterar_indice_tag(tag: str, key_condition: str, valores: Dict[str, Any], crescente: bool,
+                      inicio: Optional[str], tamanho_pagina: int):
+    """
+    Percorre as entradas de uma tag em ordem de data, lendo uma página por vez
+    """
+    query_kwargs = {
+        'KeyConditionExpression': key_condition,
+        'ExpressionAttributeValues': {**valores, ':tag': tag},
+        'ScanIndexForward': crescente,
+        'Limit': tamanho_pagina
+    }
+    if inicio:
+        query_kwargs['ExclusiveStartKey'] = {'tag': tag, 'data_id': inicio}
+
+    while True:
+        response = config.tableLancamentosTags.query(**query_kwargs)
+        yield from response.get('Items', [])
+
+        if not response.get('LastEvaluatedKey'):
+            return
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def entradas_distintas(entradas):
+    # Um lançamento com várias tags aparece em sequência na intercalação (mesmo data_id)
+    ultimo = None
+    for entrada in entradas:
+        if entrada['data_id'] != ultimo:
+            ultimo = entrada['data_id']
+            yield entrada
+
+
+def buscar_lancamentos(lancamento_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Busca lançamentos por id com BatchGetItem, reenviando as chaves não processadas
+    """
+    lancamentos = {}
+    tabela = config.DYNAMODB_TABLE_LANCAMENTOS
+
+    for inicio in range(0, len(lancamento_ids), BATCH_GET_MAX_CHAVES):
+        request_items = {tabela: {'Keys': [{'id': lancamento_id} for lancamento_id in lancamento_ids[inicio:inicio + BATCH_GET_MAX_CHAVES]]}}
+        tentativa = 0
+        while request_items:
+            if tentativa:
+                time.sleep(min(0.05 * 2 ** tentativa, 1))
+            response = config.dynamodbResource.batch_get_item(RequestItems=request_items)
+            for item in response.get('Responses', {}).get(tabela, []):
+                lancamentos[item['id']] = item
+            request_items = response.get('UnprocessedKeys') or None
+            tentativa += 1
+
+    return lancamentos
+
+
+def chave_lancamento(item: Dict[str, Any], index_name: str) -> Dict[str, Any]:
+    """
+    Chave (ExclusiveStartKey) do índice que retoma a leitura logo após o item
+    """
+    chave = {'id': item['id']}
+    for atributo in ATRIBUTOS_INDICE[index_name]:
+        chave[atributo] = item[atributo]
+    return chave
+
+
+def filtrar_por_tags(items: List[Dict[str, Any]], tags: List[str], todas_tags: bool = False) -> List[Dict[str, Any]]:
+    # Filtrar por tags se especificado
+    if not tags:
+        return items
+    combinar = all if todas_tags else any
+    return [
+        item for item in items
+        if combinar(tag in item.get('tags', []) for tag in tags)
+    ]
+
+
+def limpar_lancamento(item: Dict[str, Any]) -> Dict[str, Any]:
+    # Converter Decimal para float e limpar dados
+    cleaned_item = dict(item)
+    if 'valor' in cleaned_item:
+        cleaned_item['valor'] = float(cleaned_item['valor'])
+    # Remover campos internos
+    cleaned_item.pop('ambiente', None)
+    cleaned_item.pop('ambiente_shard', None)
+    return cleaned_item
+
+
+def resumir_lancamentos(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Calcular resumo financeiro
+    total_creditos = sum(float(item['valor']) for item in items if item.get('tipo') == 'CREDITO')
+    total_debitos = sum(float(item['valor']) for item in items if item.get('tipo') == 'DEBITO')
+
+    return {
+        'total_creditos': total_creditos,
+        'total_debitos': total_debitos,
+        'saldo_liquido': total_creditos - total_debitos,
+        'quantidade_total': len(items),
+        'origem': 'lancamentos'
+    }
+
+
+def listar_meses(data_inicio: str, data_fim: str) -> List[str]:
+    """
+    Lista os meses (YYYY-MM) entre duas datas, inclusive
+    """
+    return sorted({dia[:7] for dia in listar_dias(data_inicio, data_fim)})
+
+
+@xray_recorder.capture('get_resumo_consolidado')
+def get_resumo_consolidado(data_inicio: str, data_fim: str, tipo: Optional[str] = None,
+                           categoria: Optional[str] = None, tag: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Resumo financeiro do período a partir dos contadores por tipo/categoria (ou
+    tipo/tag) das linhas diárias do consolidado, sem ler os lançamentos. Retorna
+    None se algum dia com lançamentos ainda não tiver contadores (linhas
+    anteriores ao backfill).
+    """
+    totais = {'CREDITO': Decimal('0'), 'DEBITO': Decimal('0')}
+    quantidade = 0
+
+    if tag:
+        prefixo_valor, prefixo_quantidade, nome_filtro = PREFIXO_CONTADOR_TAG_VALOR, PREFIXO_CONTADOR_TAG_QUANTIDADE, tag
+    else:
+        prefixo_valor, prefixo_quantidade, nome_filtro = PREFIXO_CONTADOR_VALOR, PREFIXO_CONTADOR_QUANTIDADE, categoria
+
+    try:
+        for mes in listar_meses(data_inicio, data_fim):
+            query_kwargs = {
+                'IndexName': config.DYNAMODB_INDEX_MES,
+                'KeyConditionExpression': 'mes = :mes AND #data BETWEEN :data_inicio AND :data_fim',
+                'ExpressionAttributeNames': {'#data': 'data'},
+                'ExpressionAttributeValues': {':mes': mes, ':data_inicio': data_inicio[:10], ':data_fim': data_fim[:10]}
+            }
+
+            while True:
+                response = config.tableConsolidado.query(**query_kwargs)
+
+                for linha in response.get('Items', []):
+                    # Contadores por categoria existem em toda linha consolidada com lançamentos
+                    if int(linha.get('quantidade_lancamentos', 0)) > 0 and not any(
+                            chave.startswith(PREFIXO_CONTADOR_QUANTIDADE) for chave in linha):
+                        return None
+
+                    for chave, valor in linha.items():
+                        if not chave.startswith((prefixo_valor, prefixo_quantidade)):
+                            continue
+                        prefixo, tipo_contador, nome_contador = chave.split('#', 2)
+                        if (tipo and tipo_contador != tipo) or (nome_filtro and nome_contador != nome_filtro):
+                            continue
+                        if f"{prefixo}#" == prefixo_quantidade:
+                            quantidade += int(valor)
+                        elif tipo_contador in totais:
+                            totais[tipo_contador] += Decimal(str(valor))
+
+                if not response.get('LastEvaluatedKey'):
+                    break
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    except ClientError as e:
+        config.logger.warning(f"Resumo do consolidado indisponível, usando lançamentos lidos: {str(e)}")
+        return None
+
+    return {
+        'total_creditos': float(totais['CREDITO']),
+        'total_debitos': float(totais['DEBITO']),
+        'saldo_liquido': float(totais['CREDITO'] - totais['DEBITO']),
+        'quantidade_total': quantidade,
+        'origem': 'consolidado'
+    }
+
+
+def assinatura_filtros(filters: Dict[str, Any]) -> str:
+    """
+    Identifica os filtros da consulta para impedir o reuso do cursor em outra consulta
+    """
+    campos = ['data_inicio', 'data_fim', 'tipo', 'categoria', 'tags', 'sort']
+    valores = [filters.get(campo) for campo in campos]
+    if filters.get('tags_modo'):
+        valores.append(filters['tags_modo'])
+    conteudo = json.dumps(valores)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:16]
+
+
+def codificar_cursor(posicao: Dict[str, Any]) -> str:
+    conteudo = json.dumps(posicao, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(conteudo.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        conteudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        posicao = json.loads(conteudo)
+    except (ValueError, TypeError):
+        raise CursorInvalidoError('Cursor inválido')
+
+    if not isinstance(posicao, dict) or not isinstance(posicao.get('k'), (dict, type(None))):
+        raise CursorInvalidoError('Cursor inválido')
+
+    # valor é atributo numérico da chave do índice ambiente-valor-index
+    if posicao.get('k') and 'valor' in posicao['k']:
+        try:
+            posicao['k']['valor'] = Decimal(str(posicao['k']['valor']))
+        except ArithmeticError:
+            raise CursorInvalidoError('Cursor inválido')
+
+    return posicao
+
+
 @xray_recorder.capture('get_lancamento_by_id')
 def get_lancamento_by_id(lancamento_id: str) -> Optional[Dict[str, Any]]:
     try:
@@ -1,47 +1,87 @@
 from configuration import Config
 import json
 from datetime import datetime, timezone
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 from aws_xray_sdk.core import xray_recorder
-from aws_xray_sdk.core import patch_all
-
-patch_all()
 
 config = Config()
 
 
+def build_consolidacao_message(lancamento_id: str, lancamento_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'eventType': 'LANCAMENTO_CRIADO',
+        'lancamentoId': lancamento_id,
+        'tipo': lancamento_data['tipo'],
+        'valor': float(lancamento_data['valor']),
+        'data': lancamento_data['data'],
+        'categoria': lancamento_data['categoria'],
+        'tags': lancamento_data['tags'],
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'ambiente': config.environment
+    }
+
+
+def build_message_attributes(lancamento_id: str) -> Dict[str, Any]:
+    return {
+        'EventType': {
+            'StringValue': 'LANCAMENTO_CRIADO',
+            'DataType': 'String'
+        },
+        'LancamentoId': {
+            'StringValue': lancamento_id,
+            'DataType': 'String'
+        }
+    }
+
+
 @xray_recorder.capture('send_to_consolidacao_queue')
 def send_to_consolidacao_queue(lancamento_id: str, lancamento_data: Dict[str, Any]) -> None:
     try:
         # Preparar mensagem
-        message = {
-            'eventType': 'LANCAMENTO_CRIADO',
-            'lancamentoId': lancamento_id,
-            'tipo': lancamento_data['tipo'],
-            'valor': float(lancamento_data['valor']),
-            'data': lancamento_data['data'],
-            'categoria': lancamento_data['categoria'],
-            'timestamp': datetime.now(timezone.utc).isoformat(),
-            'ambiente': config.environment
-        }
+        message = build_consolidacao_message(lancamento_id, lancamento_data)
 
         # Enviar para SQS
         response = config.sqsClient.send_message(
             QueueUrl=config.SQS_QUEUE_URL,
             MessageBody=json.dumps(message, default=str),
-            MessageAttributes={
-                'EventType': {
-                    'StringValue': 'LANCAMENTO_CRIADO',
-                    'DataType': 'String'
-                },
-                'LancamentoId': {
-                    'StringValue': lancamento_id,
-                    'DataType': 'String'
-                }
-            }
+            MessageAttributes=build_message_attributes(lancamento_id)
         )
 
         config.logger.info(f"Mensagem enviada para SQS: {response['MessageId']}")
 
     except BaseException as e:
-        config.logger.error(f"Erro ao enviar para SQS: {e}")
\ No newline at end of file
+        config.logger.error(f"Erro ao enviar para SQS: {e}")
+
+
+@xray_recorder.capture('send_batch_to_consolidacao_queue')
+def send_batch_to_consolidacao_queue(lancamentos: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """
+    Envia (lancamento_id, dados) para a fila com send_message_batch (10 por chamada).
+    Retorna os IDs cujo envio falhou.
+    """
+    falhas = []
+
+    for i in range(0, len(lancamentos), 10):
+        bloco = lancamentos[i:i + 10]
+        try:
+            response = config.sqsClient.send_message_batch(
+                QueueUrl=config.SQS_QUEUE_URL,
+                Entries=[
+                    {
+                        'Id': str(indice),
+                        'MessageBody': json.dumps(build_consolidacao_message(lancamento_id, lancamento_data), default=str),
+                        'MessageAttributes': build_message_attributes(lancamento_id)
+                    }
+                    for indice, (lancamento_id, lancamento_data) in enumerate(bloco)
+                ]
+            )
+            for falha in response.get('Failed', []):
+                falhas.append(bloco[int(falha['Id'])][0])
+                config.logger.error(f"Erro ao enviar para SQS: {falha.get('Message')}")
+
+        except BaseException as e:
+            config.logger.error(f"Erro ao enviar lote para SQS: {e}")
+            falhas.extend(lancamento_id for lancamento_id, _ in bloco)
+
+    config.logger.info(f"Lote enviado para SQS: {len(lancamentos) - len(falhas)} mensagens")
+    return falhas
@@ -1,12 +1,24 @@
 import json
 from datetime import datetime, timezone
-from decimal import Decimal
-from typing import Dict, Any, Optional
-from aws_xray_sdk.core import patch_all
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Any, List, Optional
 
-patch_all()
+# Limites das tags de um lançamento (cada tag vira contadores nas linhas do consolidado)
+MAX_TAGS_LANCAMENTO = 10
+MAX_TAMANHO_TAG = 50
 
 
+class ValidationError(Exception):
+    """
+    Dados de lançamento inválidos
+    """
+
+
+class CursorInvalidoError(ValueError):
+    """
+    Cursor de paginação inválido ou emitido para outra consulta
+    """
+
 
 def create_response(status_code: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
     """
@@ -29,6 +41,32 @@ def create_response(status_code: int, body: Dict[str, Any], headers: Optional[Di
     }
 
 
+def validate_tags(tags: Any) -> List[str]:
+    """
+    Valida e normaliza as tags: lista de textos, sem espaços nas bordas e sem
+    repetições, respeitando os limites de quantidade e tamanho
+    """
+    if tags is None:
+        return []
+    if not isinstance(tags, list):
+        raise ValidationError("Tags devem ser uma lista de textos")
+
+    normalizadas = []
+    for tag in tags:
+        if not isinstance(tag, str) or not tag.strip():
+            raise ValidationError("Tags devem ser textos não vazios")
+        tag = tag.strip()
+        if len(tag) > MAX_TAMANHO_TAG:
+            raise ValidationError(f"Tags devem ter no máximo {MAX_TAMANHO_TAG} caracteres")
+        if tag not in normalizadas:
+            normalizadas.append(tag)
+
+    if len(normalizadas) > MAX_TAGS_LANCAMENTO:
+        raise ValidationError(f"Lançamento deve ter no máximo {MAX_TAGS_LANCAMENTO} tags")
+
+    return normalizadas
+
+
 def validate_lancamento(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Valida os dados do lançamento
@@ -45,12 +83,16 @@ def validate_lancamento(data: Dict[str, Any]) -> Dict[str, Any]:
         raise ValidationError("Tipo deve ser 'DEBITO' ou 'CREDITO'")
 
     # Validar valor
+    if isinstance(data['valor'], bool):
+        raise ValidationError("Valor deve ser um número válido")
     try:
         valor = Decimal(str(data['valor']))
-        if valor <= 0:
-            raise ValidationError("Valor deve ser maior que zero")
-    except (ValueError, TypeError):
+    except (InvalidOperation, ValueError, TypeError):
+        raise ValidationError("Valor deve ser um número válido") from None
+    if not valor.is_finite():
         raise ValidationError("Valor deve ser um número válido")
+    if valor <= 0:
+        raise ValidationError("Valor deve ser maior que zero")
 
     # Validar descrição
     descricao = str(data['descricao']).strip()
@@ -67,11 +109,14 @@ def validate_lancamento(data: Dict[str, Any]) -> Dict[str, Any]:
     else:
         data_lancamento = datetime.now(timezone.utc).isoformat()
 
+    # Validar tags
+    tags = validate_tags(data.get('tags'))
+
     return {
         'tipo': data['tipo'],
         'valor': valor,
         'descricao': descricao,
         'data': data_lancamento,
         'categoria': data.get('categoria', 'GERAL'),
-        'tags': data.get('tags', [])
+        'tags': tags
     }
\ No newline at end of file
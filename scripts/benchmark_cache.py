@@ -0,0 +1,182 @@
+"""
+Compara o formato JSON legado do cache com o formato binário do cache_codec:
+tamanho do payload e tempo de decodificação até SaldoDiario/RelatorioConsolidado.
+
+Uso (na raiz do repositório): python scripts/benchmark_cache.py [repeticoes]
+"""
+import json
+import os
+import sys
+import timeit
+from datetime import date, timedelta
+from decimal import Decimal
+
+# Fora do pacote da Lambda: importa os módulos do consolidado pelo caminho
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'apps', 'consolidado'))
+
+from modelos import SaldoDiario, RelatorioConsolidado
+from cache_codec import codificar_saldo, decodificar_saldo, codificar_relatorio, decodificar_relatorio
+
+
+def gerar_saldo(dia: date, saldo_inicial: Decimal, contadores: bool) -> SaldoDiario:
+    creditos = Decimal(1500 + dia.toordinal() % 700) + Decimal('0.35')
+    debitos = Decimal(900 + dia.toordinal() % 400) + Decimal('0.10')
+    saldo = SaldoDiario(
+        data=dia.isoformat(),
+        saldo_inicial=saldo_inicial,
+        total_creditos=creditos,
+        total_debitos=debitos,
+        saldo_final=saldo_inicial + creditos - debitos,
+        quantidade_lancamentos=42,
+        ultima_atualizacao=f"{dia.isoformat()}T23:59:58.123456+00:00"
+    )
+    if contadores:
+        for tipo in ('CREDITO', 'DEBITO'):
+            for categoria in ('GERAL', 'VENDAS', 'FORNECEDORES', 'IMPOSTOS'):
+                saldo.contadores[f"valor#{tipo}#{categoria}"] = Decimal('123.45')
+                saldo.contadores[f"qtd#{tipo}#{categoria}"] = 5
+            for tag in ('cliente-vip', 'recorrente'):
+                saldo.contadores[f"tag_valor#{tipo}#{tag}"] = Decimal('67.80')
+                saldo.contadores[f"tag_qtd#{tipo}#{tag}"] = 2
+    return saldo
+
+
+def gerar_relatorio(dias: int) -> RelatorioConsolidado:
+    inicio = date(2025, 1, 1)
+    saldos = []
+    saldo_corrente = Decimal('10000.00')
+    for indice in range(dias):
+        saldo = gerar_saldo(inicio + timedelta(days=indice), saldo_corrente, contadores=False)
+        saldo_corrente = saldo.saldo_final
+        saldos.append(saldo)
+
+    return RelatorioConsolidado(
+        periodo_inicio=saldos[0].data,
+        periodo_fim=saldos[-1].data,
+        saldo_inicial_periodo=saldos[0].saldo_inicial,
+        saldo_final_periodo=saldos[-1].saldo_final,
+        total_creditos_periodo=sum((saldo.total_creditos for saldo in saldos), Decimal('0')),
+        total_debitos_periodo=sum((saldo.total_debitos for saldo in saldos), Decimal('0')),
+        quantidade_dias=len(saldos),
+        saldos_diarios=saldos
+    )
+
+
+# Formato JSON legado (saldo_to_cache/saldo_from_dict e o relatório de generate_relatorio_periodo)
+
+def saldo_json(saldo: SaldoDiario) -> bytes:
+    return json.dumps({
+        'data': saldo.data,
+        'saldo_inicial': str(saldo.saldo_inicial),
+        'total_creditos': str(saldo.total_creditos),
+        'total_debitos': str(saldo.total_debitos),
+        'saldo_final': str(saldo.saldo_final),
+        'quantidade_lancamentos': saldo.quantidade_lancamentos,
+        'ultima_atualizacao': saldo.ultima_atualizacao,
+        **{chave: str(valor) for chave, valor in saldo.contadores.items()}
+    }).encode('utf-8')
+
+
+def saldo_de_json(payload: bytes) -> SaldoDiario:
+    item = json.loads(payload)
+    return SaldoDiario(
+        data=item['data'],
+        saldo_inicial=Decimal(str(item['saldo_inicial'])),
+        total_creditos=Decimal(str(item['total_creditos'])),
+        total_debitos=Decimal(str(item['total_debitos'])),
+        saldo_final=Decimal(str(item['saldo_final'])),
+        quantidade_lancamentos=int(item['quantidade_lancamentos']),
+        ultima_atualizacao=item['ultima_atualizacao'],
+        contadores={
+            chave: int(valor) if chave.startswith(('qtd#', 'tag_qtd#')) else Decimal(str(valor))
+            for chave, valor in item.items()
+            if chave.startswith(('valor#', 'qtd#', 'tag_valor#', 'tag_qtd#'))
+        }
+    )
+
+
+def relatorio_json(relatorio: RelatorioConsolidado) -> bytes:
+    return json.dumps({
+        'periodo_inicio': relatorio.periodo_inicio,
+        'periodo_fim': relatorio.periodo_fim,
+        'saldo_inicial_periodo': str(relatorio.saldo_inicial_periodo),
+        'saldo_final_periodo': str(relatorio.saldo_final_periodo),
+        'total_creditos_periodo': str(relatorio.total_creditos_periodo),
+        'total_debitos_periodo': str(relatorio.total_debitos_periodo),
+        'quantidade_dias': relatorio.quantidade_dias,
+        'saldos_diarios': [
+            {
+                'data': saldo.data,
+                'saldo_inicial': str(saldo.saldo_inicial),
+                'total_creditos': str(saldo.total_creditos),
+                'total_debitos': str(saldo.total_debitos),
+                'saldo_final': str(saldo.saldo_final),
+                'quantidade_lancamentos': saldo.quantidade_lancamentos,
+                'ultima_atualizacao': saldo.ultima_atualizacao
+            }
+            for saldo in relatorio.saldos_diarios
+        ]
+    }).encode('utf-8')
+
+
+def relatorio_de_json(payload: bytes) -> RelatorioConsolidado:
+    item = json.loads(payload)
+    return RelatorioConsolidado(
+        periodo_inicio=item['periodo_inicio'],
+        periodo_fim=item['periodo_fim'],
+        saldo_inicial_periodo=Decimal(str(item['saldo_inicial_periodo'])),
+        saldo_final_periodo=Decimal(str(item['saldo_final_periodo'])),
+        total_creditos_periodo=Decimal(str(item['total_creditos_periodo'])),
+        total_debitos_periodo=Decimal(str(item['total_debitos_periodo'])),
+        quantidade_dias=int(item['quantidade_dias']),
+        saldos_diarios=[
+            SaldoDiario(
+                data=saldo['data'],
+                saldo_inicial=Decimal(str(saldo['saldo_inicial'])),
+                total_creditos=Decimal(str(saldo['total_creditos'])),
+                total_debitos=Decimal(str(saldo['total_debitos'])),
+                saldo_final=Decimal(str(saldo['saldo_final'])),
+                quantidade_lancamentos=int(saldo['quantidade_lancamentos']),
+                ultima_atualizacao=saldo['ultima_atualizacao']
+            )
+            for saldo in item['saldos_diarios']
+        ]
+    )
+
+
+def medir(nome: str, objeto, codificar_json, decodificar_json, codificar_binario, decodificar_binario, repeticoes: int) -> None:
+    payload_json = codificar_json(objeto)
+    payload_binario = codificar_binario(objeto)
+
+    # Os dois formatos reconstroem o mesmo objeto (Decimal com igualdade numérica)
+    assert decodificar_json(payload_json) == objeto
+    assert decodificar_binario(payload_binario) == objeto
+
+    tempo_json = min(timeit.repeat(lambda: decodificar_json(payload_json), number=repeticoes, repeat=5)) / repeticoes
+    tempo_binario = min(timeit.repeat(lambda: decodificar_binario(payload_binario), number=repeticoes, repeat=5)) / repeticoes
+
+    print(nome)
+    print(f"  payload:  json {len(payload_json):>7} B | binário {len(payload_binario):>7} B "
+          f"({len(payload_binario) / len(payload_json):.0%})")
+    print(f"  decode:   json {tempo_json * 1e6:>7.1f} µs | binário {tempo_binario * 1e6:>7.1f} µs "
+          f"({tempo_json / tempo_binario:.1f}x)")
+
+
+def main() -> None:
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    saldo = gerar_saldo(date(2025, 7, 30), Decimal('10000.00'), contadores=True)
+    medir('SaldoDiario (24 contadores)', saldo, saldo_json, saldo_de_json,
+          codificar_saldo, decodificar_saldo, repeticoes * 20)
+
+    saldo_simples = gerar_saldo(date(2025, 7, 30), Decimal('10000.00'), contadores=False)
+    medir('SaldoDiario (sem contadores)', saldo_simples, saldo_json, saldo_de_json,
+          codificar_saldo, decodificar_saldo, repeticoes * 20)
+
+    relatorio = gerar_relatorio(365)
+    medir('RelatorioConsolidado (365 dias)', relatorio, relatorio_json, relatorio_de_json,
+          codificar_relatorio, decodificar_relatorio, repeticoes)
+
+
+if __name__ == '__main__':
+    main()